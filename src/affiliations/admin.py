@@ -7,14 +7,14 @@ from django.contrib.auth.models import User, Group
 from django.contrib.auth.admin import UserAdmin as BaseUserAdmin
 from django.contrib.auth.admin import GroupAdmin as BaseGroupAdmin
 from django.utils.translation import gettext_lazy as _
-from django.core.exceptions import ValidationError
+from django.core.exceptions import PermissionDenied, ValidationError
 from django.db import transaction
+from django.db.models import OuterRef, Prefetch, Subquery
+from django.http import FileResponse, Http404
+from django.urls import path, reverse
+from django.utils.html import format_html
 from rest_framework_api_key.models import APIKey
 from rest_framework_api_key.admin import APIKeyModelAdmin
-from import_export.admin import ExportMixin  # type: ignore
-from import_export import resources  # type: ignore
-
-from unfold.contrib.import_export.forms import SelectableFieldsExportForm  # type: ignore
 from unfold.forms import (  # type: ignore
     AdminPasswordChangeForm,
     UserChangeForm,
@@ -31,12 +31,23 @@ from unfold.contrib.filters.admin import (  # type: ignore
 )
 
 # In-house code:
+from affiliations.exports import EXPORT_FIELDS, start_export_job
+from affiliations.identifiers import (
+    AFFILIATION_IDS,
+    EXPERT_PANEL_IDS,
+    allocate_affiliation_id,
+    expert_panel_id_for,
+    next_affiliation_id,
+)
 from affiliations.models import (
     Affiliation,
     Coordinator,
     Approver,
     Submitter,
+    ExportJob,
+    ExportStatus,
 )
+from affiliations.search import search_entries
 
 # Unregistering base Django Admin User and Group to use Unfold User and Group
 # instead for styling purposes.
@@ -120,22 +131,14 @@ class AffiliationForm(forms.ModelForm):
         model = Affiliation
 
     def _handle_clean_affiliation_id(self, cleaned_data):
-        """Clean and set Affiliation ID based on affil ID type."""
-        affil_id = cleaned_data.get("affiliation_id")
+        """Clean and set the next free Affiliation ID.
 
-        existing_affil_ids = (
-            Affiliation.objects.select_for_update()
-            .values_list("affiliation_id", flat=True)
-            .order_by("affiliation_id")
-        )
-
-        last_ind = existing_affil_ids.count()
-        if last_ind:
-            affil_id = existing_affil_ids[last_ind - 1] + 1
-        else:
-            affil_id = 10000
+        The ID is only looked at here. It is taken by `allocate_ids` once the
+        whole submission is valid, so invalid ones don't use up IDs.
+        """
+        affil_id = next_affiliation_id()
         cleaned_data["affiliation_id"] = affil_id
-        if affil_id < 10000 or affil_id >= 20000:
+        if affil_id not in AFFILIATION_IDS:
             self.add_error(
                 None,
                 ValidationError("Affiliation ID out of range. Contact administrator."),
@@ -144,39 +147,32 @@ class AffiliationForm(forms.ModelForm):
     def _handle_clean_type(self, cleaned_data):
         """Clean and set EP ID based on Type and Affiliation ID."""
         affil_id = cleaned_data.get("affiliation_id")
-        ep_id = cleaned_data.get("expert_panel_id")
         _type = cleaned_data.get("type")
+        ep_id = expert_panel_id_for(affil_id, _type)
+        cleaned_data["expert_panel_id"] = ep_id
 
         if _type == "VCEP":
-            ep_id = (affil_id - 10000) + 50000
-            cleaned_data["expert_panel_id"] = ep_id
-            if ep_id < 50000 or ep_id >= 60000:
+            if ep_id not in EXPERT_PANEL_IDS[_type]:
                 self.add_error(
                     None,
                     ValidationError("VCEP ID out of range. Contact administrator."),
                 )
         elif _type == "SC_VCEP":
-            ep_id = (affil_id - 10000) + 50000
-            cleaned_data["expert_panel_id"] = ep_id
             cleaned_data["clinical_domain_working_group"] = "SOMATIC_CANCER"
-            if ep_id < 50000 or ep_id >= 60000:
+            if ep_id not in EXPERT_PANEL_IDS[_type]:
                 self.add_error(
                     None,
                     ValidationError("SC-VCEP ID out of range. Contact administrator."),
                 )
         elif _type == "GCEP":
-            ep_id = (affil_id - 10000) + 40000
-            cleaned_data["expert_panel_id"] = ep_id
-            if ep_id < 40000 or ep_id >= 50000:
+            if ep_id not in EXPERT_PANEL_IDS[_type]:
                 self.add_error(
                     None,
                     ValidationError("GCEP ID out of range. Contact administrator."),
                 )
         else:
-            cleaned_data["expert_panel_id"] = None
             cleaned_data["clinical_domain_working_group"] = "NONE"
 
-    @transaction.atomic
     def clean(self):
         cleaned_data = super().clean()
         # If the primary key already exists, return cleaned_data.
@@ -186,24 +182,32 @@ class AffiliationForm(forms.ModelForm):
         self._handle_clean_affiliation_id(cleaned_data)
         self._handle_clean_type(cleaned_data)
 
-        # Check to see if the Affil and EP ID already exist in DB.
-        if (
-            Affiliation.objects.select_for_update()
-            .filter(
-                affiliation_id=cleaned_data.get("affiliation_id"),
-                expert_panel_id=cleaned_data.get("expert_panel_id"),
-            )
-            .exists()
-        ):
-            self.add_error(
-                None,
-                ValidationError(
-                    "This Affiliation ID with this Expert Panel ID already exist."
-                ),
-            )
-
+        # The unique constraints on the Affil and EP IDs are checked once the
+        # form is cleaned.
         return cleaned_data
 
+    def allocate_ids(self):
+        """Give a new affiliation the next free Affiliation ID, and the EP ID
+        of its type, in place of those the form was cleaned with.
+        """
+        affil_id = allocate_affiliation_id()
+        if affil_id not in AFFILIATION_IDS:
+            raise ValidationError("Affiliation ID out of range. Contact administrator.")
+        self.instance.affiliation_id = affil_id
+        self.instance.expert_panel_id = expert_panel_id_for(
+            affil_id, self.instance.type
+        )
+
+    def save(self, commit=True):
+        """Save the affiliation, first allocating its IDs if it is new.
+
+        The admin saves with `commit=False` before it has validated the
+        inlines, so it allocates the IDs in `save_model` instead.
+        """
+        if commit and self.instance.pk is None:
+            self.allocate_ids()
+        return super().save(commit)
+
 
 class CoordinatorInlineAdmin(TabularInline):
     """Configure the coordinators admin panel."""
@@ -226,39 +230,31 @@ class SubmitterInlineAdmin(TabularInline):
     extra = 1
 
 
-class AffiliationResource(resources.ModelResource):
-    """Configure affiliation export page."""
-
-    class Meta:
-        """Meta class for Affiliation Resource"""
+def _first_coordinator(field: str) -> Subquery:
+    """Return the first value of a coordinator field, in sorted order, of each
+    affiliation.
 
-        model = Affiliation
+    The changelist sorts the coordinator columns by it. Being a subquery, it
+    is only added to the queries that sort by it, rather than joining and
+    grouping the coordinators in every query of the admin.
+    """
+    return Subquery(
+        Coordinator.all_with_deleted.filter(affiliation=OuterRef("pk"))
+        .order_by(field)
+        .values(field)[:1]
+    )
 
-        # pylint:disable=duplicate-code
-        fields = [
-            "affiliation_id",
-            "expert_panel_id",
-            "full_name",
-            "short_name",
-            "status",
-            "type",
-            "clinical_domain_working_group",
-            "is_deleted",
-        ]
 
+class AffiliationsAdmin(ModelAdmin):  # pylint: disable=too-many-ancestors
+    """Configure the affiliations admin panel.
 
-class AffiliationsAdmin(ExportMixin, ModelAdmin):  # pylint: disable=too-many-ancestors
-    """Configure the affiliations admin panel."""
+    Affiliations are exported by export jobs, which run in the background.
+    """
 
     form = AffiliationForm
-    export_form_class = SelectableFieldsExportForm
-    resource_class = AffiliationResource
 
-    # Returns all DB values in export
-    def get_export_queryset(self, request):
-        return Affiliation.objects.all()
-
-    # Controls which fields are searchable via the search bar.
+    # Controls which fields are searchable via the search bar. The search
+    # itself reads the search entries instead; see `get_search_results`.
     search_fields = [
         "affiliation_id",
         "expert_panel_id",
@@ -298,35 +294,40 @@ class AffiliationsAdmin(ExportMixin, ModelAdmin):  # pylint: disable=too-many-an
 
     @transaction.atomic
     def get_queryset(self, request):
-        """Query to only display affiliations that have not been "soft-deleted"."""
+        """Query to only display affiliations that have not been "soft-deleted".
+
+        Coordinators are prefetched for the changelist columns.
+        """
         affiliations_query = super().get_queryset(request)
-        return affiliations_query.filter(is_deleted=False)
+        return affiliations_query.filter(is_deleted=False).prefetch_related(
+            Prefetch(
+                "coordinators",
+                queryset=Coordinator.all_with_deleted.order_by("pk"),
+            )
+        )
+
+    def get_search_results(self, request, queryset, search_term):
+        """Filter by the indexed search entries, rather than by a `LIKE` on
+        each search field, which joins the coordinators and can't use an index.
+        """
+        if not search_term.strip():
+            return queryset, False
+        return queryset.filter(pk__in=search_entries(search_term).values("pk")), False
 
     @admin.display(
-        description="Coordinator Name", ordering="coordinators__coordinator_name"
+        description="Coordinator Name", ordering=_first_coordinator("coordinator_name")
     )
     def get_coordinator_names(self, obj):
-        """Query coordinator names and return list of names"""
-        coordinators = Coordinator.objects.filter(affiliation_id=obj.pk).values_list(
-            "coordinator_name", flat=True
-        )
-        coordinator_names = []
-        for name in coordinators:
-            coordinator_names.append(name)
-        return coordinator_names
+        """Return the names of the prefetched coordinators."""
+        return [coordinator.coordinator_name for coordinator in obj.coordinators.all()]
 
     @admin.display(
         description="Coordinator Email",
+        ordering=_first_coordinator("coordinator_email"),
     )
     def get_coordinator_emails(self, obj):
-        """Query coordinator emails and return list of emails"""
-        coordinators = Coordinator.objects.filter(affiliation_id=obj.pk).values_list(
-            "coordinator_email", flat=True
-        )
-        coordinator_emails = []
-        for email in coordinators:
-            coordinator_emails.append(email)
-        return coordinator_emails
+        """Return the emails of the prefetched coordinators."""
+        return [coordinator.coordinator_email for coordinator in obj.coordinators.all()]
 
     # Controls what fields can be filtered on.
     list_filter = [
@@ -368,6 +369,14 @@ class AffiliationsAdmin(ExportMixin, ModelAdmin):  # pylint: disable=too-many-an
             "members",
         ]
 
+    def save_model(self, request, obj, form, change):
+        """Save an affiliation, allocating the IDs of a new one now that the
+        form and inlines are valid.
+        """
+        if not change:
+            form.allocate_ids()
+        super().save_model(request, obj, form, change)
+
     def render_change_form(self, request, context, *args, obj=None, **kwargs):
         if obj is None:
             context["media"] += forms.Media(
@@ -383,6 +392,104 @@ class AffiliationsAdmin(ExportMixin, ModelAdmin):  # pylint: disable=too-many-an
 # Add models we want to be able to edit in the admin interface.
 admin.site.register(Affiliation, AffiliationsAdmin)
 
+
+class ExportJobForm(forms.ModelForm):
+    """Pick the format and the affiliation fields of an export."""
+
+    fields = forms.MultipleChoiceField(
+        choices=[(name, name) for name in EXPORT_FIELDS],
+        initial=EXPORT_FIELDS,
+        widget=forms.CheckboxSelectMultiple,
+    )
+
+    class Meta:
+        """Only the format and fields are picked; the job fills in the rest."""
+
+        model = ExportJob
+        fields = ["export_format", "fields"]
+
+
+@admin.register(ExportJob)
+class ExportJobAdmin(ModelAdmin):
+    """Start export jobs, follow their progress and download their files."""
+
+    form = ExportJobForm
+    list_display = [
+        "__str__",
+        "status",
+        "get_progress",
+        "created_by",
+        "created_at",
+        "finished_at",
+        "get_download",
+    ]
+    list_filter = ["status", "export_format"]
+    readonly_fields = [
+        "status",
+        "get_progress",
+        "error",
+        "created_by",
+        "created_at",
+        "started_at",
+        "heartbeat_at",
+        "finished_at",
+        "get_download",
+    ]
+
+    def get_fields(self, request, obj=None):
+        """Only ask for the format and fields of new jobs."""
+        if obj is None:
+            return ["export_format", "fields"]
+        return ["export_format", "fields", *self.readonly_fields]
+
+    def has_change_permission(self, request, obj=None):
+        """Don't let jobs be edited once created."""
+        return False
+
+    def save_model(self, request, obj, form, change):
+        """Save a new job and start it once it is committed."""
+        obj.created_by = request.user
+        super().save_model(request, obj, form, change)
+        start_export_job(obj)
+
+    def get_urls(self):
+        """Add the download view to the admin's URLs."""
+        return [
+            path(
+                "<int:pk>/download/",
+                self.admin_site.admin_view(self.download_view),
+                name="affiliations_exportjob_download",
+            ),
+            *super().get_urls(),
+        ]
+
+    def download_view(self, request, pk):
+        """Send a finished job's file, a chunk at a time."""
+        job = self.get_object(request, pk)
+        if job is None or job.status != ExportStatus.DONE or not job.file:
+            raise Http404("This export has no file to download.")
+        if not self.has_view_permission(request, job):
+            raise PermissionDenied
+        return FileResponse(job.file.open("rb"), as_attachment=True)
+
+    @admin.display(description="Progress")
+    def get_progress(self, obj):
+        """Return how far the job has got."""
+        if obj.total_rows is None:
+            return f"{obj.progress}%"
+        return f"{obj.progress}% ({obj.rows_written} of {obj.total_rows} rows)"
+
+    @admin.display(description="File")
+    def get_download(self, obj):
+        """Link to the job's file once it is done."""
+        if obj.status != ExportStatus.DONE or not obj.file:
+            return "-"
+        return format_html(
+            '<a href="{}">Download</a>',
+            reverse("admin:affiliations_exportjob_download", args=[obj.pk]),
+        )
+
+
 # Change the admin site's display name.
 admin.site.site_title = "Affiliation Service"
 admin.site.site_header = "Affiliation Service Panel"
@@ -0,0 +1,144 @@
+"""Load approvers from a file of affiliations in the old JSON format.
+
+Each affiliation in the file may list its `approver` names. They are added to
+the affiliation's VCEP and GCEP, if its `subgroups` name them, or else to the
+affiliation with its affiliation ID. The affiliations are looked up with one
+query, as are their approvers, and only the approvers they don't have yet are
+inserted, in batches, so loading the same file twice adds nothing.
+"""
+
+# Built-in libraries:
+from collections import defaultdict
+from collections.abc import Iterable, Iterator
+from typing import NamedTuple
+
+# Third-party dependencies:
+from django.db import transaction
+
+# In-house code:
+from affiliations.bulk import BATCH_SIZE
+from affiliations.models import Affiliation, Approver, ChangeAction
+from affiliations.signals import batched_changes, notify_affiliations_changed
+
+
+class ApproverLoadResult(NamedTuple):
+    """Count the approvers a load created, those it skipped as the
+    affiliation already had them, and those the file listed again.
+    """
+
+    created: int
+    skipped: int
+    duplicates: int
+
+
+def _item_id(container, key: str, label: str, index: int) -> int:
+    """Return an ID of the item at a position in the file as an integer.
+
+    Raises `ValueError` naming the item if the ID is missing or isn't a
+    whole number.
+    """
+    value = container.get(key) if isinstance(container, dict) else None
+    try:
+        return int(value)
+    except (TypeError, ValueError):
+        raise ValueError(f"Item {index}: {label} {value!r} is not an ID.") from None
+
+
+def _targets(data: Iterable[dict]) -> Iterator[tuple[tuple[int, int | None], str]]:
+    """Yield the affiliation each approver in the file is for, as its
+    affiliation ID and expert panel ID, or None for any expert panel ID.
+
+    Raises `ValueError` naming the first item, counted from 1, whose IDs or
+    approvers are missing or malformed.
+    """
+    for index, item in enumerate(data, start=1):
+        if not isinstance(item, dict):
+            raise ValueError(f"Item {index}: expected an object.")
+        if "approver" not in item:
+            continue
+        names = item["approver"]
+        if not isinstance(names, list) or not all(
+            isinstance(name, str) for name in names
+        ):
+            raise ValueError(f"Item {index}: approver must be a list of names.")
+        affiliation_id = _item_id(item, "affiliation_id", "affiliation_id", index)
+        subgroups = item.get("subgroups") or {}
+        if not isinstance(subgroups, dict):
+            raise ValueError(f"Item {index}: subgroups must be an object.")
+        if subgroups:
+            keys = [
+                (
+                    affiliation_id,
+                    _item_id(subgroups[name], "id", f"subgroups.{name}.id", index),
+                )
+                for name in ("vcep", "gcep")
+                if name in subgroups
+            ]
+        else:
+            keys = [(affiliation_id, None)]
+        for key in keys:
+            for name in names:
+                yield key, name
+
+
+def _resolve(keys: set[tuple[int, int | None]]) -> dict[tuple[int, int | None], int]:
+    """Return the primary key of the affiliation each key names, with one
+    query.
+
+    Raises `ValueError` listing the keys that name no affiliation, or, with
+    no expert panel ID, more than one.
+    """
+    by_key = {}
+    by_affiliation_id = defaultdict(list)
+    for pk, affiliation_id, expert_panel_id in Affiliation.all_with_deleted.filter(
+        affiliation_id__in={affiliation_id for affiliation_id, _ in keys}
+    ).values_list("pk", "affiliation_id", "expert_panel_id"):
+        by_key[affiliation_id, expert_panel_id] = pk
+        by_affiliation_id[affiliation_id].append(pk)
+    resolved, unresolved = {}, []
+    for key in sorted(keys, key=lambda key: (key[0], key[1] or 0)):
+        affiliation_id, expert_panel_id = key
+        if expert_panel_id is not None and key in by_key:
+            resolved[key] = by_key[key]
+        elif expert_panel_id is None and len(by_affiliation_id[affiliation_id]) == 1:
+            resolved[key] = by_affiliation_id[affiliation_id][0]
+        else:
+            unresolved.append(f"{affiliation_id}/{expert_panel_id}")
+    if unresolved:
+        raise ValueError(
+            "No single affiliation has these affiliation/expert panel IDs: "
+            f"{', '.join(unresolved)}."
+        )
+    return resolved
+
+
+@transaction.atomic
+def load_approvers(data: Iterable[dict]) -> ApproverLoadResult:
+    """Add the approvers listed in old JSON format affiliations to the stored
+    affiliations that lack them.
+
+    Nothing is written if any item is malformed or any affiliation can't be
+    found, and the `ValueError` raised says which. An approver listed
+    more than once for an affiliation is counted once, and the repeats are
+    counted as duplicates rather than skipped.
+    """
+    listed = list(_targets(data))
+    affiliations = _resolve({key for key, _ in listed})
+    targets = dict.fromkeys((affiliations[key], name) for key, name in listed)
+    existing = set(
+        Approver.all_with_deleted.filter(
+            affiliation__in=set(affiliations.values())
+        ).values_list("affiliation_id", "approver_name")
+    )
+    missing = [target for target in targets if target not in existing]
+    with batched_changes():
+        Approver.all_with_deleted.bulk_create(
+            (Approver(affiliation_id=pk, approver_name=name) for pk, name in missing),
+            batch_size=BATCH_SIZE,
+        )
+        notify_affiliations_changed(
+            {pk for pk, _ in missing}, model="approver", action=ChangeAction.CREATED
+        )
+    return ApproverLoadResult(
+        len(missing), len(targets) - len(missing), len(listed) - len(targets)
+    )
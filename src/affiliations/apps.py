@@ -9,3 +9,8 @@ class AffiliationsConfig(AppConfig):
 
     default_auto_field = "django.db.models.BigAutoField"
     name = "affiliations"
+
+    def ready(self):
+        """Connect the signal receivers."""
+        # pylint: disable-next=import-outside-toplevel,unused-import
+        import affiliations.signals
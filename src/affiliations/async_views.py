@@ -0,0 +1,193 @@
+"""Native async views for the read-only affiliations endpoints.
+
+These serve the same data as the views in `affiliations.views`, but run on the
+event loop when the service is served by Daphne, so a worker isn't tied up by
+slow clients. They only render JSON and only support GET.
+"""
+
+# Third-party dependencies:
+from asgiref.sync import sync_to_async
+from django.db import transaction
+from django.http import HttpResponse, JsonResponse, StreamingHttpResponse
+from django.views.decorators.http import require_safe
+from rest_framework.exceptions import ValidationError
+from rest_framework_api_key.permissions import HasAPIKey
+
+# In-house code:
+from affiliations.cache import (
+    affiliation_by_pk,
+    affiliations_by_query_ids,
+    all_affiliations,
+    cached_response,
+)
+from affiliations.events import event_stream
+from affiliations.legacy import (
+    all_legacy_documents,
+    find_legacy_documents,
+    join_legacy_documents,
+)
+from affiliations.models import Affiliation
+from affiliations.params import query_param_batch_ids, query_param_ids, query_param_int
+from affiliations.renderers import FastJSONRenderer
+from affiliations.serializers import AffiliationSerializer
+from affiliations.streaming import (
+    STREAM_CHUNK_SIZE,
+    iterate_documents,
+    iterate_serialized,
+    streaming_json_array,
+    wants_stream,
+)
+from affiliations.versions import aload_data_version, conditional_on_data_version
+
+
+async def _has_api_key_or_user(request) -> bool:
+    """Return whether the request has a valid API key or a logged in user."""
+    user = await request.auser()
+    if user.is_authenticated:
+        return True
+    return await sync_to_async(HasAPIKey().has_permission)(request, None)
+
+
+def _forbidden() -> JsonResponse:
+    """Return the response DRF gives when credentials are missing."""
+    return JsonResponse(
+        {"detail": "Authentication credentials were not provided."}, status=403
+    )
+
+
+@conditional_on_data_version()
+@cached_response("affiliations_list", all_affiliations)
+async def _affiliations_list_json_format(request):
+    """Return every old JSON format snapshot."""
+    documents = all_legacy_documents()
+    if wants_stream(request):
+        return streaming_json_array(iterate_documents(documents), separator=", ")
+    return HttpResponse(
+        join_legacy_documents([document async for document in documents]),
+        content_type="application/json",
+    )
+
+
+@transaction.non_atomic_requests
+@require_safe
+async def affiliations_list_json_format(request):
+    """List all affiliations in old JSON format."""
+    if not await _has_api_key_or_user(request):
+        return _forbidden()
+    await aload_data_version(request)
+    return await _affiliations_list_json_format(request)
+
+
+@conditional_on_data_version(query_param_batch_ids)
+@cached_response("affiliation_detail", affiliations_by_query_ids)
+async def _affiliation_detail_json_format(request):
+    """Return the old JSON format snapshots asked for."""
+    documents = await sync_to_async(find_legacy_documents)(
+        *query_param_batch_ids(request)
+    )
+    return HttpResponse(
+        join_legacy_documents(documents), content_type="application/json"
+    )
+
+
+@transaction.non_atomic_requests
+@require_safe
+async def affiliation_detail_json_format(request):
+    """List specific affiliations in old JSON format."""
+    if not await _has_api_key_or_user(request):
+        return _forbidden()
+    await aload_data_version(request)
+    return await _affiliation_detail_json_format(request)
+
+
+@conditional_on_data_version()
+@cached_response("database_list", all_affiliations)
+async def _affiliations_list(request):
+    """Return every affiliation with its coordinators, approvers and submitters."""
+    queryset = AffiliationSerializer.setup_eager_loading(
+        Affiliation.objects.order_by("pk")
+    )
+    if wants_stream(request):
+        return streaming_json_array(iterate_serialized(queryset, AffiliationSerializer))
+    affils = [affil async for affil in queryset.aiterator(chunk_size=STREAM_CHUNK_SIZE)]
+    return HttpResponse(
+        FastJSONRenderer().render(AffiliationSerializer(affils, many=True).data),
+        content_type="application/json",
+    )
+
+
+@transaction.non_atomic_requests
+@require_safe
+async def affiliations_list(request):
+    """List all affiliations."""
+    await aload_data_version(request)
+    return await _affiliations_list(request)
+
+
+@conditional_on_data_version()
+@cached_response("database_detail", affiliation_by_pk)
+async def _affiliations_detail(request, pk):  # pylint: disable=unused-argument
+    """Return one affiliation with its coordinators, approvers and submitters."""
+    try:
+        affil = await AffiliationSerializer.setup_eager_loading(
+            Affiliation.objects.all()
+        ).aget(pk=pk)
+    except Affiliation.DoesNotExist:
+        return JsonResponse(
+            {"detail": "No Affiliation matches the given query."}, status=404
+        )
+    return HttpResponse(
+        FastJSONRenderer().render(AffiliationSerializer(affil).data),
+        content_type="application/json",
+    )
+
+
+@transaction.non_atomic_requests
+@require_safe
+async def affiliations_detail(request, pk):
+    """Retrieve an affiliation."""
+    await aload_data_version(request)
+    return await _affiliations_detail(request, pk=pk)
+
+
+def _last_event_id(request) -> int | None:
+    """Return the sequence a reconnecting client last received, if any.
+
+    Browsers send it in the `Last-Event-ID` header when they reconnect, and
+    clients can pass it as the `last_event_id` query param when they first
+    connect.
+    """
+    header = request.headers.get("Last-Event-ID", "").strip()
+    if header:
+        try:
+            return int(header)
+        except ValueError as exc:
+            raise ValidationError({"Last-Event-ID": ["Must be an integer."]}) from exc
+    return query_param_int(request, "last_event_id")
+
+
+@transaction.non_atomic_requests
+@require_safe
+async def affiliation_events(request):
+    """Stream the changes to affiliations as server-sent events.
+
+    Each event lists the changes of one write, with their sequence as its ID.
+    Any number of affiliation IDs (`affil_id`) and expert panel IDs (`ep_id`)
+    can be passed to only hear about them.
+    """
+    if not await _has_api_key_or_user(request):
+        return _forbidden()
+    try:
+        affil_ids = query_param_ids(request, "affil_id")
+        ep_ids = query_param_ids(request, "ep_id")
+        last_event_id = _last_event_id(request)
+    except ValidationError as exc:
+        return JsonResponse(exc.detail, status=400)
+    response = StreamingHttpResponse(
+        event_stream(affil_ids, ep_ids, last_event_id),
+        content_type="text/event-stream",
+    )
+    response["Cache-Control"] = "no-cache"
+    # Stop nginx from buffering the events.
+    response["X-Accel-Buffering"] = "no"
+    return response
@@ -0,0 +1,245 @@
+"""Write many affiliations, and their children, with few queries.
+
+Rows are written with `bulk_create` and `bulk_update`, which skip the model
+signals, so the writers here notify `affiliations_changed` themselves, inside
+`batched_changes`.
+"""
+
+# Built-in libraries:
+from collections import Counter, defaultdict
+from typing import NamedTuple
+
+# Third-party dependencies:
+from django.db import transaction
+
+# In-house code:
+from affiliations.models import Affiliation, ChangeAction
+from affiliations.signals import batched_changes, notify_affiliations_changed
+
+# Rows per INSERT or UPDATE. Much larger statements are slower to build than
+# the round trips they save.
+BATCH_SIZE = 250
+
+
+class UpsertResult(NamedTuple):
+    """List the affiliations an upsert created and updated."""
+
+    created: list[Affiliation]
+    updated: list[Affiliation]
+
+
+def affiliation_key(values) -> tuple[int, int | None]:
+    """Return what identifies an affiliation: its affiliation and expert panel
+    IDs. Takes a dict or an `Affiliation`.
+    """
+    if isinstance(values, Affiliation):
+        return values.affiliation_id, values.expert_panel_id
+    return values.get("affiliation_id"), values.get("expert_panel_id")
+
+
+def split_children(validated_data: dict) -> tuple[dict, dict[str, list[dict]]]:
+    """Split an affiliation's validated data into its own fields and the lists
+    of children of each relation, keyed by relation name.
+    """
+    own, children = {}, {}
+    for name, value in validated_data.items():
+        field = Affiliation._meta.get_field(name)  # pylint: disable=protected-access
+        if field.one_to_many:
+            children[name] = value
+        else:
+            own[name] = value
+    return own, children
+
+
+def _values(fields: list[str], data) -> tuple:
+    """Return the values of some fields of a child, or of a dict of them."""
+    if isinstance(data, dict):
+        return tuple(data.get(name) for name in fields)
+    return tuple(getattr(data, name) for name in fields)
+
+
+def _diff_children(fields: list[str], rows: list, items: list[dict]):
+    """Pair up one affiliation's child rows with the dicts it should have.
+
+    Returns the rows to update with the dict each should take, the rows to
+    delete and the dicts to insert. Rows that equal a dict are left alone.
+    """
+    unmatched = Counter(_values(fields, item) for item in items)
+    leftover_rows = []
+    for row in rows:
+        values = _values(fields, row)
+        if unmatched[values]:
+            unmatched[values] -= 1
+        else:
+            leftover_rows.append(row)
+    leftover_items = [dict(zip(fields, values)) for values in unmatched.elements()]
+    return (
+        list(zip(leftover_rows, leftover_items)),
+        leftover_rows[len(leftover_items) :],
+        leftover_items[len(leftover_rows) :],
+    )
+
+
+def _existing_children(related, parents: list[Affiliation], new: set[int]):
+    """Return the stored children of a relation of each affiliation, keyed by
+    the affiliation's primary key, reusing those already prefetched.
+    """
+    parent_attname = related.field.attname
+    existing = defaultdict(list)
+    lookup = []
+    for parent in parents:
+        prefetched = getattr(parent, "_prefetched_objects_cache", {})
+        if related.name in prefetched:
+            existing[parent.pk] = list(prefetched[related.name])
+        elif parent.pk not in new:
+            lookup.append(parent.pk)
+    if lookup:
+        for row in related.related_model.all_with_deleted.filter(
+            **{f"{parent_attname}__in": lookup}
+        ).order_by("pk"):
+            existing[getattr(row, parent_attname)].append(row)
+    return existing
+
+
+def _plan_children(related, fields, existing, children_by_parent):
+    """Return the children of a relation to create, update and delete, and the
+    primary keys of the affiliations whose children change.
+    """
+    to_create, to_update, to_delete, changed = [], [], [], set()
+    for parent, items in children_by_parent:
+        reused, deleted, inserted = _diff_children(fields, existing[parent.pk], items)
+        for row, item in reused:
+            assign_fields(row, item)
+            to_update.append(row)
+        to_delete.extend(deleted)
+        to_create.extend(
+            related.related_model(**{related.field.name: parent}, **item)
+            for item in inserted
+        )
+        if reused or deleted or inserted:
+            changed.add(parent.pk)
+    return to_create, to_update, to_delete, changed
+
+
+def sync_children(
+    relation: str, children_by_parent: list[tuple[Affiliation, list[dict]]], new=()
+) -> set[int]:
+    """Make the children of a relation of each saved affiliation match the
+    dicts paired with it, returning the primary keys of the affiliations that
+    changed.
+
+    Children have no identity of their own, so existing rows that equal a dict
+    are kept, the rest are reused for the remaining dicts, and only what is
+    left over is inserted or deleted. The primary keys in `new` are of
+    affiliations that have no children yet, which saves looking them up, as
+    do children already prefetched.
+    """
+    related = Affiliation._meta.get_field(relation)  # pylint: disable=protected-access
+    model, parent_field = related.related_model, related.field
+    fields = sorted(
+        {name for _, items in children_by_parent for item in items for name in item}
+    )
+    new = set(new)
+    existing = _existing_children(
+        related, [parent for parent, _ in children_by_parent], new
+    )
+
+    to_create, to_update, to_delete, changed = _plan_children(
+        related, fields, existing, children_by_parent
+    )
+    model_name = model._meta.model_name  # pylint: disable=protected-access
+    if to_create:
+        model.all_with_deleted.bulk_create(to_create, batch_size=BATCH_SIZE)
+        # New affiliations are logged as created, children and all.
+        notify_affiliations_changed(
+            {getattr(row, parent_field.attname) for row in to_create} - new,
+            model=model_name,
+            action=ChangeAction.CREATED,
+        )
+    if to_update:
+        model.all_with_deleted.bulk_update(to_update, fields, batch_size=BATCH_SIZE)
+        notify_affiliations_changed(
+            {getattr(row, parent_field.attname) for row in to_update},
+            model=model_name,
+        )
+    if to_delete:
+        # The model signals notify these.
+        model.all_with_deleted.filter(pk__in=[row.pk for row in to_delete]).delete()
+    return changed
+
+
+def _existing_affiliations(keys) -> dict[tuple[int, int | None], Affiliation]:
+    """Return the stored affiliations with the given keys, deleted or not."""
+    found = {}
+    queryset = Affiliation.all_with_deleted.filter(
+        affiliation_id__in={affiliation_id for affiliation_id, _ in keys}
+    )
+    for affiliation in queryset:
+        found[affiliation_key(affiliation)] = affiliation
+    return {key: found[key] for key in keys if key in found}
+
+
+def assign_fields(instance, values: dict) -> set[str]:
+    """Set the fields of an affiliation, or of a child, returning the names
+    of those that changed.
+    """
+    changed = set()
+    for name, value in values.items():
+        if getattr(instance, name) != value:
+            setattr(instance, name, value)
+            changed.add(name)
+    return changed
+
+
+def _plan_upsert(items: list[dict], existing: dict):
+    """Sort validated affiliations into new ones and changed stored ones.
+
+    Returns the affiliations to create, those to update, the names of the
+    fields to update, and the children of each, keyed by relation name.
+    """
+    created, updated, changed_fields = [], [], set()
+    children = defaultdict(list)
+    for item in items:
+        own, item_children = split_children(item)
+        affiliation = existing.get(affiliation_key(own))
+        if affiliation is None:
+            affiliation = Affiliation(**own)
+            created.append(affiliation)
+        elif changed := assign_fields(affiliation, own):
+            changed_fields |= changed
+            updated.append(affiliation)
+        for relation, relation_children in item_children.items():
+            children[relation].append((affiliation, relation_children))
+    return created, updated, changed_fields, children
+
+
+@transaction.atomic
+def upsert_affiliations(items: list[dict]) -> UpsertResult:
+    """Create or update affiliations, and their children, from validated data.
+
+    Each affiliation is matched to a stored one by its affiliation and expert
+    panel IDs. Only the fields and children that differ are written, and
+    affiliations with no differences aren't counted as updated.
+    """
+    with batched_changes():
+        existing = _existing_affiliations([affiliation_key(item) for item in items])
+        created, updated, changed_fields, children = _plan_upsert(items, existing)
+        Affiliation.all_with_deleted.bulk_create(created, batch_size=BATCH_SIZE)
+        if updated:
+            Affiliation.all_with_deleted.bulk_update(
+                updated, sorted(changed_fields), batch_size=BATCH_SIZE
+            )
+        new = {affiliation.pk for affiliation in created}
+        notify_affiliations_changed(new, action=ChangeAction.CREATED)
+        notify_affiliations_changed(affiliation.pk for affiliation in updated)
+        changed_pks = {affiliation.pk for affiliation in updated}
+        for relation, children_by_parent in children.items():
+            changed_pks |= sync_children(relation, children_by_parent, new)
+    return UpsertResult(
+        created,
+        [
+            affiliation
+            for affiliation in existing.values()
+            if affiliation.pk in changed_pks
+        ],
+    )
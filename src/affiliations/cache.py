@@ -0,0 +1,243 @@
+"""Cache the rendered responses of the read endpoints.
+
+Entries are keyed by endpoint, query params, caller, rendered format and the
+generation numbers of the data they were built from. When an affiliation is
+written, the generations of every list, of its detail and of its affiliation
+ID are bumped once the transaction commits, so only the entries that could
+contain it become unreachable. Unreachable entries expire on their own.
+"""
+
+# Built-in libraries:
+from functools import wraps
+import hashlib
+import time
+
+# Third-party dependencies:
+from asgiref.sync import iscoroutinefunction, sync_to_async
+from django.core.cache import cache
+from django.db import transaction
+from django.http import HttpResponse
+from rest_framework.exceptions import ValidationError
+from rest_framework.response import Response
+from rest_framework_api_key.permissions import KeyParser
+
+# In-house code:
+from affiliations.params import query_param_ids
+
+ALL_GENERATION = "affils:generation:all"
+HITS_KEY = "affils:stats:hits"
+MISSES_KEY = "affils:stats:misses"
+
+
+def _pk_generation(pk) -> str:
+    """Return the generation key of one affiliation's detail."""
+    return f"affils:generation:pk:{pk}"
+
+
+def _affiliation_id_generation(affiliation_id) -> str:
+    """Return the generation key of one affiliation ID."""
+    return f"affils:generation:affiliation_id:{affiliation_id}"
+
+
+# pylint: disable-next=unused-argument
+def all_affiliations(request, *args, **kwargs) -> list[str]:
+    """Return the generations of a response listing every affiliation."""
+    return [ALL_GENERATION]
+
+
+# pylint: disable-next=unused-argument
+def affiliation_by_pk(request, *args, pk, **kwargs) -> list[str]:
+    """Return the generations of a response about one affiliation."""
+    return [_pk_generation(pk)]
+
+
+# pylint: disable-next=unused-argument
+def affiliations_by_query_ids(request, *args, **kwargs) -> list[str]:
+    """Return the generations of a response about the affiliation IDs in the
+    `affil_id` query params.
+
+    Expert panel IDs can't be mapped to affiliation IDs without a query, so
+    responses about them depend on every affiliation.
+    """
+    if request.GET.get("ep_id"):
+        return [ALL_GENERATION]
+    try:
+        affil_ids = query_param_ids(request, "affil_id")
+    except ValidationError:
+        return [ALL_GENERATION]
+    return [_affiliation_id_generation(affil_id) for affil_id in sorted(affil_ids)]
+
+
+def _new_generation() -> int:
+    """Return a generation that an evicted generation can't have had."""
+    return time.time_ns()
+
+
+def _current_generations(keys: list[str]) -> list[int]:
+    """Return the current value of each generation, creating missing ones."""
+    generations = cache.get_many(keys)
+    for key in keys:
+        if key not in generations:
+            cache.add(key, _new_generation(), None)
+            generations[key] = cache.get(key)
+    return [generations[key] for key in keys]
+
+
+def _bump(key: str) -> None:
+    """Move a generation on, making entries built from it unreachable."""
+    try:
+        cache.incr(key)
+    except ValueError:
+        cache.set(key, _new_generation(), None)
+
+
+def invalidate(pks, affiliation_ids) -> None:
+    """Invalidate every entry that could contain the given affiliations."""
+    _bump(ALL_GENERATION)
+    for pk in pks:
+        _bump(_pk_generation(pk))
+    for affiliation_id in affiliation_ids:
+        _bump(_affiliation_id_generation(affiliation_id))
+
+
+def invalidate_on_commit(pks, affiliation_ids) -> None:
+    """Invalidate the entries once the current transaction commits.
+
+    Doing it earlier would let a concurrent request cache the data from before
+    the commit under the new generation.
+    """
+    pks = set(pks)
+    affiliation_ids = set(affiliation_ids)
+    transaction.on_commit(lambda: invalidate(pks, affiliation_ids))
+
+
+def _count(key: str) -> None:
+    """Increment a hit or miss counter."""
+    cache.add(key, 0, None)
+    try:
+        cache.incr(key)
+    except ValueError:
+        pass
+
+
+def stats() -> dict[str, int]:
+    """Return how many lookups hit and missed the cache."""
+    counts = cache.get_many([HITS_KEY, MISSES_KEY])
+    return {"hits": counts.get(HITS_KEY, 0), "misses": counts.get(MISSES_KEY, 0)}
+
+
+def _principal(request, user) -> str:
+    """Return who is making the request."""
+    if user.is_authenticated:
+        return f"user:{user.pk}"
+    key = KeyParser().get(request)
+    if key:
+        return f"key:{key.partition('.')[0]}"
+    return "anonymous"
+
+
+def _response_format(request) -> str | None:
+    """Return the rendered format, or None if it shouldn't be cached."""
+    renderer = getattr(request, "accepted_renderer", None)
+    if renderer is None:
+        return "json"
+    # The browsable API embeds per-session details such as CSRF tokens.
+    if renderer.format != "json":
+        return None
+    return renderer.format
+
+
+def _cache_key(scope, request, principal, response_format, generations) -> str:
+    """Return the cache key of a response."""
+    params = sorted(
+        (name, value) for name, values in request.GET.lists() for value in values
+    )
+    raw_key = repr((scope, principal, response_format, params, generations))
+    return f"affils:response:{hashlib.sha256(raw_key.encode()).hexdigest()}"
+
+
+def _rendered_content(request, response):
+    """Render a DRF response the way the view would, returning its content."""
+    if isinstance(response, Response) and not response.is_rendered:
+        view = request.parser_context["view"]
+        response.accepted_renderer = request.accepted_renderer
+        response.accepted_media_type = request.accepted_media_type
+        response.renderer_context = view.get_renderer_context()
+        response.render()
+    return response.content
+
+
+def _cached_response(entry) -> HttpResponse:
+    """Rebuild a response from a cache entry."""
+    content, content_type = entry
+    response = HttpResponse(content, content_type=content_type)
+    response.headers["X-Cache"] = "HIT"
+    return response
+
+
+def _cacheable(response) -> bool:
+    """Return whether a response may be stored."""
+    return response.status_code == 200 and not response.streaming
+
+
+def cached_response(scope, generations_func):
+    """Cache the JSON responses of a read view.
+
+    `generations_func` is passed the view's arguments and returns the keys of
+    the generations the response depends on. The decorator must be applied
+    after authentication has happened, and works on sync and async views.
+    """
+
+    def decorator(view_func):
+        if iscoroutinefunction(view_func):
+
+            @wraps(view_func)
+            async def async_inner(request, *args, **kwargs):
+                response_format = _response_format(request)
+                if response_format is None:
+                    return await view_func(request, *args, **kwargs)
+                principal = _principal(request, await request.auser())
+                generations = await sync_to_async(_current_generations)(
+                    generations_func(request, *args, **kwargs)
+                )
+                key = _cache_key(
+                    scope, request, principal, response_format, generations
+                )
+                entry = await cache.aget(key)
+                if entry is not None:
+                    await sync_to_async(_count)(HITS_KEY)
+                    return _cached_response(entry)
+                await sync_to_async(_count)(MISSES_KEY)
+                response = await view_func(request, *args, **kwargs)
+                if _cacheable(response):
+                    await cache.aset(key, (response.content, response["Content-Type"]))
+                    response.headers["X-Cache"] = "MISS"
+                return response
+
+            return async_inner
+
+        @wraps(view_func)
+        def inner(request, *args, **kwargs):
+            response_format = _response_format(request)
+            if response_format is None:
+                return view_func(request, *args, **kwargs)
+            principal = _principal(request, request.user)
+            generations = _current_generations(
+                generations_func(request, *args, **kwargs)
+            )
+            key = _cache_key(scope, request, principal, response_format, generations)
+            entry = cache.get(key)
+            if entry is not None:
+                _count(HITS_KEY)
+                return _cached_response(entry)
+            _count(MISSES_KEY)
+            response = view_func(request, *args, **kwargs)
+            if _cacheable(response):
+                content = _rendered_content(request, response)
+                cache.set(key, (content, response["Content-Type"]))
+                response.headers["X-Cache"] = "MISS"
+            return response
+
+        return inner
+
+    return decorator
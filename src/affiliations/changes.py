@@ -0,0 +1,152 @@
+"""Log every change to the affiliation data, for clients that sync from it.
+
+Each write that sends `affiliations_changed` bumps the data version, and
+records one entry per changed affiliation, affiliation or child, with the new
+version as its sequence. Old entries are compacted and then deleted by the
+`prune_change_log` management command, as configured by the `CHANGE_LOG_*`
+settings.
+"""
+
+# Built-in libraries:
+from collections.abc import Iterable
+from datetime import timedelta
+from typing import NamedTuple
+
+# Third-party dependencies:
+from django.conf import settings
+from django.db import transaction
+from django.db.models import F, Max, OuterRef, Subquery
+from django.db.models.functions import Greatest
+from django.utils import timezone
+from rest_framework.fields import DateTimeField
+
+# In-house code:
+from affiliations.models import ChangeLogEntry, DataVersion
+from affiliations.versions import DATA_VERSION_PK
+
+
+# Rows per INSERT when logging changes. Much larger statements are slower to
+# build than the round trips they save.
+BATCH_SIZE = 250
+
+
+class Change(NamedTuple):
+    """Describe a write to an affiliation or to one of its children."""
+
+    model: str
+    action: str
+    affiliation_pk: int
+    affiliation_id: int
+    expert_panel_id: int | None
+
+
+def record_changes(sequence: int, changes: Iterable[Change]) -> list[ChangeLogEntry]:
+    """Log the changes made by the write that bumped the data version."""
+    return ChangeLogEntry.objects.bulk_create(
+        [
+            ChangeLogEntry(
+                sequence=sequence,
+                affiliation_pk=change.affiliation_pk,
+                affiliation_id=change.affiliation_id,
+                expert_panel_id=change.expert_panel_id,
+                model=change.model,
+                action=change.action,
+            )
+            for change in dict.fromkeys(changes)
+        ],
+        batch_size=BATCH_SIZE,
+    )
+
+
+def change_data(entry: ChangeLogEntry) -> dict:
+    """Return how changes/ and events/ represent a change log entry."""
+    return {
+        "sequence": entry.sequence,
+        "affiliation_id": entry.affiliation_id,
+        "expert_panel_id": entry.expert_panel_id,
+        "model": entry.model,
+        "action": entry.action,
+        "changed_at": DateTimeField().to_representation(entry.changed_at),
+    }
+
+
+def changes_since(since: int, limit: int) -> tuple[list[ChangeLogEntry], bool]:
+    """Return about `limit` entries after a sequence, and whether there are
+    more after them.
+
+    The entries of one sequence are never split across calls, so there may
+    be a few more than `limit`.
+    """
+    entries = list(
+        ChangeLogEntry.objects.filter(sequence__gt=since).order_by("sequence", "pk")[
+            : limit + 1
+        ]
+    )
+    if len(entries) <= limit:
+        return entries, False
+    entries = entries[:limit]
+    last = entries[-1]
+    entries.extend(
+        ChangeLogEntry.objects.filter(sequence=last.sequence, pk__gt=last.pk).order_by(
+            "pk"
+        )
+    )
+    return entries, ChangeLogEntry.objects.filter(sequence__gt=last.sequence).exists()
+
+
+def _compact(before) -> int:
+    """Delete the entries from before a time that are followed by a later
+    entry for the same affiliation, returning how many were deleted.
+
+    A client that hasn't seen one of these entries will see the later one,
+    and re-read the affiliation all the same.
+    """
+    latest = (
+        ChangeLogEntry.objects.filter(affiliation_pk=OuterRef("affiliation_pk"))
+        .order_by("-sequence", "-pk")
+        .values("pk")[:1]
+    )
+    deleted, _ = (
+        ChangeLogEntry.objects.filter(changed_at__lt=before)
+        .exclude(pk=Subquery(latest))
+        .delete()
+    )
+    return deleted
+
+
+def _expire(before) -> int:
+    """Delete every entry up to the last one from before a time, returning
+    how many were deleted.
+
+    Clients asking for changes after an earlier sequence are then told to
+    sync again from scratch.
+    """
+    through = ChangeLogEntry.objects.filter(changed_at__lt=before).aggregate(
+        through=Max("sequence")
+    )["through"]
+    if through is None:
+        return 0
+    deleted, _ = ChangeLogEntry.objects.filter(sequence__lte=through).delete()
+    DataVersion.objects.filter(pk=DATA_VERSION_PK).update(
+        changes_pruned_through=Greatest(F("changes_pruned_through"), through)
+    )
+    return deleted
+
+
+@transaction.atomic
+def prune_change_log(now=None) -> tuple[int, int]:
+    """Compact and expire old entries, returning how many of each were deleted.
+
+    Entries are compacted after `CHANGE_LOG_COMPACT_AFTER_DAYS` and expired
+    after `CHANGE_LOG_RETENTION_DAYS`. Either setting may be None to keep
+    entries forever.
+    """
+    now = now or timezone.now()
+    compacted = expired = 0
+    if settings.CHANGE_LOG_COMPACT_AFTER_DAYS is not None:
+        compacted = _compact(
+            now - timedelta(days=settings.CHANGE_LOG_COMPACT_AFTER_DAYS)
+        )
+    if settings.CHANGE_LOG_RETENTION_DAYS is not None:
+        expired = _expire(now - timedelta(days=settings.CHANGE_LOG_RETENTION_DAYS))
+    return compacted, expired
@@ -0,0 +1,298 @@
+"""Push affiliation changes to clients as server-sent events.
+
+Once a write commits, the change log entries it made are published to a broker
+as one message per sequence. Each open events/ stream subscribes to the broker
+and forwards the messages that match the affiliation and expert panel IDs it
+asked for. A stream that is resumed with a `Last-Event-ID` first replays the
+change log after that sequence.
+
+`AFFILS_EVENTS_BACKEND` picks the broker: "local" only reaches the streams of
+the same process, while "redis" relays messages through Redis pub/sub so every
+process gets them.
+"""
+
+# Built-in libraries:
+import asyncio
+from collections import defaultdict
+from collections.abc import AsyncIterator, Iterable
+from contextlib import asynccontextmanager
+from functools import cache
+from itertools import groupby
+import json
+import threading
+
+# Third-party dependencies:
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.core.exceptions import ImproperlyConfigured
+from django.db import transaction
+import redis
+import redis.asyncio
+
+# In-house code:
+from affiliations.changes import change_data, changes_since
+from affiliations.models import ChangeLogEntry, DataVersion
+from affiliations.renderers import COMPACT_SEPARATORS, json_dumps
+from affiliations.versions import DATA_VERSION_PK
+
+EVENTS_CHANNEL = "affils:events"
+REPLAY_BATCH_SIZE = 1000
+
+
+def _messages(entries: Iterable[ChangeLogEntry]) -> list[dict]:
+    """Group change log entries into one message per sequence."""
+    return [
+        {
+            "sequence": sequence,
+            "changes": [change_data(entry) for entry in group],
+        }
+        for sequence, group in groupby(entries, key=lambda entry: entry.sequence)
+    ]
+
+
+class Subscription:
+    """Queue the messages published to one subscriber on its event loop.
+
+    A subscriber that falls more than `EVENTS_QUEUE_SIZE` messages behind is
+    dropped: its queue is cleared and ends with None, so its stream closes and
+    the client resumes from the change log.
+    """
+
+    def __init__(self):
+        """Create an empty queue on the running event loop."""
+        self.loop = asyncio.get_running_loop()
+        self.queue: asyncio.Queue = asyncio.Queue(settings.EVENTS_QUEUE_SIZE)
+        self.dropped = False
+
+    def put(self, message: dict) -> None:
+        """Queue a message, dropping the subscriber if the queue is full."""
+        if self.dropped:
+            return
+        try:
+            self.queue.put_nowait(message)
+        except asyncio.QueueFull:
+            self.dropped = True
+            while not self.queue.empty():
+                self.queue.get_nowait()
+            self.queue.put_nowait(None)
+
+    async def get(self, timeout: float) -> dict | None:
+        """Wait for the next message, or None once dropped.
+
+        Raises `asyncio.TimeoutError` if none arrives within `timeout` seconds.
+        """
+        return await asyncio.wait_for(self.queue.get(), timeout)
+
+
+def _put_all(subscriptions: list[Subscription], message: dict) -> None:
+    """Queue a message for subscribers, on their event loop."""
+    for subscription in subscriptions:
+        subscription.put(message)
+
+
+class LocalBroker:
+    """Deliver messages to the subscribers of this process."""
+
+    def __init__(self):
+        """Start without subscribers."""
+        self._subscriptions: set[Subscription] = set()
+        self._lock = threading.Lock()
+
+    def deliver(self, message: dict) -> None:
+        """Hand a message to every subscriber of this process, from any thread.
+
+        Waking an event loop is the costly part, so each loop is woken once
+        to queue the message for all of its subscribers.
+        """
+        by_loop = defaultdict(list)
+        with self._lock:
+            for subscription in self._subscriptions:
+                by_loop[subscription.loop].append(subscription)
+        for loop, subscriptions in by_loop.items():
+            try:
+                loop.call_soon_threadsafe(_put_all, subscriptions, message)
+            except RuntimeError:
+                # The event loop has closed.
+                with self._lock:
+                    self._subscriptions.difference_update(subscriptions)
+
+    def publish(self, message: dict) -> None:
+        """Send a message to every subscriber."""
+        self.deliver(message)
+
+    async def _listen(self) -> None:
+        """Start receiving the messages published elsewhere, if any."""
+
+    @asynccontextmanager
+    async def subscribe(self) -> AsyncIterator[Subscription]:
+        """Receive the messages published while the context is open."""
+        subscription = Subscription()
+        await self._listen()
+        with self._lock:
+            self._subscriptions.add(subscription)
+        try:
+            yield subscription
+        finally:
+            with self._lock:
+                self._subscriptions.discard(subscription)
+
+    @property
+    def subscriber_count(self) -> int:
+        """Return how many subscribers this process has."""
+        return len(self._subscriptions)
+
+
+class RedisBroker(LocalBroker):
+    """Relay messages between processes through Redis pub/sub.
+
+    Each process holds one Redis subscription, whatever its number of
+    subscribers, and hands the messages it receives to them.
+    """
+
+    def __init__(self, url: str, channel: str = EVENTS_CHANNEL):
+        """Connect lazily to the Redis server at `url`."""
+        super().__init__()
+        self._url = url
+        self._channel = channel
+        self._client = redis.Redis.from_url(url)
+        self._listener: asyncio.Task | None = None
+
+    def publish(self, message: dict) -> None:
+        """Send a message to the subscribers of every process."""
+        self._client.publish(self._channel, json.dumps(message))
+
+    async def _relay(self) -> None:
+        """Hand every message published to Redis to this process's subscribers."""
+        client = redis.asyncio.Redis.from_url(self._url)
+        async with client.pubsub(ignore_subscribe_messages=True) as pubsub:
+            await pubsub.subscribe(self._channel)
+            async for item in pubsub.listen():
+                self.deliver(json.loads(item["data"]))
+
+    async def _listen(self) -> None:
+        """Start relaying messages on this event loop, unless already doing so."""
+        if self._listener is None or self._listener.done():
+            self._listener = asyncio.create_task(self._relay())
+
+
+@cache
+def get_broker() -> LocalBroker:
+    """Return the broker configured by `AFFILS_EVENTS_BACKEND`."""
+    if settings.AFFILS_EVENTS_BACKEND == "redis":
+        return RedisBroker(settings.AFFILS_EVENTS_LOCATION)
+    if settings.AFFILS_EVENTS_BACKEND == "local":
+        return LocalBroker()
+    raise ImproperlyConfigured(
+        f"Unknown events backend: {settings.AFFILS_EVENTS_BACKEND}."
+    )
+
+
+def _publish(entries: list[ChangeLogEntry]) -> None:
+    """Publish change log entries to the broker."""
+    broker = get_broker()
+    for message in _messages(entries):
+        broker.publish(message)
+
+
+def publish_on_commit(entries: list[ChangeLogEntry]) -> None:
+    """Publish change log entries once the current transaction commits.
+
+    A broker that can't be reached is logged rather than failing the write,
+    and clients catch up from the change log when they reconnect.
+    """
+    if entries:
+        transaction.on_commit(lambda: _publish(entries), robust=True)
+
+
+def _matching(message: dict, affil_ids: set[int], ep_ids: set[int]) -> dict | None:
+    """Return the message with only the changes to the IDs asked for, or None
+    if there are none. Without IDs, every change matches.
+    """
+    if not affil_ids and not ep_ids:
+        return message
+    changes = [
+        change
+        for change in message["changes"]
+        if change["affiliation_id"] in affil_ids or change["expert_panel_id"] in ep_ids
+    ]
+    return {**message, "changes": changes} if changes else None
+
+
+def _event(message: dict, name: str = "changes") -> str:
+    """Format a message as a server-sent event."""
+    lines = [f"event: {name}"]
+    if "sequence" in message:
+        lines.insert(0, f"id: {message['sequence']}")
+    lines.append(f"data: {json_dumps(message, COMPACT_SEPARATORS)}")
+    return "\n".join(lines) + "\n\n"
+
+
+def _replay_batch(since: int) -> tuple[list[dict], bool] | None:
+    """Return the messages after a sequence and whether there are more, or
+    None if some of them have been pruned.
+    """
+    pruned_through = (
+        DataVersion.objects.filter(pk=DATA_VERSION_PK)
+        .values_list("changes_pruned_through", flat=True)
+        .first()
+    )
+    if since < (pruned_through or 0):
+        return None
+    entries, has_more = changes_since(since, REPLAY_BATCH_SIZE)
+    return _messages(entries), has_more
+
+
+async def _replay(since: int) -> AsyncIterator[dict | None]:
+    """Yield the logged messages after a sequence, or None if they've been
+    pruned.
+    """
+    has_more = True
+    while has_more:
+        batch = await sync_to_async(_replay_batch)(since)
+        if batch is None:
+            yield None
+            return
+        messages, has_more = batch
+        for message in messages:
+            yield message
+            since = message["sequence"]
+
+
+async def event_stream(
+    affil_ids: Iterable[int] = (),
+    ep_ids: Iterable[int] = (),
+    last_event_id: int | None = None,
+) -> AsyncIterator[str]:
+    """Yield the changes to the IDs asked for as server-sent events.
+
+    The changes logged after `last_event_id` are replayed first; if they have
+    been pruned, a `reset` event tells the client to read every affiliation
+    again. A comment is sent after `EVENTS_HEARTBEAT_SECONDS` without events,
+    so proxies keep the connection open.
+    """
+    affil_ids, ep_ids = set(affil_ids), set(ep_ids)
+    yield f"retry: {settings.EVENTS_RETRY_MILLISECONDS}\n\n"
+    async with get_broker().subscribe() as subscription:
+        replayed_through = last_event_id
+        if last_event_id is not None:
+            async for message in _replay(last_event_id):
+                if message is None:
+                    yield _event({}, name="reset")
+                    break
+                replayed_through = message["sequence"]
+                message = _matching(message, affil_ids, ep_ids)
+                if message:
+                    yield _event(message)
+        while True:
+            try:
+                message = await subscription.get(settings.EVENTS_HEARTBEAT_SECONDS)
+            except asyncio.TimeoutError:
+                yield ": heartbeat\n\n"
+                continue
+            if message is None:
+                return
+            if replayed_through is not None and message["sequence"] <= replayed_through:
+                continue
+            message = _matching(message, affil_ids, ep_ids)
+            if message:
+                yield _event(message)
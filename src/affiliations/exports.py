@@ -0,0 +1,197 @@
+"""Export every affiliation to a file in the background.
+
+Admins ask for an export by creating an `ExportJob`. Once it is committed, the
+job runs in a thread of the process that created it. Jobs left pending, and
+running jobs that have made no progress for `EXPORT_JOB_TIMEOUT_MINUTES`, e.g.
+because a crash or a restart interrupted them, are run by the `run_export_jobs`
+management command, which cron runs every minute. The affiliations are read a chunk at a
+time with `QuerySet.iterator` and written straight to a temporary file, so the
+memory an export takes doesn't grow with the number of affiliations.
+"""
+
+# Built-in libraries:
+from collections.abc import Iterable, Iterator
+import csv
+import datetime
+import io
+import tempfile
+import threading
+
+# Third-party dependencies:
+from django.conf import settings
+from django.core.files import File
+from django.db import connection, transaction
+from django.db.models import Q, QuerySet
+from django.utils import timezone
+import openpyxl
+
+# In-house code:
+from affiliations.models import Affiliation, ExportFormat, ExportJob, ExportStatus
+from affiliations.renderers import json_dumps
+
+# The affiliation fields that can be exported, in the order of the columns.
+# pylint:disable=duplicate-code
+EXPORT_FIELDS = [
+    "affiliation_id",
+    "expert_panel_id",
+    "full_name",
+    "short_name",
+    "status",
+    "type",
+    "clinical_domain_working_group",
+    "is_deleted",
+]
+
+# Rows read per query, and written between progress updates.
+CHUNK_SIZE = 2000
+
+
+def _write_csv(handle, fields: list[str], rows: Iterable[tuple]) -> None:
+    """Write the rows as CSV, with a header row."""
+    text = io.TextIOWrapper(handle, encoding="utf-8", newline="")
+    writer = csv.writer(text)
+    writer.writerow(fields)
+    writer.writerows(rows)
+    text.detach()
+
+
+def _write_json(handle, fields: list[str], rows: Iterable[tuple]) -> None:
+    """Write the rows as a JSON array of objects, one object at a time."""
+    handle.write(b"[")
+    for index, row in enumerate(rows):
+        if index:
+            handle.write(b",")
+        handle.write(b"\n")
+        handle.write(json_dumps(dict(zip(fields, row))).encode())
+    handle.write(b"\n]\n")
+
+
+def _write_xlsx(handle, fields: list[str], rows: Iterable[tuple]) -> None:
+    """Write the rows to an Excel sheet, with a header row.
+
+    The workbook is write-only, so openpyxl keeps the rows on disk rather than
+    in memory.
+    """
+    workbook = openpyxl.Workbook(write_only=True)
+    sheet = workbook.create_sheet("Affiliations")
+    sheet.append(fields)
+    for row in rows:
+        sheet.append(row)
+    workbook.save(handle)
+
+
+# The writer and file extension of each export format.
+WRITERS = {
+    ExportFormat.CSV: (_write_csv, "csv"),
+    ExportFormat.XLSX: (_write_xlsx, "xlsx"),
+    ExportFormat.JSON: (_write_json, "json"),
+}
+
+
+def _rows(job: ExportJob) -> Iterator[tuple]:
+    """Yield the rows of an export, saving how many were written, and when,
+    after every chunk.
+    """
+    queryset = Affiliation.all_with_deleted.order_by("pk").values_list(*job.fields)
+    written = 0
+    for written, row in enumerate(queryset.iterator(chunk_size=CHUNK_SIZE), 1):
+        yield row
+        if written % CHUNK_SIZE == 0:
+            ExportJob.objects.filter(pk=job.pk).update(
+                rows_written=written, heartbeat_at=timezone.now()
+            )
+    job.rows_written = written
+
+
+def _runnable() -> QuerySet[ExportJob]:
+    """Return the jobs that are pending, or that are running but have made no
+    progress for `EXPORT_JOB_TIMEOUT_MINUTES` and so were most likely
+    interrupted.
+    """
+    timeout = datetime.timedelta(minutes=settings.EXPORT_JOB_TIMEOUT_MINUTES)
+    return ExportJob.objects.filter(
+        Q(status=ExportStatus.PENDING)
+        | Q(status=ExportStatus.RUNNING, heartbeat_at__lt=timezone.now() - timeout)
+    )
+
+
+def _claim(pk: int) -> ExportJob | None:
+    """Mark a runnable job as running and return it, or return None if it
+    isn't runnable, e.g. because another process claimed it first.
+    """
+    now = timezone.now()
+    claimed = (
+        _runnable()
+        .filter(pk=pk)
+        .update(
+            status=ExportStatus.RUNNING,
+            started_at=now,
+            heartbeat_at=now,
+            total_rows=Affiliation.all_with_deleted.count(),
+            rows_written=0,
+        )
+    )
+    return ExportJob.objects.get(pk=pk) if claimed else None
+
+
+def run_export_job(pk: int) -> bool:
+    """Run a pending or interrupted export job, returning whether it was run.
+
+    A job without fields exports all of them. A job that fails is marked as
+    failed, with the error.
+    """
+    job = _claim(pk)
+    if job is None:
+        return False
+    job.fields = job.fields or EXPORT_FIELDS
+    writer, extension = WRITERS[ExportFormat(job.export_format)]
+    try:
+        if unknown := set(job.fields) - set(EXPORT_FIELDS):
+            raise ValueError(f"Can't export these fields: {sorted(unknown)}.")
+        with tempfile.TemporaryFile() as handle:
+            writer(handle, job.fields, _rows(job))
+            handle.seek(0)
+            job.file.save(
+                f"affiliations-{job.pk}.{extension}", File(handle), save=False
+            )
+    except Exception as exc:  # pylint: disable=broad-exception-caught
+        job.status = ExportStatus.FAILED
+        job.error = str(exc)
+    else:
+        job.status = ExportStatus.DONE
+    job.finished_at = timezone.now()
+    job.save(
+        update_fields=[
+            "fields",
+            "status",
+            "error",
+            "file",
+            "rows_written",
+            "finished_at",
+        ]
+    )
+    return True
+
+
+def _run_in_thread(pk: int) -> None:
+    """Run an export job, then close the thread's database connection."""
+    try:
+        run_export_job(pk)
+    finally:
+        connection.close()
+
+
+def start_export_job(job: ExportJob) -> None:
+    """Run an export job in a thread once the transaction creating it
+    commits.
+    """
+    thread = threading.Thread(target=_run_in_thread, args=(job.pk,), daemon=True)
+    transaction.on_commit(thread.start)
+
+
+def run_pending_export_jobs() -> int:
+    """Run every pending or interrupted export job, oldest first, returning
+    how many were run.
+    """
+    runnable = _runnable().order_by("pk")
+    return sum(run_export_job(pk) for pk in runnable.values_list("pk", flat=True))
@@ -0,0 +1,44 @@
+"""Filter the affiliations list by the query params clients pass."""
+
+# Third-party dependencies:
+from rest_framework.filters import BaseFilterBackend
+
+# In-house code:
+from affiliations.models import AffiliationCDWG, AffiliationStatus, AffiliationType
+from affiliations.params import query_param_bool, query_param_choices, query_param_int
+
+
+class AffiliationFilterBackend(BaseFilterBackend):
+    """Filter affiliations by status, type, CDWG, deletion and ID ranges.
+
+    `status`, `type` and `clinical_domain_working_group` take a repeated or
+    comma-separated list of the values of their choices, and match any of
+    them. `is_deleted` takes true or false, and is false unless passed, so
+    soft-deleted affiliations are only listed when asked for.
+    `affiliation_id_min`, `affiliation_id_max`, `expert_panel_id_min` and
+    `expert_panel_id_max` are inclusive bounds. Other filters that aren't
+    passed don't filter anything, and invalid values raise a
+    `ValidationError`.
+    """
+
+    choice_filters = {
+        "status": AffiliationStatus,
+        "type": AffiliationType,
+        "clinical_domain_working_group": AffiliationCDWG,
+    }
+    range_filters = ("affiliation_id", "expert_panel_id")
+
+    def filter_queryset(self, request, queryset, view):
+        """Return the affiliations matching every filter passed."""
+        conditions = {}
+        for name, choices in self.choice_filters.items():
+            values = query_param_choices(request, name, choices.values)
+            if values:
+                conditions[f"{name}__in"] = values
+        conditions["is_deleted"] = bool(query_param_bool(request, "is_deleted"))
+        for name in self.range_filters:
+            for suffix, lookup in (("min", "gte"), ("max", "lte")):
+                bound = query_param_int(request, f"{name}_{suffix}")
+                if bound is not None:
+                    conditions[f"{name}__{lookup}"] = bound
+        return queryset.filter(**conditions)
@@ -0,0 +1,78 @@
+"""Allocate the IDs of new affiliations.
+
+The next affiliation ID is taken from a counter row, rather than by locking
+and scanning the affiliations for the highest one, and expert panel IDs are
+derived from it by type.
+"""
+
+# Third-party dependencies:
+from django.db.models import F, Subquery, Value
+from django.db.models.functions import Coalesce, Greatest
+
+# In-house code:
+from affiliations.models import Affiliation, AffiliationIdCounter, AffiliationType
+
+AFFILIATION_ID_COUNTER_PK = 1
+AFFILIATION_IDS = range(10000, 20000)
+# The expert panel IDs of each type, in step with the affiliation IDs.
+EXPERT_PANEL_IDS = {
+    AffiliationType.VCEP: range(50000, 60000),
+    AffiliationType.SC_VCEP: range(50000, 60000),
+    AffiliationType.GCEP: range(40000, 50000),
+}
+
+
+def allocate_affiliation_id() -> int:
+    """Return an affiliation ID that no affiliation has had yet.
+
+    The counter row stays locked until the transaction ends, but the
+    affiliations aren't locked at all. IDs saved by other means are skipped,
+    at the cost of finding the highest ID in use in the index.
+    """
+    highest = Affiliation.all_with_deleted.order_by("-affiliation_id").values(
+        "affiliation_id"
+    )[:1]
+    allocated = AffiliationIdCounter.objects.filter(
+        pk=AFFILIATION_ID_COUNTER_PK
+    ).update(
+        last_affiliation_id=Greatest(
+            F("last_affiliation_id") + 1,
+            Coalesce(Subquery(highest), Value(AFFILIATION_IDS.start - 1)) + 1,
+        )
+    )
+    if not allocated:
+        AffiliationIdCounter.objects.get_or_create(
+            pk=AFFILIATION_ID_COUNTER_PK,
+            defaults={"last_affiliation_id": AFFILIATION_IDS.start - 1},
+        )
+        return allocate_affiliation_id()
+    return AffiliationIdCounter.objects.values_list(
+        "last_affiliation_id", flat=True
+    ).get(pk=AFFILIATION_ID_COUNTER_PK)
+
+
+def next_affiliation_id() -> int:
+    """Return the affiliation ID `allocate_affiliation_id` would return next,
+    without taking it, so another creation may still take it first.
+    """
+    highest = (
+        Affiliation.all_with_deleted.order_by("-affiliation_id")
+        .values_list("affiliation_id", flat=True)
+        .first()
+    )
+    last = (
+        AffiliationIdCounter.objects.filter(pk=AFFILIATION_ID_COUNTER_PK)
+        .values_list("last_affiliation_id", flat=True)
+        .first()
+    )
+    return max(AFFILIATION_IDS.start - 1, highest or 0, last or 0) + 1
+
+
+def expert_panel_id_for(affiliation_id: int, affiliation_type: str) -> int | None:
+    """Return the expert panel ID of an affiliation of a type, or None if
+    the type has none.
+    """
+    expert_panel_ids = EXPERT_PANEL_IDS.get(affiliation_type)
+    if expert_panel_ids is None:
+        return None
+    return affiliation_id - AFFILIATION_IDS.start + expert_panel_ids.start
@@ -0,0 +1,206 @@
+"""Build affiliations in the legacy JSON format used by the VCI and GCI."""
+
+# Built-in libraries:
+from collections import defaultdict
+from collections.abc import Iterable
+
+# Third-party dependencies:
+from django.db import transaction
+from django.db.models import QuerySet
+
+# In-house code:
+from affiliations.models import Affiliation, Approver, LegacySnapshot
+from affiliations.renderers import json_dumps
+
+
+def _legacy_type(affil_type: str) -> str:
+    """Return the subgroup key for an affiliation type in the old JSON."""
+    affil_type = affil_type.lower()
+    # In old JSON, SC-VCEPS are only considered VCEPS.
+    if affil_type == "sc_vcep":
+        return "vcep"
+    return affil_type
+
+
+def build_legacy_affiliations(affiliations: QuerySet) -> list[dict]:
+    """Return the old JSON format documents for a queryset of affiliations.
+
+    Affiliations that share an affiliation ID are merged into one document,
+    with one subgroup per expert panel. Approvers for every affiliation are
+    fetched with a single query, so the whole list costs two queries no matter
+    how many affiliations there are.
+    """
+    affils = list(
+        affiliations.order_by("pk").values(
+            "id", "type", "affiliation_id", "expert_panel_id", "full_name"
+        )
+    )
+    approvers_by_affil = defaultdict(list)
+    approvers_queryset = (
+        Approver.all_with_deleted.filter(affiliation__in=affiliations.values("pk"))
+        .order_by("pk")
+        .values_list("affiliation_id", "approver_name")
+    )
+    for affil_pk, name in approvers_queryset:
+        approvers_by_affil[affil_pk].append(name)
+
+    response_obj: dict[str, dict] = {}
+    # Approver names per affiliation ID. A dict keeps insertion order, so it
+    # acts as an ordered set when de-duplicating names across subgroups.
+    approver_names: dict[str, dict[str, None]] = {}
+    for affil in affils:
+        affil_type = _legacy_type(affil["type"])
+        # In old JSON, Affiliation IDs and EP Ids are in string format.
+        affil_id = str(affil["affiliation_id"])
+        ep_id = str(affil["expert_panel_id"])
+
+        if affil_id not in response_obj:
+            if affil_type in ["vcep", "gcep"]:
+                old_json_format = {
+                    "affiliation_id": affil_id,
+                    "affiliation_fullname": affil["full_name"],
+                    "subgroups": {
+                        affil_type: {
+                            "id": ep_id,
+                            "fullname": affil["full_name"],
+                        },
+                    },
+                }
+            # Independent curation group format
+            else:
+                old_json_format = {
+                    "affiliation_id": affil_id,
+                    "affiliation_fullname": affil["full_name"],
+                }
+            response_obj[affil_id] = old_json_format
+        elif affil_type not in response_obj[affil_id]["subgroups"]:
+            # If VCEP or GCEP in full name, add other subgroup to end of name.
+            if ("VCEP" in response_obj[affil_id]["affiliation_fullname"]) or (
+                "GCEP" in response_obj[affil_id]["affiliation_fullname"]
+            ):
+                response_obj[affil_id]["affiliation_fullname"] = (
+                    response_obj[affil_id]["affiliation_fullname"] + "/" + affil["type"]
+                )
+            # Else append affiliation subgroup name to full name
+            else:
+                response_obj[affil_id]["affiliation_fullname"] = (
+                    response_obj[affil_id]["affiliation_fullname"]
+                    + "/"
+                    + affil["full_name"]
+                )
+
+            response_obj[affil_id]["subgroups"][affil_type] = {
+                "id": ep_id,
+                "fullname": affil["full_name"],
+            }
+        # If there are approvers, add them to the object.
+        names = approvers_by_affil.get(affil["id"])
+        if names:
+            approver_names.setdefault(affil_id, {}).update(dict.fromkeys(names))
+
+    for affil_id, names in approver_names.items():
+        response_obj[affil_id]["approver"] = list(names)
+    return list(response_obj.values())
+
+
+def render_legacy_document(document: dict) -> str:
+    """Render one old JSON format document the way `JsonResponse` would."""
+    return json_dumps(document)
+
+
+def join_legacy_documents(documents: Iterable[str]) -> str:
+    """Join rendered documents into the JSON array the old format returns."""
+    return "[" + ", ".join(documents) + "]"
+
+
+def all_legacy_documents() -> QuerySet:
+    """Return every rendered snapshot, ordered by affiliation ID."""
+    return LegacySnapshot.objects.order_by("affiliation_id").values_list(
+        "document", flat=True
+    )
+
+
+def _snapshots_for(affiliations: QuerySet) -> list[LegacySnapshot]:
+    """Return unsaved snapshots for every affiliation ID in the queryset."""
+    return [
+        LegacySnapshot(
+            affiliation_id=int(document["affiliation_id"]),
+            document=render_legacy_document(document),
+        )
+        for document in build_legacy_affiliations(affiliations)
+    ]
+
+
+def _save_snapshots(snapshots: list[LegacySnapshot]) -> None:
+    """Insert the snapshots, or update those that already exist.
+
+    Upserting, rather than deleting and inserting, lets two transactions
+    refresh the same affiliation ID at once without a unique violation.
+    """
+    LegacySnapshot.objects.bulk_create(
+        snapshots,
+        update_conflicts=True,
+        unique_fields=["affiliation_id"],
+        update_fields=["document"],
+    )
+
+
+@transaction.atomic
+def refresh_legacy_snapshots(affiliation_ids: Iterable[int]) -> None:
+    """Rebuild the snapshots of the given affiliation IDs.
+
+    Affiliation IDs that no longer have any affiliations that have not been
+    "soft-deleted" lose their snapshot.
+    """
+    affiliation_ids = set(affiliation_ids)
+    if not affiliation_ids:
+        return
+    snapshots = _snapshots_for(
+        Affiliation.objects.filter(affiliation_id__in=affiliation_ids)
+    )
+    _save_snapshots(snapshots)
+    gone = affiliation_ids - {snapshot.affiliation_id for snapshot in snapshots}
+    if gone:
+        LegacySnapshot.objects.filter(affiliation_id__in=gone).delete()
+
+
+@transaction.atomic
+def rebuild_legacy_snapshots() -> int:
+    """Replace every snapshot, returning how many were written."""
+    snapshots = _snapshots_for(Affiliation.objects.all())
+    _save_snapshots(snapshots)
+    LegacySnapshot.objects.exclude(
+        affiliation_id__in=[snapshot.affiliation_id for snapshot in snapshots]
+    ).delete()
+    return len(snapshots)
+
+
+def find_legacy_documents(
+    affiliation_ids: Iterable[int], expert_panel_ids: Iterable[int] = ()
+) -> list[str]:
+    """Return the rendered snapshots for the given IDs, in the order asked for.
+
+    Expert panel IDs are resolved to their affiliation IDs with one query, and
+    all the snapshots are then fetched with another. IDs that don't exist are
+    skipped, and each affiliation ID is only returned once.
+    """
+    affiliation_ids = list(affiliation_ids)
+    expert_panel_ids = list(expert_panel_ids)
+    if expert_panel_ids:
+        affil_id_by_ep_id = dict(
+            Affiliation.objects.filter(
+                expert_panel_id__in=expert_panel_ids
+            ).values_list("expert_panel_id", "affiliation_id")
+        )
+        affiliation_ids.extend(
+            affil_id_by_ep_id[ep_id]
+            for ep_id in expert_panel_ids
+            if ep_id in affil_id_by_ep_id
+        )
+    ordered_ids = list(dict.fromkeys(affiliation_ids))
+    documents = dict(
+        LegacySnapshot.objects.filter(affiliation_id__in=ordered_ids).values_list(
+            "affiliation_id", "document"
+        )
+    )
+    return [documents[affil_id] for affil_id in ordered_ids if affil_id in documents]
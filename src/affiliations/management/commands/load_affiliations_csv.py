@@ -0,0 +1,89 @@
+"""Command to load affiliations from the affiliation list spreadsheet."""
+
+# Built-in libraries:
+import time
+
+# Third-party dependencies:
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from rest_framework.exceptions import ValidationError
+
+# In-house code:
+from affiliations.bulk import upsert_affiliations
+from affiliations.spreadsheet import (
+    describe_changes,
+    read_spreadsheet,
+    validated_chunks,
+)
+
+
+class Command(BaseCommand):
+    """Create or update affiliations from the spreadsheet, saved as CSV."""
+
+    help = (
+        "Create or update affiliations, by their affiliation and expert panel "
+        "IDs, from the VCI/GCI affiliation list spreadsheet saved as CSV. Nothing "
+        "is written unless every row is valid."
+    )
+
+    def add_arguments(self, parser):
+        """Take the CSV file, and whether to only show what would change."""
+        parser.add_argument("path", help="The spreadsheet, saved as CSV.")
+        parser.add_argument(
+            "--dry-run",
+            action="store_true",
+            help="List the affiliations that would be created or updated, "
+            "without writing them.",
+        )
+
+    def _load(self, items: list[dict], dry_run: bool) -> tuple[int, int]:
+        """Load a chunk of affiliations, or describe what would change,
+        returning how many would be or were created and updated.
+        """
+        if dry_run:
+            changes = describe_changes(items)
+            for line in changes:
+                self.stdout.write(line)
+            created = sum(line.startswith("+") for line in changes)
+            return created, len(changes) - created
+        result = upsert_affiliations(items)
+        return len(result.created), len(result.updated)
+
+    def handle(self, *args, **options):
+        """Validate and load the rows a chunk at a time, or describe what would
+        change. The chunks are written in one transaction, which is rolled back
+        if any row is invalid.
+        """
+        start = time.perf_counter()
+        read = created = updated = 0
+        try:
+            with (
+                open(options["path"], encoding="utf-8", newline="") as file,
+                transaction.atomic(),
+            ):
+                for items in validated_chunks(read_spreadsheet(file)):
+                    chunk_created, chunk_updated = self._load(items, options["dry_run"])
+                    created += chunk_created
+                    updated += chunk_updated
+                    read += len(items)
+                    if options["verbosity"] > 1:
+                        seconds = time.perf_counter() - start
+                        self.stdout.write(
+                            f"Read {read} affiliations ({read / seconds:.0f} rows/s)."
+                        )
+        except OSError as exc:
+            raise CommandError(f"Can't read {options['path']}: {exc}") from exc
+        except ValidationError as exc:
+            raise CommandError("\n".join(str(error) for error in exc.detail)) from exc
+
+        if options["dry_run"]:
+            summary = f"Would create {created} and update {updated} affiliations."
+        else:
+            summary = f"Created {created} and updated {updated} affiliations."
+        seconds = time.perf_counter() - start
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"{summary} Read {read} affiliations in {seconds:.2f} s "
+                f"({read / seconds:.0f} rows/s)."
+            )
+        )
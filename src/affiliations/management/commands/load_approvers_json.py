@@ -0,0 +1,42 @@
+"""Command to load approvers from a file of affiliations in the old JSON
+format."""
+
+# Built-in libraries:
+import json
+import time
+
+# Third-party dependencies:
+from django.core.management.base import BaseCommand, CommandError
+
+# In-house code:
+from affiliations.approvers import load_approvers
+
+
+class Command(BaseCommand):
+    """Add the approvers listed in an old JSON format file to the affiliations."""
+
+    help = (
+        "Add the approvers listed in a file of affiliations in the old JSON "
+        "format to the affiliations that don't have them yet."
+    )
+
+    def add_arguments(self, parser):
+        """Take the JSON file."""
+        parser.add_argument("path", help="The affiliations, in the old JSON format.")
+
+    def handle(self, *args, **options):
+        """Load the approvers and report how many were created and skipped."""
+        start = time.perf_counter()
+        try:
+            with open(options["path"], encoding="utf-8") as file:
+                result = load_approvers(json.load(file))
+        except (OSError, ValueError) as exc:
+            raise CommandError(f"Can't load {options['path']}: {exc}") from exc
+        seconds = time.perf_counter() - start
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"Created {result.created} approvers and skipped {result.skipped} "
+                f"that already existed and {result.duplicates} listed more than "
+                f"once, in {seconds:.2f} s."
+            )
+        )
@@ -0,0 +1,25 @@
+"""Command to compact and expire old change log entries."""
+
+# Third-party dependencies:
+from django.core.management.base import BaseCommand
+
+# In-house code:
+from affiliations.changes import prune_change_log
+
+
+class Command(BaseCommand):
+    """Delete the change log entries the retention settings no longer keep."""
+
+    help = (
+        "Compact change log entries older than CHANGE_LOG_COMPACT_AFTER_DAYS and "
+        "delete those older than CHANGE_LOG_RETENTION_DAYS."
+    )
+
+    def handle(self, *args, **options):
+        """Prune the change log and report how many entries were deleted."""
+        compacted, expired = prune_change_log()
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"Compacted {compacted} and expired {expired} change log entries."
+            )
+        )
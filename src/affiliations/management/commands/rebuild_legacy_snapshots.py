@@ -0,0 +1,18 @@
+"""Command to rebuild every old JSON format snapshot."""
+
+# Third-party dependencies:
+from django.core.management.base import BaseCommand
+
+# In-house code:
+from affiliations.legacy import rebuild_legacy_snapshots
+
+
+class Command(BaseCommand):
+    """Rebuild the old JSON format snapshots from the affiliations tables."""
+
+    help = "Rebuild the old JSON format snapshot of every affiliation ID."
+
+    def handle(self, *args, **options):
+        """Rebuild the snapshots and report how many were written."""
+        count = rebuild_legacy_snapshots()
+        self.stdout.write(self.style.SUCCESS(f"Rebuilt {count} snapshots."))
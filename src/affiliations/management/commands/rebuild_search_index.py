@@ -0,0 +1,18 @@
+"""Command to rebuild every search entry."""
+
+# Third-party dependencies:
+from django.core.management.base import BaseCommand
+
+# In-house code:
+from affiliations.search import rebuild_search_entries
+
+
+class Command(BaseCommand):
+    """Rebuild the search entries from the affiliations tables."""
+
+    help = "Rebuild the search entry of every affiliation that isn't deleted."
+
+    def handle(self, *args, **options):
+        """Rebuild the entries and report how many were written."""
+        count = rebuild_search_entries()
+        self.stdout.write(self.style.SUCCESS(f"Rebuilt {count} search entries."))
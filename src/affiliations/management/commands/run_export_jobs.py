@@ -0,0 +1,18 @@
+"""Command to run the export jobs that are still pending, or were interrupted."""
+
+# Third-party dependencies:
+from django.core.management.base import BaseCommand
+
+# In-house code:
+from affiliations.exports import run_pending_export_jobs
+
+
+class Command(BaseCommand):
+    """Run the pending export jobs, and those a crash or restart interrupted."""
+
+    help = "Run every export job that is still pending, or was interrupted."
+
+    def handle(self, *args, **options):
+        """Run the jobs and report how many were run."""
+        count = run_pending_export_jobs()
+        self.stdout.write(self.style.SUCCESS(f"Ran {count} export jobs."))
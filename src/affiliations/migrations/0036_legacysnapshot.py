@@ -0,0 +1,98 @@
+# Generated by Django 5.1.5 on 2026-10-18 12:32
+
+import json
+from collections import defaultdict
+
+from django.db import migrations, models
+
+
+def _legacy_document(affiliations, approvers_by_pk):
+    """Merge the affiliations sharing an affiliation ID into one old JSON
+    format document, the way `affiliations.legacy` did when this migration
+    was written.
+    """
+    first = affiliations[0]
+    document = {
+        "affiliation_id": str(first["affiliation_id"]),
+        "affiliation_fullname": first["full_name"],
+    }
+    for affiliation in affiliations:
+        affil_type = affiliation["type"].lower()
+        if affil_type == "sc_vcep":
+            affil_type = "vcep"
+        subgroup = {
+            "id": str(affiliation["expert_panel_id"]),
+            "fullname": affiliation["full_name"],
+        }
+        if affiliation is first:
+            if affil_type in ("vcep", "gcep"):
+                document["subgroups"] = {affil_type: subgroup}
+        elif affil_type not in document["subgroups"]:
+            fullname = document["affiliation_fullname"]
+            if "VCEP" in fullname or "GCEP" in fullname:
+                document["affiliation_fullname"] = f"{fullname}/{affiliation['type']}"
+            else:
+                document["affiliation_fullname"] = (
+                    f"{fullname}/{affiliation['full_name']}"
+                )
+            document["subgroups"][affil_type] = subgroup
+    names = {
+        name: None
+        for affiliation in affiliations
+        for name in approvers_by_pk[affiliation["id"]]
+    }
+    if names:
+        document["approver"] = list(names)
+    return document
+
+
+def build_snapshots(apps, schema_editor):
+    """Fill the snapshot table from the existing affiliations."""
+    Affiliation = apps.get_model("affiliations", "Affiliation")
+    Approver = apps.get_model("affiliations", "Approver")
+    LegacySnapshot = apps.get_model("affiliations", "LegacySnapshot")
+    live = Affiliation._default_manager.filter(is_deleted=False)
+    approvers_by_pk = defaultdict(list)
+    for affiliation_pk, name in (
+        Approver._default_manager.filter(affiliation__in=live.values("pk"))
+        .order_by("pk")
+        .values_list("affiliation_id", "approver_name")
+    ):
+        approvers_by_pk[affiliation_pk].append(name)
+    by_affiliation_id = defaultdict(list)
+    for affiliation in live.order_by("pk").values(
+        "id", "type", "affiliation_id", "expert_panel_id", "full_name"
+    ):
+        by_affiliation_id[affiliation["affiliation_id"]].append(affiliation)
+    LegacySnapshot._default_manager.bulk_create(
+        LegacySnapshot(
+            affiliation_id=affiliation_id,
+            document=json.dumps(
+                _legacy_document(affiliations, approvers_by_pk), ensure_ascii=False
+            ),
+        )
+        for affiliation_id, affiliations in by_affiliation_id.items()
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("affiliations", "0035_affiliation_is_deleted"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="LegacySnapshot",
+            fields=[
+                (
+                    "affiliation_id",
+                    models.IntegerField(
+                        primary_key=True, serialize=False, verbose_name="Affiliation ID"
+                    ),
+                ),
+                ("document", models.TextField(verbose_name="Document")),
+            ],
+        ),
+        migrations.RunPython(build_snapshots, migrations.RunPython.noop),
+    ]
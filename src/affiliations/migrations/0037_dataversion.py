@@ -0,0 +1,36 @@
+# Generated by Django 5.1.5 on 2026-10-18 12:35
+
+from django.db import migrations, models
+
+
+def create_data_version(apps, schema_editor):
+    """Create the single data version row."""
+    DataVersion = apps.get_model("affiliations", "DataVersion")
+    DataVersion.objects.get_or_create(pk=1)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("affiliations", "0036_legacysnapshot"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="DataVersion",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("version", models.BigIntegerField(default=0)),
+                ("modified", models.DateTimeField(auto_now=True)),
+            ],
+        ),
+        migrations.RunPython(create_data_version, migrations.RunPython.noop),
+    ]
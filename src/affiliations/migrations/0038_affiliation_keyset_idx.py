@@ -0,0 +1,25 @@
+# Generated by Django 5.1.5 on 2026-10-18 13:12
+
+import django.db.models.functions.comparison
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("affiliations", "0037_dataversion"),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name="affiliation",
+            index=models.Index(
+                models.F("affiliation_id"),
+                django.db.models.functions.comparison.Coalesce(
+                    "expert_panel_id", models.Value(2147483647)
+                ),
+                models.F("id"),
+                name="affiliation_keyset_idx",
+            ),
+        ),
+    ]
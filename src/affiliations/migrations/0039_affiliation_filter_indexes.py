@@ -0,0 +1,41 @@
+# Generated by Django 5.1.5 on 2026-10-18 13:29
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("affiliations", "0038_affiliation_keyset_idx"),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name="affiliation",
+            index=models.Index(
+                fields=["status", "type"], name="affiliation_status_type_idx"
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="affiliation",
+            index=models.Index(fields=["type"], name="affiliation_type_idx"),
+        ),
+        migrations.AddIndex(
+            model_name="affiliation",
+            index=models.Index(
+                fields=["clinical_domain_working_group"], name="affiliation_cdwg_idx"
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="affiliation",
+            index=models.Index(
+                fields=["is_deleted"], name="affiliation_is_deleted_idx"
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="affiliation",
+            index=models.Index(
+                fields=["expert_panel_id"], name="affiliation_ep_id_idx"
+            ),
+        ),
+    ]
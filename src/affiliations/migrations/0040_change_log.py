@@ -0,0 +1,59 @@
+# Generated by Django 5.1.5 on 2026-10-18 13:33
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("affiliations", "0039_affiliation_filter_indexes"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="ChangeLogEntry",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                (
+                    "sequence",
+                    models.BigIntegerField(db_index=True, verbose_name="Sequence"),
+                ),
+                (
+                    "affiliation_pk",
+                    models.IntegerField(
+                        db_index=True, verbose_name="Affiliation primary key"
+                    ),
+                ),
+                ("affiliation_id", models.IntegerField(verbose_name="Affiliation ID")),
+                ("model", models.CharField(verbose_name="Model")),
+                (
+                    "action",
+                    models.CharField(
+                        choices=[
+                            ("CREATED", "Created"),
+                            ("UPDATED", "Updated"),
+                            ("DELETED", "Deleted"),
+                        ],
+                        verbose_name="Action",
+                    ),
+                ),
+                (
+                    "changed_at",
+                    models.DateTimeField(auto_now_add=True, verbose_name="Changed at"),
+                ),
+            ],
+        ),
+        migrations.AddField(
+            model_name="dataversion",
+            name="changes_pruned_through",
+            field=models.BigIntegerField(default=0),
+        ),
+    ]
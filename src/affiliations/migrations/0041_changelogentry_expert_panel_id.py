@@ -0,0 +1,20 @@
+# Generated by Django 5.1.5 on 2026-10-18 13:36
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("affiliations", "0040_change_log"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="changelogentry",
+            name="expert_panel_id",
+            field=models.IntegerField(
+                blank=True, null=True, verbose_name="Expert Panel ID"
+            ),
+        ),
+    ]
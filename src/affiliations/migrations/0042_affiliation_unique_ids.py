@@ -0,0 +1,68 @@
+# Generated by Django 5.1.5 on 2026-10-18 13:55
+
+from django.db import migrations, models
+from django.db.models import Count
+
+
+def check_for_duplicates(apps, schema_editor):
+    """Stop with a list of the ID pairs shared by several affiliations, which
+    must be fixed by hand before the constraints can be added.
+    """
+    Affiliation = apps.get_model("affiliations", "Affiliation")
+    duplicates = [
+        f"{row['affiliation_id']}/{row['expert_panel_id']}"
+        for row in Affiliation.objects.values("affiliation_id", "expert_panel_id")
+        .annotate(count=Count("id"))
+        .filter(count__gt=1)
+        .order_by("affiliation_id", "expert_panel_id")
+    ]
+    if duplicates:
+        raise RuntimeError(
+            "Several affiliations share these affiliation/expert panel IDs: "
+            + ", ".join(duplicates)
+        )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("affiliations", "0041_changelogentry_expert_panel_id"),
+    ]
+
+    operations = [
+        migrations.RunPython(check_for_duplicates, migrations.RunPython.noop),
+        migrations.AddIndex(
+            model_name="affiliation",
+            index=models.Index(
+                condition=models.Q(("is_deleted", False)),
+                fields=["affiliation_id"],
+                name="affiliation_live_id_idx",
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="affiliation",
+            index=models.Index(
+                condition=models.Q(("is_deleted", False)),
+                fields=["expert_panel_id", "affiliation_id"],
+                name="affiliation_live_ep_id_idx",
+            ),
+        ),
+        migrations.AddConstraint(
+            model_name="affiliation",
+            constraint=models.UniqueConstraint(
+                condition=models.Q(("expert_panel_id__isnull", False)),
+                fields=("affiliation_id", "expert_panel_id"),
+                name="affiliation_ids_unique",
+                violation_error_message="This Affiliation ID with this Expert Panel ID already exist.",
+            ),
+        ),
+        migrations.AddConstraint(
+            model_name="affiliation",
+            constraint=models.UniqueConstraint(
+                condition=models.Q(("expert_panel_id__isnull", True)),
+                fields=("affiliation_id",),
+                name="affiliation_id_without_ep_unique",
+                violation_error_message="This Affiliation ID with this Expert Panel ID already exist.",
+            ),
+        ),
+    ]
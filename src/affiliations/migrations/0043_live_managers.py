@@ -0,0 +1,75 @@
+# Generated by Django 5.1.5 on 2026-10-18 14:01
+
+import django.db.models.functions.comparison
+import django.db.models.manager
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("affiliations", "0042_affiliation_unique_ids"),
+    ]
+
+    operations = [
+        migrations.AlterModelOptions(
+            name="affiliation",
+            options={"default_manager_name": "all_with_deleted"},
+        ),
+        migrations.AlterModelOptions(
+            name="approver",
+            options={"default_manager_name": "all_with_deleted"},
+        ),
+        migrations.AlterModelOptions(
+            name="coordinator",
+            options={"default_manager_name": "all_with_deleted"},
+        ),
+        migrations.AlterModelOptions(
+            name="submitter",
+            options={"default_manager_name": "all_with_deleted"},
+        ),
+        migrations.AlterModelManagers(
+            name="affiliation",
+            managers=[
+                ("all_with_deleted", django.db.models.manager.Manager()),
+            ],
+        ),
+        migrations.AlterModelManagers(
+            name="approver",
+            managers=[
+                ("all_with_deleted", django.db.models.manager.Manager()),
+            ],
+        ),
+        migrations.AlterModelManagers(
+            name="coordinator",
+            managers=[
+                ("all_with_deleted", django.db.models.manager.Manager()),
+            ],
+        ),
+        migrations.AlterModelManagers(
+            name="submitter",
+            managers=[
+                ("all_with_deleted", django.db.models.manager.Manager()),
+            ],
+        ),
+        migrations.RemoveIndex(
+            model_name="affiliation",
+            name="affiliation_is_deleted_idx",
+        ),
+        migrations.RemoveIndex(
+            model_name="affiliation",
+            name="affiliation_live_id_idx",
+        ),
+        migrations.AddIndex(
+            model_name="affiliation",
+            index=models.Index(
+                models.F("affiliation_id"),
+                django.db.models.functions.comparison.Coalesce(
+                    "expert_panel_id", models.Value(2147483647)
+                ),
+                models.F("id"),
+                condition=models.Q(("is_deleted", False)),
+                name="affiliation_live_keyset_idx",
+            ),
+        ),
+    ]
@@ -0,0 +1,41 @@
+# Generated by Django 5.1.5 on 2026-10-18 14:04
+
+from django.db import migrations, models
+from django.db.models import Max
+
+
+def create_counter(apps, schema_editor):
+    """Create the single counter row, starting after the highest ID in use."""
+    Affiliation = apps.get_model("affiliations", "Affiliation")
+    AffiliationIdCounter = apps.get_model("affiliations", "AffiliationIdCounter")
+    highest = Affiliation._default_manager.aggregate(Max("affiliation_id"))
+    AffiliationIdCounter.objects.get_or_create(
+        pk=1,
+        defaults={"last_affiliation_id": highest["affiliation_id__max"] or 9999},
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("affiliations", "0043_live_managers"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="AffiliationIdCounter",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("last_affiliation_id", models.IntegerField(default=9999)),
+            ],
+        ),
+        migrations.RunPython(create_counter, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,116 @@
+# Generated by Django 5.1.5 on 2026-10-18 14:14
+
+from collections import defaultdict
+
+import django.contrib.postgres.indexes
+import django.contrib.postgres.search
+import django.db.models.deletion
+
+from django.db import DatabaseError, migrations, models, transaction
+
+
+def build_search_entries(apps, schema_editor):
+    """Fill the search entries from the affiliations that aren't deleted."""
+    Affiliation = apps.get_model("affiliations", "Affiliation")
+    Coordinator = apps.get_model("affiliations", "Coordinator")
+    SearchEntry = apps.get_model("affiliations", "SearchEntry")
+    coordinators = defaultdict(list)
+    for affiliation_pk, name, email in (
+        Coordinator._default_manager.filter(affiliation__is_deleted=False)
+        .order_by("pk")
+        .values_list("affiliation_id", "coordinator_name", "coordinator_email")
+    ):
+        coordinators[affiliation_pk].extend((name, email))
+    SearchEntry._default_manager.bulk_create(
+        (
+            SearchEntry(
+                affiliation_id=pk,
+                document=" ".join(
+                    str(value)
+                    for value in (*values, *coordinators[pk])
+                    if value not in (None, "")
+                ),
+            )
+            for pk, *values in Affiliation._default_manager.filter(is_deleted=False)
+            .order_by("pk")
+            .values_list(
+                "pk", "affiliation_id", "expert_panel_id", "full_name", "short_name"
+            )
+        ),
+        batch_size=250,
+    )
+
+
+def add_trigram_index(apps, schema_editor):
+    """Index the documents by trigrams, if the pg_trgm extension can be
+    installed. Searches fall back to word prefixes without it.
+    """
+    with schema_editor.connection.cursor() as cursor:
+        try:
+            with transaction.atomic(using=schema_editor.connection.alias):
+                cursor.execute("CREATE EXTENSION IF NOT EXISTS pg_trgm")
+        except DatabaseError:
+            return
+        cursor.execute(
+            "CREATE INDEX search_entry_trigram_idx ON affiliations_searchentry "
+            "USING gin (document gin_trgm_ops)"
+        )
+
+
+def drop_trigram_index(apps, schema_editor):
+    """Drop the trigram index, leaving the extension installed."""
+    with schema_editor.connection.cursor() as cursor:
+        cursor.execute("DROP INDEX IF EXISTS search_entry_trigram_idx")
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("affiliations", "0044_affiliationidcounter"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="SearchEntry",
+            fields=[
+                (
+                    "affiliation",
+                    models.OneToOneField(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        primary_key=True,
+                        related_name="search_entry",
+                        serialize=False,
+                        to="affiliations.affiliation",
+                    ),
+                ),
+                ("document", models.TextField(verbose_name="Document")),
+                (
+                    "vector",
+                    models.GeneratedField(
+                        db_persist=True,
+                        expression=django.contrib.postgres.search.SearchVector(
+                            models.Func(
+                                models.F("document"),
+                                models.Value("\\W+"),
+                                models.Value(" "),
+                                models.Value("g"),
+                                function="regexp_replace",
+                                output_field=models.TextField(),
+                            ),
+                            config="simple",
+                        ),
+                        output_field=django.contrib.postgres.search.SearchVectorField(),
+                    ),
+                ),
+            ],
+            options={
+                "indexes": [
+                    django.contrib.postgres.indexes.GinIndex(
+                        fields=["vector"], name="search_entry_vector_idx"
+                    )
+                ],
+            },
+        ),
+        migrations.RunPython(build_search_entries, migrations.RunPython.noop),
+        migrations.RunPython(add_trigram_index, drop_trigram_index),
+    ]
@@ -0,0 +1,94 @@
+# Generated by Django 5.1.5 on 2026-10-18 14:26
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("affiliations", "0045_search_entry"),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="ExportJob",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                (
+                    "export_format",
+                    models.CharField(
+                        choices=[
+                            ("CSV", "CSV"),
+                            ("XLSX", "Excel (XLSX)"),
+                            ("JSON", "JSON"),
+                        ],
+                        default="CSV",
+                        verbose_name="Format",
+                    ),
+                ),
+                ("fields", models.JSONField(default=list, verbose_name="Fields")),
+                (
+                    "status",
+                    models.CharField(
+                        choices=[
+                            ("PENDING", "Pending"),
+                            ("RUNNING", "Running"),
+                            ("DONE", "Done"),
+                            ("FAILED", "Failed"),
+                        ],
+                        default="PENDING",
+                        verbose_name="Status",
+                    ),
+                ),
+                (
+                    "total_rows",
+                    models.IntegerField(
+                        blank=True, null=True, verbose_name="Total rows"
+                    ),
+                ),
+                (
+                    "rows_written",
+                    models.IntegerField(default=0, verbose_name="Rows written"),
+                ),
+                (
+                    "file",
+                    models.FileField(
+                        blank=True, upload_to="exports/", verbose_name="File"
+                    ),
+                ),
+                ("error", models.TextField(blank=True, verbose_name="Error")),
+                (
+                    "created_at",
+                    models.DateTimeField(auto_now_add=True, verbose_name="Created at"),
+                ),
+                (
+                    "finished_at",
+                    models.DateTimeField(
+                        blank=True, null=True, verbose_name="Finished at"
+                    ),
+                ),
+                (
+                    "created_by",
+                    models.ForeignKey(
+                        blank=True,
+                        null=True,
+                        on_delete=django.db.models.deletion.SET_NULL,
+                        related_name="+",
+                        to=settings.AUTH_USER_MODEL,
+                        verbose_name="Created by",
+                    ),
+                ),
+            ],
+        ),
+    ]
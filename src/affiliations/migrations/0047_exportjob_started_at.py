@@ -0,0 +1,32 @@
+# Generated by Django 5.1.5 on 2026-10-18 14:59
+
+from django.db import migrations, models
+from django.db.models import F
+
+
+def backfill_started_at(apps, schema_editor):
+    """Take jobs already running to have started when they were created, so
+    they can be run again once they time out.
+    """
+    ExportJob = apps.get_model("affiliations", "ExportJob")
+    ExportJob._default_manager.filter(status="RUNNING").update(
+        started_at=F("created_at")
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("affiliations", "0046_exportjob"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="exportjob",
+            name="started_at",
+            field=models.DateTimeField(
+                blank=True, null=True, verbose_name="Started at"
+            ),
+        ),
+        migrations.RunPython(backfill_started_at, migrations.RunPython.noop),
+    ]
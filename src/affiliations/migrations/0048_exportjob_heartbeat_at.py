@@ -0,0 +1,32 @@
+# Generated by Django 5.1.5 on 2026-10-18 18:21
+
+from django.db import migrations, models
+from django.db.models import F
+
+
+def backfill_heartbeat_at(apps, schema_editor):
+    """Take jobs already running to have last made progress when they
+    started, so they can be run again once they time out.
+    """
+    ExportJob = apps.get_model("affiliations", "ExportJob")
+    ExportJob._default_manager.filter(status="RUNNING").update(
+        heartbeat_at=F("started_at")
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("affiliations", "0047_exportjob_started_at"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="exportjob",
+            name="heartbeat_at",
+            field=models.DateTimeField(
+                blank=True, null=True, verbose_name="Last progress at"
+            ),
+        ),
+        migrations.RunPython(backfill_heartbeat_at, migrations.RunPython.noop),
+    ]
@@ -1,7 +1,10 @@
 """Models of the data in the affiliations service."""
 
 # Third-party dependencies:
+from django.contrib.postgres.indexes import GinIndex
+from django.contrib.postgres.search import SearchVector, SearchVectorField
 from django.db import models
+from django.db.models.functions import Coalesce
 from django.utils.translation import gettext_lazy as _
 
 
@@ -48,8 +51,43 @@ class AffiliationCDWG(models.TextChoices):  # pylint: disable=too-many-ancestors
     SOMATIC_CANCER = "SOMATIC_CANCER", _("Somatic Cancer")
 
 
+# Stands in for a missing expert panel ID in the order `database_list/` is
+# paginated in, so affiliations without one come last within their affiliation
+# ID. The pagination compares whole rows of these values, and a NULL in a row
+# makes the comparison NULL.
+NO_EXPERT_PANEL_ID = 2**31 - 1
+KEYSET_ORDERING = (
+    models.F("affiliation_id"),
+    Coalesce("expert_panel_id", models.Value(NO_EXPERT_PANEL_ID)),
+    models.F("id"),
+)
+
+DUPLICATE_IDS_MESSAGE = "This Affiliation ID with this Expert Panel ID already exist."
+
+
+class LiveAffiliationManager(models.Manager):
+    """Leave out the affiliations that have been "soft-deleted"."""
+
+    def get_queryset(self):
+        """Return the affiliations that have not been deleted."""
+        return super().get_queryset().filter(is_deleted=False)
+
+
+class LiveChildManager(models.Manager):
+    """Leave out the children of affiliations that have been "soft-deleted"."""
+
+    def get_queryset(self):
+        """Return the children of affiliations that have not been deleted."""
+        return super().get_queryset().filter(affiliation__is_deleted=False)
+
+
 class Affiliation(models.Model):
-    """Define the shape of an affiliation."""
+    """Define the shape of an affiliation.
+
+    `objects` leaves out soft-deleted affiliations, and `all_with_deleted`
+    includes them. The latter is the default manager, so that uniqueness
+    checks, related objects and Django's own lookups see every row.
+    """
 
     type: models.CharField = models.CharField(
         verbose_name="Type",
@@ -88,17 +126,106 @@ class Affiliation(models.Model):
     members: models.CharField = models.CharField()
     is_deleted: models.BooleanField = models.BooleanField(default=False)
 
+    objects = LiveAffiliationManager()
+    all_with_deleted = models.Manager()
+
+    class Meta:
+        """Index the order `database_list/` is paginated in, and its filters,
+        and keep affiliation and expert panel ID pairs unique.
+        """
+
+        default_manager_name = "all_with_deleted"
+
+        constraints = [
+            # NULLs never clash in a unique index, so affiliations without an
+            # expert panel ID need one of their own.
+            models.UniqueConstraint(
+                fields=["affiliation_id", "expert_panel_id"],
+                condition=models.Q(expert_panel_id__isnull=False),
+                name="affiliation_ids_unique",
+                violation_error_message=DUPLICATE_IDS_MESSAGE,
+            ),
+            models.UniqueConstraint(
+                fields=["affiliation_id"],
+                condition=models.Q(expert_panel_id__isnull=True),
+                name="affiliation_id_without_ep_unique",
+                violation_error_message=DUPLICATE_IDS_MESSAGE,
+            ),
+        ]
+        indexes = [
+            models.Index(
+                *KEYSET_ORDERING,
+                name="affiliation_keyset_idx",
+            ),
+            # Most queries skip deleted affiliations, which these partial
+            # indexes leave out.
+            models.Index(
+                *KEYSET_ORDERING,
+                condition=models.Q(is_deleted=False),
+                name="affiliation_live_keyset_idx",
+            ),
+            # Back the filters of `database_list/`. The affiliation ID ranges
+            # use the keyset index.
+            models.Index(fields=["status", "type"], name="affiliation_status_type_idx"),
+            models.Index(fields=["type"], name="affiliation_type_idx"),
+            models.Index(
+                fields=["clinical_domain_working_group"], name="affiliation_cdwg_idx"
+            ),
+            models.Index(fields=["expert_panel_id"], name="affiliation_ep_id_idx"),
+            models.Index(
+                fields=["expert_panel_id", "affiliation_id"],
+                condition=models.Q(is_deleted=False),
+                name="affiliation_live_ep_id_idx",
+            ),
+        ]
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        """Remember the values loaded from the database.
+
+        The change signals use these to tell which affiliation ID an
+        affiliation belonged to before it was edited.
+        """
+        instance = super().from_db(db, field_names, values)
+        instance.loaded_values = dict(zip(field_names, values))
+        return instance
+
     def __str__(self):
         """Provide a string representation of an affiliation."""
         return f"Affiliation {self.affiliation_id} {self.full_name}"
 
+    def save(self, *args, **kwargs):
+        """Save the affiliation, then remember the values that were saved."""
+        super().save(*args, **kwargs)
+        self.loaded_values = {  # pylint: disable=attribute-defined-outside-init
+            field.attname: getattr(self, field.attname)
+            for field in self._meta.concrete_fields
+        }
+
     def delete(self, *args, **kwargs):
         """Override delete method to "soft-delete" affiliations."""
         self.is_deleted = True
         self.save(*args, **kwargs)
 
 
-class Coordinator(models.Model):
+class AffiliationChild(models.Model):
+    """Share the managers of the coordinators, approvers and submitters.
+
+    `objects` leaves out the children of soft-deleted affiliations, and
+    `all_with_deleted`, the default manager, doesn't.
+    """
+
+    objects = LiveChildManager()
+    all_with_deleted = models.Manager()
+
+    class Meta:
+        """Make the model abstract, and its unfiltered manager the default."""
+
+        abstract = True
+        default_manager_name = "all_with_deleted"
+
+
+class Coordinator(AffiliationChild):
     """Define the shape of an coordinator."""
 
     affiliation = models.ForeignKey(
@@ -112,7 +239,7 @@ class Coordinator(models.Model):
     )
 
 
-class Approver(models.Model):
+class Approver(AffiliationChild):
     """Define the shape of an approver."""
 
     affiliation = models.ForeignKey(
@@ -121,7 +248,7 @@ class Approver(models.Model):
     approver_name: models.CharField = models.CharField(verbose_name="Approver Name")
 
 
-class Submitter(models.Model):
+class Submitter(AffiliationChild):
     """Define the shape of an submitter."""
 
     affiliation = models.ForeignKey(
@@ -130,3 +257,215 @@ class Submitter(models.Model):
     clinvar_submitter_id: models.CharField = models.CharField(
         verbose_name="ClinVar Submitter ID"
     )
+
+
+class LegacySnapshot(models.Model):
+    """Store an affiliation pre-rendered in the old JSON format.
+
+    Affiliations sharing an affiliation ID are merged into a single document,
+    so there is one snapshot per affiliation ID.
+    """
+
+    affiliation_id: models.IntegerField = models.IntegerField(
+        primary_key=True,
+        verbose_name="Affiliation ID",
+    )
+    document: models.TextField = models.TextField(verbose_name="Document")
+
+    def __str__(self):
+        """Provide a string representation of a legacy snapshot."""
+        return f"Legacy snapshot {self.affiliation_id}"
+
+
+class SearchEntry(models.Model):
+    """Hold the text an affiliation is searched by.
+
+    The document joins the affiliation's IDs, names and coordinators. There is
+    an entry for every affiliation that has not been soft-deleted, rebuilt
+    whenever the affiliation or its coordinators change, and the database
+    keeps a full-text vector of the document alongside it.
+    """
+
+    affiliation = models.OneToOneField(
+        Affiliation,
+        primary_key=True,
+        related_name="search_entry",
+        on_delete=models.CASCADE,
+    )  # type: object
+    document: models.TextField = models.TextField(verbose_name="Document")
+    # Punctuation is replaced by spaces first, so that emails are split into
+    # words the way search terms are.
+    vector = models.GeneratedField(
+        expression=SearchVector(
+            models.Func(
+                models.F("document"),
+                models.Value(r"\W+"),
+                models.Value(" "),
+                models.Value("g"),
+                function="regexp_replace",
+                output_field=models.TextField(),
+            ),
+            config="simple",
+        ),
+        output_field=SearchVectorField(),
+        db_persist=True,
+    )
+
+    class Meta:
+        """Index the full-text vector."""
+
+        indexes = [GinIndex(fields=["vector"], name="search_entry_vector_idx")]
+
+    def __str__(self):
+        """Provide a string representation of a search entry."""
+        return f"Search entry {self.pk}"
+
+
+class DataVersion(models.Model):
+    """Count writes to the affiliation data.
+
+    There is a single row, which is bumped in the same transaction as every
+    write to an affiliation or its coordinators, approvers and submitters.
+    """
+
+    version: models.BigIntegerField = models.BigIntegerField(default=0)
+    modified: models.DateTimeField = models.DateTimeField(auto_now=True)
+    # Change log entries up to this version have been deleted.
+    changes_pruned_through: models.BigIntegerField = models.BigIntegerField(default=0)
+
+    def __str__(self):
+        """Provide a string representation of the data version."""
+        return f"Data version {self.version}"
+
+
+class AffiliationIdCounter(models.Model):
+    """Hold the last affiliation ID given out to a new affiliation.
+
+    There is a single row, so new IDs are allocated without locking or
+    scanning the affiliations.
+    """
+
+    last_affiliation_id: models.IntegerField = models.IntegerField(default=9999)
+
+    def __str__(self):
+        """Provide a string representation of the affiliation ID counter."""
+        return f"Last affiliation ID {self.last_affiliation_id}"
+
+
+class ChangeAction(models.TextChoices):  # pylint: disable=too-many-ancestors
+    """Creating choices for the kind of change a change log entry records."""
+
+    CREATED = "CREATED", _("Created")
+    UPDATED = "UPDATED", _("Updated")
+    DELETED = "DELETED", _("Deleted")
+
+
+class ChangeLogEntry(models.Model):
+    """Record a write to an affiliation, or to one of its children.
+
+    The sequence is the data version the write bumped. Versions are bumped in
+    commit order, so a client that has seen every entry up to a sequence only
+    needs the entries after it to catch up.
+    """
+
+    sequence: models.BigIntegerField = models.BigIntegerField(
+        db_index=True, verbose_name="Sequence"
+    )
+    affiliation_pk: models.IntegerField = models.IntegerField(
+        db_index=True, verbose_name="Affiliation primary key"
+    )
+    affiliation_id: models.IntegerField = models.IntegerField(
+        verbose_name="Affiliation ID"
+    )
+    expert_panel_id: models.IntegerField = models.IntegerField(
+        verbose_name="Expert Panel ID", blank=True, null=True
+    )
+    model: models.CharField = models.CharField(verbose_name="Model")
+    action: models.CharField = models.CharField(
+        verbose_name="Action", choices=ChangeAction.choices
+    )
+    changed_at: models.DateTimeField = models.DateTimeField(
+        auto_now_add=True, verbose_name="Changed at"
+    )
+
+    def __str__(self):
+        """Provide a string representation of a change log entry."""
+        return f"Change {self.sequence}: {self.model} {self.action}"
+
+
+class ExportFormat(models.TextChoices):  # pylint: disable=too-many-ancestors
+    """Creating choices for the file formats affiliations are exported to."""
+
+    CSV = "CSV", _("CSV")
+    XLSX = "XLSX", _("Excel (XLSX)")
+    JSON = "JSON", _("JSON")
+
+
+class ExportStatus(models.TextChoices):  # pylint: disable=too-many-ancestors
+    """Creating choices for how far an export job has got."""
+
+    PENDING = "PENDING", _("Pending")
+    RUNNING = "RUNNING", _("Running")
+    DONE = "DONE", _("Done")
+    FAILED = "FAILED", _("Failed")
+
+
+class ExportJob(models.Model):
+    """Export every affiliation to a file, outside of the request that asked.
+
+    The job writes the affiliations to the file a chunk at a time, counting
+    the rows written so far, and keeps the file for admins to download.
+    """
+
+    export_format: models.CharField = models.CharField(
+        verbose_name="Format", choices=ExportFormat.choices, default=ExportFormat.CSV
+    )
+    fields: models.JSONField = models.JSONField(verbose_name="Fields", default=list)
+    status: models.CharField = models.CharField(
+        verbose_name="Status",
+        choices=ExportStatus.choices,
+        default=ExportStatus.PENDING,
+    )
+    total_rows: models.IntegerField = models.IntegerField(
+        verbose_name="Total rows", blank=True, null=True
+    )
+    rows_written: models.IntegerField = models.IntegerField(
+        verbose_name="Rows written", default=0
+    )
+    file: models.FileField = models.FileField(
+        verbose_name="File", upload_to="exports/", blank=True
+    )
+    error: models.TextField = models.TextField(verbose_name="Error", blank=True)
+    created_by = models.ForeignKey(
+        "auth.User",
+        verbose_name="Created by",
+        blank=True,
+        null=True,
+        related_name="+",
+        on_delete=models.SET_NULL,
+    )  # type: object
+    created_at: models.DateTimeField = models.DateTimeField(
+        auto_now_add=True, verbose_name="Created at"
+    )
+    started_at: models.DateTimeField = models.DateTimeField(
+        verbose_name="Started at", blank=True, null=True
+    )
+    heartbeat_at: models.DateTimeField = models.DateTimeField(
+        verbose_name="Last progress at", blank=True, null=True
+    )
+    finished_at: models.DateTimeField = models.DateTimeField(
+        verbose_name="Finished at", blank=True, null=True
+    )
+
+    @property
+    def progress(self) -> int:
+        """Return the percentage of the rows written so far."""
+        if self.status == ExportStatus.DONE:
+            return 100
+        if not self.total_rows:
+            return 0
+        return min(99, 100 * self.rows_written // self.total_rows)
+
+    def __str__(self):
+        """Provide a string representation of an export job."""
+        return f"Export {self.pk} ({self.export_format})"
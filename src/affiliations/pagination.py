@@ -0,0 +1,162 @@
+"""Paginate the affiliations list with a keyset cursor.
+
+Pages are ordered by affiliation ID, expert panel ID and primary key, and the
+cursor holds those values for the last affiliation of the previous page. The
+next page is found by seeking past them in the matching index, so a deep page
+costs the same as the first one, unlike with an OFFSET. The order is defined
+next to the index, by `KEYSET_ORDERING` in `affiliations.models`.
+"""
+
+# Built-in libraries:
+import base64
+import binascii
+import json
+
+# Third-party dependencies:
+from django.conf import settings
+from django.db.models import Func, IntegerField, QuerySet, Value
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import BasePagination
+from rest_framework.response import Response
+from rest_framework.utils.urls import replace_query_param
+
+# In-house code:
+from affiliations.models import KEYSET_ORDERING
+
+Position = tuple[int, int, int]
+
+
+def _row(*expressions) -> Func:
+    """Return a row value, which compares element by element."""
+    return Func(*expressions, function="ROW", output_field=IntegerField())
+
+
+def _after(queryset: QuerySet, position: Position) -> QuerySet:
+    """Filter a queryset to the affiliations ordered after a position.
+
+    Comparing whole rows, rather than OR-ing a comparison per column, lets
+    the database seek straight to the position in the keyset index.
+    """
+    return queryset.alias(keyset=_row(*KEYSET_ORDERING)).filter(
+        keyset__gt=_row(*(Value(value) for value in position))
+    )
+
+
+def _positive_int(value: str, maximum: int) -> int:
+    """Parse a positive integer, capping it at a maximum."""
+    number = int(value)
+    if number <= 0:
+        raise ValueError(value)
+    return min(number, maximum)
+
+
+class KeysetPagination(BasePagination):
+    """Paginate affiliations when the client asks for it.
+
+    Clients opt in by passing `page_size` or `cursor`. Without either, the
+    whole list is returned unpaginated, as it always has been.
+    """
+
+    cursor_query_param = "cursor"
+    page_size_query_param = "page_size"
+    invalid_cursor_message = "Invalid cursor"
+
+    def __init__(self):
+        self.base_url = None
+        self.next_position = None
+        self.page_size = settings.AFFILIATION_LIST_PAGE_SIZE
+
+    def get_page_size(self, request) -> int:
+        """Return the page size asked for, or the default one."""
+        try:
+            return _positive_int(
+                request.query_params[self.page_size_query_param],
+                settings.AFFILIATION_LIST_MAX_PAGE_SIZE,
+            )
+        except (KeyError, ValueError):
+            return settings.AFFILIATION_LIST_PAGE_SIZE
+
+    def decode_cursor(self, request) -> Position | None:
+        """Return the position a cursor points after, or None on page one."""
+        encoded = request.query_params.get(self.cursor_query_param)
+        if encoded is None:
+            return None
+        try:
+            affiliation_id, expert_panel_id, pk = json.loads(
+                base64.urlsafe_b64decode(encoded.encode("ascii"))
+            )
+        except (binascii.Error, UnicodeError, ValueError, TypeError) as exc:
+            raise NotFound(self.invalid_cursor_message) from exc
+        if not (
+            isinstance(affiliation_id, int)
+            and isinstance(expert_panel_id, int)
+            and isinstance(pk, int)
+        ):
+            raise NotFound(self.invalid_cursor_message)
+        return affiliation_id, expert_panel_id, pk
+
+    @staticmethod
+    def _position(affiliation) -> Position:
+        """Return where an affiliation is in the keyset order."""
+        return tuple(
+            getattr(affiliation, f"keyset_{i}") for i in range(len(KEYSET_ORDERING))
+        )
+
+    @staticmethod
+    def encode_cursor(position: Position) -> str:
+        """Return the cursor of the page after a position."""
+        return base64.urlsafe_b64encode(json.dumps(position).encode()).decode()
+
+    def paginate_queryset(self, queryset: QuerySet, request, view=None):
+        """Return one page of the queryset, or None if the client didn't opt in."""
+        if (
+            self.cursor_query_param not in request.query_params
+            and self.page_size_query_param not in request.query_params
+        ):
+            return None
+        self.base_url = request.build_absolute_uri()
+        self.page_size = self.get_page_size(request)
+        position = self.decode_cursor(request)
+        # The position is annotated, so it's there even if some of the
+        # columns it's made of are deferred.
+        queryset = queryset.annotate(
+            **{
+                f"keyset_{i}": expression
+                for i, expression in enumerate(KEYSET_ORDERING)
+            }
+        ).order_by(*KEYSET_ORDERING)
+        if position is not None:
+            queryset = _after(queryset, position)
+        page = list(queryset[: self.page_size + 1])
+        self.next_position = None
+        if len(page) > self.page_size:
+            page = page[: self.page_size]
+            self.next_position = self._position(page[-1])
+        return page
+
+    def get_next_link(self) -> str | None:
+        """Return the URL of the next page, or None on the last page."""
+        if self.next_position is None:
+            return None
+        return replace_query_param(
+            self.base_url,
+            self.cursor_query_param,
+            self.encode_cursor(self.next_position),
+        )
+
+    def get_paginated_response(self, data) -> Response:
+        """Wrap a page with the link to the next page."""
+        return Response({"next": self.get_next_link(), "results": data})
+
+    def to_html(self):
+        """Return the page controls of the browsable API, which has none."""
+        return ""
+
+    def get_paginated_response_schema(self, schema):
+        """Describe the paginated response for schema generation."""
+        link = {"type": "string", "nullable": True, "format": "uri"}
+        return {
+            "type": "object",
+            "required": ["next", "results"],
+            "properties": {"next": link, "results": schema},
+        }
@@ -0,0 +1,79 @@
+"""Parse the query params accepted by the affiliations endpoints."""
+
+# Third-party dependencies:
+from django.conf import settings
+from rest_framework.exceptions import ValidationError
+
+
+def _query_param_values(request, name: str) -> list[str]:
+    """Return the values passed in a repeated or comma-separated param."""
+    return [
+        value.strip()
+        for param in request.GET.getlist(name)
+        for value in param.split(",")
+        if value.strip()
+    ]
+
+
+def query_param_ids(request, name: str) -> list[int]:
+    """Return the integer IDs passed in a repeated or comma-separated param."""
+    values = _query_param_values(request, name)
+    try:
+        return [int(value) for value in values]
+    except ValueError as exc:
+        raise ValidationError({name: ["IDs must be integers."]}) from exc
+
+
+def query_param_choices(request, name: str, choices: list[str]) -> list[str]:
+    """Return the values passed in a repeated or comma-separated param,
+    checking they are all among the choices.
+    """
+    values = _query_param_values(request, name)
+    unknown = [value for value in values if value not in choices]
+    if unknown:
+        raise ValidationError(
+            {
+                name: [
+                    f"Unknown values: {', '.join(unknown)}. "
+                    f"Choose from: {', '.join(choices)}."
+                ]
+            }
+        )
+    return values
+
+
+def query_param_int(request, name: str) -> int | None:
+    """Return the integer passed in a param, or None if it wasn't passed."""
+    value = request.GET.get(name, "").strip()
+    if not value:
+        return None
+    try:
+        return int(value)
+    except ValueError as exc:
+        raise ValidationError({name: ["Must be an integer."]}) from exc
+
+
+def query_param_bool(request, name: str) -> bool | None:
+    """Return the boolean passed in a param, or None if it wasn't passed."""
+    value = request.GET.get(name, "").strip().lower()
+    if not value:
+        return None
+    if value in ("1", "true", "yes"):
+        return True
+    if value in ("0", "false", "no"):
+        return False
+    raise ValidationError({name: ["Must be true or false."]})
+
+
+def query_param_batch_ids(request) -> tuple[list[int], list[int]]:
+    """Return the affiliation IDs (`affil_id`) and expert panel IDs (`ep_id`)
+    passed, up to `AFFILIATION_DETAIL_MAX_BATCH_SIZE` in total.
+    """
+    affil_ids = query_param_ids(request, "affil_id")
+    ep_ids = query_param_ids(request, "ep_id")
+    max_batch_size = settings.AFFILIATION_DETAIL_MAX_BATCH_SIZE
+    if len(affil_ids) + len(ep_ids) > max_batch_size:
+        raise ValidationError(
+            {"detail": [f"No more than {max_batch_size} IDs may be requested."]}
+        )
+    return affil_ids, ep_ids
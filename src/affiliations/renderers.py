@@ -1,7 +1,94 @@
 """Define custom renderers for the affiliations service."""
 
+# Built-in libraries:
+import json
+import re
+
 # Third-party dependencies:
-from rest_framework.renderers import BrowsableAPIRenderer
+from rest_framework.renderers import BrowsableAPIRenderer, JSONRenderer
+
+try:
+    import ujson
+except ImportError:  # pragma: no cover
+    ujson = None
+
+COMPACT_SEPARATORS = (",", ":")
+SPACED_SEPARATORS = (", ", ": ")
+
+# `ujson` writes exponents with a single digit, e.g. 1e-5, where the standard
+# library writes 1e-05. Output containing one is encoded again by the latter.
+# Searching for the digit before the "e" as well is several times slower.
+_SHORT_EXPONENT = re.compile(r"e[-+]\d(?!\d)")
+
+
+def _has_short_exponent(encoded: str) -> bool:
+    """Return whether encoded JSON has a number with a one digit exponent."""
+    return any(
+        encoded[match.start() - 1].isdigit()
+        for match in _SHORT_EXPONENT.finditer(encoded)
+    )
+
+
+def _ujson_dumps(data, separators, allow_nan=True) -> str | None:
+    """Return data encoded by `ujson`, or None if the standard library has to
+    encode it for the output to be the same.
+    """
+    if ujson is None:
+        return None
+    try:
+        encoded = ujson.dumps(
+            data,
+            ensure_ascii=False,
+            escape_forward_slashes=False,
+            reject_bytes=True,
+            allow_nan=allow_nan,
+            separators=separators,
+        )
+    except (TypeError, OverflowError):
+        return None
+    if _has_short_exponent(encoded):
+        return None
+    return encoded
+
+
+def json_dumps(data, separators=SPACED_SEPARATORS) -> str:
+    """Encode data as JSON the way `json.dumps(..., ensure_ascii=False)` does.
+
+    The C encoder from `ujson` is used when it is installed. Data it can't
+    encode the same way, such as dates, is left to the standard library.
+    """
+    encoded = _ujson_dumps(data, separators)
+    if encoded is None:
+        return json.dumps(data, ensure_ascii=False, separators=separators)
+    return encoded
+
+
+class FastJSONRenderer(JSONRenderer):
+    """Renders JSON with the C encoder from `ujson` when it can.
+
+    The output is byte for byte what `JSONRenderer` gives. Indented output,
+    and data the C encoder can't handle, such as lazy strings or dates, are
+    left to `JSONRenderer`. There's a setting in the project-level settings
+    module that makes Django REST Framework use this renderer by default.
+    """
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        """Render data into JSON, returning a bytestring."""
+        if data is None:
+            return b""
+        encoded = None
+        if (
+            not self.ensure_ascii
+            and self.compact
+            and self.get_indent(accepted_media_type, renderer_context or {}) is None
+        ):
+            encoded = _ujson_dumps(data, COMPACT_SEPARATORS, allow_nan=not self.strict)
+        if encoded is None:
+            return super().render(data, accepted_media_type, renderer_context)
+        # Like `JSONRenderer`, escape the line separators that are valid JSON
+        # but not valid JavaScript.
+        encoded = encoded.replace("\u2028", "\\u2028").replace("\u2029", "\\u2029")
+        return encoded.encode()
 
 
 class BrowsableAPIRendererWithoutForms(BrowsableAPIRenderer):
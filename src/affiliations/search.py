@@ -0,0 +1,135 @@
+"""Search affiliations by their IDs, names and coordinators.
+
+Each affiliation that has not been soft-deleted has a `SearchEntry` whose
+document joins everything it can be found by. The entries are rebuilt whenever
+an affiliation changes, and the database indexes a full-text vector of them,
+so a search reads one index rather than scanning and joining the affiliation
+tables.
+
+Search terms match the start of any word in the document, where words are
+split at punctuation, so `penny@example` finds `penny@example.com`. Where the
+`pg_trgm` extension is installed, the documents are also indexed by trigrams,
+so misspelt terms still match similar words.
+"""
+
+# Built-in libraries:
+from collections import defaultdict
+from collections.abc import Iterable
+from functools import cache
+import re
+
+# Third-party dependencies:
+from django.contrib.postgres.search import (
+    SearchQuery,
+    SearchRank,
+    TrigramWordSimilarity,
+)
+from django.db import connection
+from django.db.models import F, Q, QuerySet, Value
+from django.db.models.functions import Greatest
+
+# In-house code:
+from affiliations.models import Affiliation, Coordinator, SearchEntry
+
+BATCH_SIZE = 250
+DOCUMENT_FIELDS = ("affiliation_id", "expert_panel_id", "full_name", "short_name")
+COORDINATOR_FIELDS = ("coordinator_name", "coordinator_email")
+
+
+@cache
+def trigrams_available() -> bool:
+    """Return whether the `pg_trgm` extension is installed."""
+    with connection.cursor() as cursor:
+        cursor.execute("SELECT 1 FROM pg_extension WHERE extname = 'pg_trgm'")
+        return cursor.fetchone() is not None
+
+
+def _entries_for(affiliations: QuerySet) -> list[SearchEntry]:
+    """Return the search entries of a queryset of affiliations, with two
+    queries.
+    """
+    coordinators = defaultdict(list)
+    for affiliation_pk, *values in (
+        Coordinator.all_with_deleted.filter(affiliation__in=affiliations.values("pk"))
+        .order_by("pk")
+        .values_list("affiliation_id", *COORDINATOR_FIELDS)
+    ):
+        coordinators[affiliation_pk].extend(values)
+    return [
+        SearchEntry(
+            affiliation_id=pk,
+            document=" ".join(
+                str(value)
+                for value in (*values, *coordinators[pk])
+                if value not in (None, "")
+            ),
+        )
+        for pk, *values in affiliations.order_by("pk").values_list(
+            "pk", *DOCUMENT_FIELDS
+        )
+    ]
+
+
+def refresh_search_entries(pks: Iterable[int]) -> None:
+    """Rebuild the search entries of the affiliations with the given primary
+    keys. Soft-deleted affiliations lose theirs.
+    """
+    pks = set(pks)
+    if not pks:
+        return
+    entries = _entries_for(Affiliation.objects.filter(pk__in=pks))
+    SearchEntry.objects.filter(pk__in=pks).delete()
+    SearchEntry.objects.bulk_create(entries, batch_size=BATCH_SIZE)
+
+
+def rebuild_search_entries() -> int:
+    """Replace every search entry, returning how many were written."""
+    entries = _entries_for(Affiliation.objects.all())
+    SearchEntry.objects.all().delete()
+    SearchEntry.objects.bulk_create(entries, batch_size=BATCH_SIZE)
+    return len(entries)
+
+
+def _prefix_query(terms: list[str]) -> SearchQuery:
+    """Return a full-text query matching words that start with every term.
+    The terms are words, so they need no quoting.
+    """
+    lexemes = " & ".join(f"'{term}':*" for term in terms)
+    return SearchQuery(lexemes, config="simple", search_type="raw")
+
+
+def search_terms(text: str) -> list[str]:
+    """Return the words of some text that a search looks for, which may be
+    none, e.g. if the text is only punctuation.
+    """
+    return re.findall(r"\w+", text.lower())
+
+
+def search_entries(text: str) -> QuerySet:
+    """Return the search entries matching some text, best first, with their
+    `rank` between 0 and 1.
+
+    Text without search terms matches nothing, and its entries have no rank.
+    The trigram match uses the `%>` operator alone, which the trigram index
+    serves, rather than also matching substrings with `LIKE`, which it can't.
+    """
+    terms = search_terms(text)
+    if not terms:
+        return SearchEntry.objects.none()
+    query = _prefix_query(terms)
+    matches = Q(vector=query)
+    rank = SearchRank(F("vector"), query, normalization=Value(32))
+    if trigrams_available():
+        text = " ".join(text.lower().split())
+        matches |= Q(document__trigram_word_similar=text)
+        rank = Greatest(rank, TrigramWordSimilarity(text, "document"))
+    return (
+        SearchEntry.objects.filter(matches)
+        .annotate(rank=rank)
+        .order_by("-rank", "affiliation__affiliation_id", "pk")
+    )
+
+
+def search_affiliations(text: str) -> QuerySet:
+    """Return the affiliations matching some text, for filtering by."""
+    return Affiliation.objects.filter(pk__in=search_entries(text).values("pk"))
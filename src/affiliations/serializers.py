@@ -1,10 +1,251 @@
 """Serializers and deserializers for the affiliations service."""
 
+# Built-in libraries:
+from collections import defaultdict
+from itertools import count
+
 # Third-party dependencies:
+from django.db import transaction
 from rest_framework import serializers
+from rest_framework.settings import api_settings
 
 # In-house code:
-from affiliations.models import Affiliation, Coordinator, Approver, Submitter
+from affiliations.bulk import (
+    affiliation_key,
+    assign_fields,
+    split_children,
+    sync_children,
+)
+from affiliations.models import (
+    DUPLICATE_IDS_MESSAGE,
+    Affiliation,
+    Coordinator,
+    Approver,
+    Submitter,
+)
+from affiliations.params import query_param_choices
+from affiliations.signals import batched_changes
+
+
+def _related_lookups(serializer, prefix="", many=False):
+    """Yield the lookup of every relation a serializer nests, and whether
+    it, or a relation it is reached through, is to-many.
+    """
+    for field in serializer.fields.values():
+        if field.write_only or field.source == "*":
+            continue
+        lookup = prefix + field.source.replace(".", "__")
+        if isinstance(field, serializers.ManyRelatedField):
+            yield lookup, True
+        elif isinstance(field, serializers.ListSerializer):
+            yield lookup, True
+            yield from _related_lookups(field.child, f"{lookup}__", True)
+        elif isinstance(field, serializers.RelatedField):
+            yield lookup, many
+        elif isinstance(field, serializers.BaseSerializer):
+            yield lookup, many
+            yield from _related_lookups(field, f"{lookup}__", many)
+
+
+def is_relation(field) -> bool:
+    """Return whether a serializer field represents related objects."""
+    return isinstance(
+        field,
+        (
+            serializers.BaseSerializer,
+            serializers.RelatedField,
+            serializers.ManyRelatedField,
+        ),
+    )
+
+
+def _columns(serializer) -> list[str] | None:
+    """Return the model fields a serializer's own fields read, or None if
+    some of them aren't model fields, e.g. properties.
+    """
+    concrete_fields = {
+        field.name
+        for field in serializer.Meta.model._meta.concrete_fields  # pylint: disable=protected-access
+    }
+    columns = []
+    for field in serializer.fields.values():
+        if field.write_only or is_relation(field):
+            continue
+        if field.source not in concrete_fields:
+            return None
+        columns.append(field.source)
+    return columns
+
+
+def sparse_fieldset(request, serializer_class) -> list[str] | None:
+    """Return the names of the serializer fields asked for, or None for all.
+
+    `fields` picks the object's own fields, and `include` the relations
+    nested in it. Each takes a repeated or comma-separated list of names.
+    Without `fields`, every own field is returned. Without `include`, every
+    relation is returned too, unless `fields` was passed.
+    """
+    if "fields" not in request.GET and "include" not in request.GET:
+        return None
+    serializer_fields = {
+        name: field
+        for name, field in serializer_class().fields.items()
+        if not field.write_only
+    }
+    own_fields = [
+        name for name, field in serializer_fields.items() if not is_relation(field)
+    ]
+    relations = [
+        name for name, field in serializer_fields.items() if is_relation(field)
+    ]
+    picked = set(own_fields)
+    if "fields" in request.GET:
+        picked = set(query_param_choices(request, "fields", own_fields))
+    picked.update(query_param_choices(request, "include", relations))
+    return [name for name in serializer_fields if name in picked]
+
+
+class SparseFieldsetMixin:
+    """Let the caller pick which of a serializer's fields it returns.
+
+    Pass the names of the fields to keep as `fields`; None keeps them all.
+    """
+
+    def __init__(self, *args, fields=None, **kwargs):
+        super().__init__(*args, **kwargs)
+        if fields is not None:
+            for name in set(self.fields) - set(fields):
+                self.fields.pop(name)
+
+
+class EagerLoadingMixin:
+    """Load every relation a model serializer nests along with the queryset.
+
+    The relations are found from the serializer's fields, so a nested field
+    added later is loaded too, instead of costing a query per object.
+    """
+
+    @classmethod
+    def setup_eager_loading(cls, queryset, fields=None):
+        """Return the queryset with the serializer's relations loaded.
+
+        If the names of the `fields` to return are given, which needs
+        `SparseFieldsetMixin`, only the columns and relations they use are.
+        """
+        serializer = cls() if fields is None else cls(fields=fields)
+        select_related = []
+        prefetch_related = []
+        for lookup, many in _related_lookups(serializer):
+            (prefetch_related if many else select_related).append(lookup)
+        if select_related:
+            queryset = queryset.select_related(*select_related)
+        if prefetch_related:
+            queryset = queryset.prefetch_related(*prefetch_related)
+        columns = _columns(serializer)
+        if fields is not None and columns is not None:
+            queryset = queryset.only(*columns, *select_related)
+        return queryset
+
+
+# Fields whose representation of a value read from the database is the value.
+_PLAIN_FIELDS = (
+    serializers.BooleanField,
+    serializers.CharField,
+    serializers.ChoiceField,
+    serializers.IntegerField,
+)
+
+
+def _plain_source(name, field) -> str:
+    """Return the model field behind a serializer field.
+
+    Raises `ValueError` if the field isn't a plain model field.
+    """
+    if not isinstance(field, _PLAIN_FIELDS) or "." in field.source:
+        raise ValueError(f"{name} can't be represented from a values() row.")
+    return field.source
+
+
+def _plain_sources(serializer) -> dict[str, str]:
+    """Return the model field behind each readable field of a serializer."""
+    return {
+        name: _plain_source(name, field)
+        for name, field in serializer.fields.items()
+        if not field.write_only
+    }
+
+
+def _children_by_parent(relation, child_fields, parents) -> dict[int, list[dict]]:
+    """Return the represented children of each parent, with one query.
+
+    `parents` is a queryset of the parents' primary keys. It is used as a
+    subquery, which is much faster than sending every key as a parameter.
+    """
+    parent_attname = relation.field.attname
+    grouped: dict[int, list[dict]] = defaultdict(list)
+    child_rows = (
+        relation.related_model.all_with_deleted.filter(
+            **{f"{relation.field.name}__in": parents}
+        )
+        .order_by("pk")
+        .values(parent_attname, *child_fields.values())
+    )
+    for child_row in child_rows:
+        grouped[child_row[parent_attname]].append(
+            {name: child_row[source] for name, source in child_fields.items()}
+        )
+    return grouped
+
+
+def flat_representations(serializer_class, queryset, fields=None) -> list[dict]:
+    """Return what the serializer would for every object in the queryset.
+
+    The objects are read with `values()`, and the children of each to-many
+    nested serializer with one more query each, grouped by their parent.
+    This skips building a model instance and calling every serializer field
+    for each object, which is most of the cost of a long list. Children are
+    ordered by primary key. Only plain model fields and to-many serializers
+    of plain model fields are supported; anything else raises `ValueError`.
+    Like `EagerLoadingMixin.setup_eager_loading`, it takes the names of the
+    `fields` to return.
+    """
+    serializer = (
+        serializer_class() if fields is None else serializer_class(fields=fields)
+    )
+    meta = serializer.Meta.model._meta  # pylint: disable=protected-access
+    fields = {}
+    children = {}
+    for name, field in serializer.fields.items():
+        if field.write_only:
+            continue
+        if isinstance(field, serializers.ListSerializer):
+            children[name] = (
+                meta.get_field(field.source),
+                _plain_sources(field.child),
+            )
+        else:
+            fields[name] = _plain_source(name, field)
+
+    queryset = queryset.prefetch_related(None)
+    rows = list(queryset.values("pk", *set(fields.values())))
+    parents = queryset.values("pk")
+    if not queryset.query.is_sliced:
+        parents = parents.order_by()
+    for name, (relation, child_fields) in children.items():
+        children[name] = _children_by_parent(relation, child_fields, parents)
+
+    names = [name for name in serializer.fields if name in fields or name in children]
+    return [
+        {
+            name: (
+                children[name].get(row["pk"], [])
+                if name in children
+                else row[fields[name]]
+            )
+            for name in names
+        }
+        for row in rows
+    ]
 
 
 class CoordinatorSerializer(serializers.ModelSerializer):
@@ -44,7 +285,48 @@ class SubmitterSerializer(serializers.ModelSerializer):
         ]
 
 
-class AffiliationSerializer(serializers.ModelSerializer):
+class AffiliationListSerializer(  # pylint: disable=abstract-method
+    serializers.ListSerializer
+):
+    """Validate a list of affiliations to create or update in bulk.
+
+    Besides each affiliation being valid, each must have an affiliation ID,
+    and no two may share an affiliation and expert panel ID, as those identify
+    the affiliation to update.
+    """
+
+    def to_internal_value(self, data):
+        """Validate the affiliations, counting them from the first."""
+        # pylint: disable=attribute-defined-outside-init
+        self._positions = count()
+        self._first_index = {}
+        return super().to_internal_value(data)
+
+    def run_child_validation(self, data):
+        """Validate one affiliation, and check its IDs against earlier ones."""
+        index = next(self._positions)
+        validated = super().run_child_validation(data)
+        key = affiliation_key(validated)
+        if key[0] is None:
+            raise serializers.ValidationError(
+                {"affiliation_id": ["This field is required."]}
+            )
+        if key in self._first_index:
+            raise serializers.ValidationError(
+                {
+                    api_settings.NON_FIELD_ERRORS_KEY: [
+                        "Has the same affiliation and expert panel IDs as item "
+                        f"{self._first_index[key]}."
+                    ]
+                }
+            )
+        self._first_index[key] = index
+        return validated
+
+
+class AffiliationSerializer(
+    EagerLoadingMixin, SparseFieldsetMixin, serializers.ModelSerializer
+):
     """Serialize Affiliation objects."""
 
     coordinators = CoordinatorSerializer(many=True)
@@ -69,63 +351,47 @@ class AffiliationSerializer(serializers.ModelSerializer):
             "clinvar_submitter_ids",
             "is_deleted",
         ]
+        list_serializer_class = AffiliationListSerializer
+        # The unique constraints on the IDs are checked by `validate`, as a
+        # bulk upsert matches them to the stored affiliations instead.
+        validators: list = []
+        extra_kwargs = {"affiliation_id": {"validators": []}}
+
+    def validate(self, attrs):
+        """Reject the affiliation and expert panel IDs of another affiliation."""
+        if isinstance(self.parent, AffiliationListSerializer):
+            return attrs
+        key = {
+            name: attrs.get(name, getattr(self.instance, name, None))
+            for name in ("affiliation_id", "expert_panel_id")
+        }
+        others = Affiliation.all_with_deleted.filter(**key)
+        if self.instance is not None:
+            others = others.exclude(pk=self.instance.pk)
+        if key["affiliation_id"] is not None and others.exists():
+            raise serializers.ValidationError(DUPLICATE_IDS_MESSAGE, code="unique")
+        return attrs
 
     def create(self, validated_data):
         """Create and return an Affiliations instance."""
-        coordinators_data = validated_data.pop("coordinators")
-        approvers_data = validated_data.pop("approvers")
-        submitter_ids_data = validated_data.pop("clinvar_submitter_ids")
-
-        affil = Affiliation.objects.create(
-            **validated_data
-        )  # pylint: disable=no-member
-        for coordinator_data in coordinators_data:
-            Coordinator.objects.create(affilation=affil, **coordinator_data)
-        for approver_data in approvers_data:
-            Approver.objects.create(affilation=affil, **approver_data)
-        for submitter_id_data in submitter_ids_data:
-            Submitter.objects.create(affilation=affil, **submitter_id_data)
+        affiliation_data, children = split_children(validated_data)
+        with transaction.atomic(), batched_changes():
+            affil = Affiliation.objects.create(**affiliation_data)
+            for relation, relation_children in children.items():
+                sync_children(relation, [(affil, relation_children)], new=[affil.pk])
         return affil
 
     def update(self, instance, validated_data):
-        """Update and return an existing Affiliations instance."""
-        coordinator_data = validated_data.pop("coordinators")
-        coordinators = instance.coordinators
-
-        approver_data = validated_data.pop("approvers")
-        approvers = instance.approvers
-
-        submitter_id_data = validated_data.pop("clinvar_submitter_ids")
-        clinvar_submitter_ids = instance.clinvar_submitter_ids
-
-        instance.affiliation_id = validated_data.IntegerField()
-        instance.expert_panel_id = validated_data.IntegerField()
-        instance.full_name = validated_data.CharField()
-        instance.short_name = validated_data.CharField()
-        instance.status = validated_data.CharField()
-        instance.type = validated_data.CharField()
-        instance.clinical_domain_working_group = validated_data.CharField()
-        instance.members = validated_data.CharField()
-        instance.is_deleted = validated_data.BooleanField()
-
-        instance.save()
-
-        coordinators.coordinator_name = coordinator_data.get(
-            "coordinator_name", coordinators.coordinator_name
-        )
-        coordinators.coordinator_email = coordinator_data.get(
-            "coordinator_email", coordinators.coordinator_email
-        )
-        coordinators.save()
-
-        approvers.approver_name = approver_data.get(
-            "approver_name", approvers.approver_name
-        )
-        approvers.save()
-
-        clinvar_submitter_ids.clinvar_submitter_id = submitter_id_data.get(
-            "clinvar_submitter_id", clinvar_submitter_ids.clinvar_submitter_id
-        )
-        clinvar_submitter_ids.save()
+        """Update and return an existing Affiliations instance.
 
+        Only the fields that changed are saved, and the children of each
+        relation sent are made to match with the fewest writes. Nothing is
+        written, and no change is logged, if nothing changed.
+        """
+        affiliation_data, children = split_children(validated_data)
+        with transaction.atomic(), batched_changes():
+            if changed := assign_fields(instance, affiliation_data):
+                instance.save(update_fields=sorted(changed))
+            for relation, relation_children in children.items():
+                sync_children(relation, [(instance, relation_children)])
         return instance
@@ -0,0 +1,220 @@
+"""Signals sent when affiliation data changes.
+
+Anything that derives data from affiliations (such as the old JSON format
+snapshots) listens to `affiliations_changed` rather than to the model signals
+directly. Code that writes with `bulk_create`, `bulk_update` or
+`QuerySet.update`, which skip the model signals, must call
+`notify_affiliations_changed` itself, and code that writes many rows should do
+so inside `batched_changes`.
+"""
+
+# Built-in libraries:
+from collections.abc import Iterable
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+# Third-party dependencies:
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import Signal, receiver
+
+# In-house code:
+from affiliations.cache import invalidate_on_commit
+from affiliations.changes import Change, record_changes
+from affiliations.events import publish_on_commit
+from affiliations.legacy import refresh_legacy_snapshots
+from affiliations.models import (
+    Affiliation,
+    Approver,
+    ChangeAction,
+    Coordinator,
+    Submitter,
+)
+from affiliations.search import refresh_search_entries
+from affiliations.versions import bump_data_version
+
+# Sent with `pks`, the primary keys of the affiliations that changed,
+# `affiliation_ids`, every affiliation ID those affiliations have or had, and
+# `changes`, a `Change` for each affiliation or child written.
+affiliations_changed = Signal()
+
+
+class _PendingChanges:
+    """Collect changes to send as one `affiliations_changed` signal."""
+
+    def __init__(self):
+        """Start with no changes."""
+        self.pks: set[int] = set()
+        self.affiliation_ids: set[int] = set()
+        self.changes: list[Change] = []
+        # (model, action, pk) of changes whose affiliation IDs are looked up
+        # when the signal is sent.
+        self.unresolved: list[tuple[str, str, int]] = []
+
+    def send(self) -> None:
+        """Look up the affiliation IDs still needed and send the signal."""
+        if self.unresolved:
+            current_ids = dict(
+                (pk, (affiliation_id, expert_panel_id))
+                for pk, affiliation_id, expert_panel_id in Affiliation.all_with_deleted.filter(
+                    pk__in={pk for _, _, pk in self.unresolved}
+                ).values_list(
+                    "pk", "affiliation_id", "expert_panel_id"
+                )
+            )
+            self.affiliation_ids.update(ids[0] for ids in current_ids.values())
+            self.changes.extend(
+                Change(model, action, pk, *current_ids[pk])
+                for model, action, pk in self.unresolved
+                if pk in current_ids
+            )
+            self.unresolved = []
+        if not self.pks and not self.affiliation_ids:
+            return
+        affiliations_changed.send(
+            sender=Affiliation,
+            pks=self.pks,
+            affiliation_ids=self.affiliation_ids,
+            changes=self.changes,
+        )
+
+
+_batch: ContextVar[_PendingChanges | None] = ContextVar(
+    "affiliations_changed_batch", default=None
+)
+
+
+@contextmanager
+def batched_changes():
+    """Send a single `affiliations_changed` signal for every write in the block.
+
+    Writes that touch many rows send the signal once, when the block ends,
+    rather than once per row; the change log then gives them all the same
+    sequence. Nothing is sent if the block raises. Use it inside the
+    transaction of the writes.
+    """
+    if _batch.get() is not None:
+        yield
+        return
+    pending = _PendingChanges()
+    token = _batch.set(pending)
+    try:
+        yield
+    finally:
+        _batch.reset(token)
+    pending.send()
+
+
+def _add_changes(pks, affiliation_ids, changes=(), unresolved=()) -> None:
+    """Send changes, or add them to the current batch."""
+    batch = _batch.get()
+    pending = batch or _PendingChanges()
+    pending.pks.update(pks)
+    pending.affiliation_ids.update(affiliation_ids)
+    pending.changes.extend(changes)
+    pending.unresolved.extend(unresolved)
+    if batch is None:
+        pending.send()
+
+
+def notify_affiliations_changed(
+    pks: Iterable[int],
+    affiliation_ids: Iterable[int] = (),
+    model: str = "affiliation",
+    action: str = ChangeAction.UPDATED,
+) -> None:
+    """Send `affiliations_changed` for the given affiliation primary keys.
+
+    The current affiliation IDs of the affiliations are looked up, and any
+    extra (e.g. previous) affiliation IDs passed in are added to them. Each
+    affiliation is logged as having had the `action` done to it, or to one of
+    its children if `model` names a child model.
+    """
+    pks = sorted(set(pks))
+    _add_changes(pks, affiliation_ids, unresolved=[(model, action, pk) for pk in pks])
+
+
+def _action(signal, created, was_deleted=False, is_deleted=False) -> str:
+    """Return what a model signal did to an object."""
+    if signal is post_delete or (is_deleted and not was_deleted):
+        return ChangeAction.DELETED
+    if created:
+        return ChangeAction.CREATED
+    return ChangeAction.UPDATED
+
+
+@receiver(post_save, sender=Affiliation)
+@receiver(post_delete, sender=Affiliation)
+def affiliation_written(
+    sender, instance, signal, created=False, **kwargs
+):  # pylint: disable=unused-argument
+    """Notify listeners that an affiliation was saved or deleted.
+
+    Saving `is_deleted` as true is logged as a deletion.
+    """
+    loaded_values = getattr(instance, "loaded_values", {})
+    affiliation_ids = {instance.affiliation_id}
+    previous_affiliation_id = loaded_values.get("affiliation_id")
+    if isinstance(previous_affiliation_id, int):
+        affiliation_ids.add(previous_affiliation_id)
+    action = _action(
+        signal, created, loaded_values.get("is_deleted", False), instance.is_deleted
+    )
+    _add_changes(
+        {instance.pk},
+        affiliation_ids,
+        changes=[
+            Change(
+                "affiliation",
+                action,
+                instance.pk,
+                instance.affiliation_id,
+                instance.expert_panel_id,
+            )
+        ],
+    )
+
+
+@receiver(post_save, sender=Coordinator)
+@receiver(post_save, sender=Approver)
+@receiver(post_save, sender=Submitter)
+@receiver(post_delete, sender=Coordinator)
+@receiver(post_delete, sender=Approver)
+@receiver(post_delete, sender=Submitter)
+def child_written(sender, instance, signal, created=False, **kwargs):
+    """Notify listeners that a coordinator, approver or submitter changed."""
+    # pylint: disable=unused-argument
+    notify_affiliations_changed(
+        [instance.affiliation_id],
+        model=sender._meta.model_name,  # pylint: disable=protected-access
+        action=_action(signal, created),
+    )
+
+
+@receiver(affiliations_changed)
+def refresh_snapshots(
+    sender, affiliation_ids, **kwargs
+):  # pylint: disable=unused-argument
+    """Keep the old JSON format snapshots up to date."""
+    refresh_legacy_snapshots(affiliation_ids)
+
+
+@receiver(affiliations_changed)
+def refresh_search(sender, pks, **kwargs):  # pylint: disable=unused-argument
+    """Keep the search entries up to date."""
+    refresh_search_entries(pks)
+
+
+@receiver(affiliations_changed)
+def bump_version(sender, changes=(), **kwargs):  # pylint: disable=unused-argument
+    """Invalidate the ETags of the read endpoints, log the changes, and
+    publish them to the events/ stream once they commit.
+    """
+    publish_on_commit(record_changes(bump_data_version(), changes))
+
+
+@receiver(affiliations_changed)
+def invalidate_cache(
+    sender, pks, affiliation_ids, **kwargs
+):  # pylint: disable=unused-argument
+    """Make cached responses containing the affiliations unreachable."""
+    invalidate_on_commit(pks, affiliation_ids)
@@ -0,0 +1,278 @@
+"""Load affiliations from the VCI/GCI affiliation list spreadsheet, saved as
+CSV.
+
+Each row of the spreadsheet is an affiliation ID, with the GCEP and VCEP it
+runs, if any. A row becomes one affiliation per expert panel, or a single
+independent curation affiliation if it has neither. The rows are read one at
+a time and validated `CHUNK_SIZE` affiliations at a time, and each valid chunk
+is created or updated by its affiliation and expert panel IDs with
+`affiliations.bulk.upsert_affiliations`, so loading the same spreadsheet
+twice changes nothing.
+"""
+
+# Built-in libraries:
+from collections import Counter
+from collections.abc import Iterable, Iterator
+import csv
+from itertools import islice
+from typing import NamedTuple
+
+# Third-party dependencies:
+from django.db.models import Prefetch
+from rest_framework import serializers
+
+# In-house code:
+from affiliations.bulk import affiliation_key, split_children
+from affiliations.models import (
+    Affiliation,
+    AffiliationCDWG,
+    AffiliationStatus,
+    Coordinator,
+    Submitter,
+)
+from affiliations.serializers import AffiliationSerializer, CoordinatorSerializer
+
+COLUMNS = (
+    "AffiliationID",
+    "Affiliation Full Name",
+    "Coordinator(s)",
+    "Email",
+    "Submitter ID",
+    "VCEP Affiliation ID",
+    "VCEP Affiliation Name",
+    "GCEP Affiliation ID",
+    "GCEP Affiliation Name",
+    "Status",
+    "CDWG",
+    "is_deleted",
+)
+
+# Affiliations validated, and then written, at a time.
+CHUNK_SIZE = 1000
+
+
+class SpreadsheetCoordinatorSerializer(CoordinatorSerializer):
+    """Validate a coordinator from the spreadsheet, which may have no email."""
+
+    class Meta(CoordinatorSerializer.Meta):
+        """Let the email be blank."""
+
+        extra_kwargs = {"coordinator_email": {"allow_blank": True}}
+
+
+class SpreadsheetAffiliationSerializer(AffiliationSerializer):
+    """Validate an affiliation read from the spreadsheet."""
+
+    coordinators = SpreadsheetCoordinatorSerializer(many=True)
+
+
+class SpreadsheetRow(NamedTuple):
+    """Pair an affiliation read from the spreadsheet with its line number."""
+
+    line: int
+    data: dict
+
+
+def _choice(value: str, choices) -> str:
+    """Return the choice a value or label names, or the value if it names
+    none, for the serializer to reject.
+    """
+    for choice in choices:
+        if value.casefold() in (choice.value.casefold(), str(choice.label).casefold()):
+            return choice.value
+    return value
+
+
+def _coordinators(names: str, emails: str) -> list[dict]:
+    """Pair up the comma-separated coordinator names and emails of a row.
+    Coordinators without an email, as there are fewer, get a blank one.
+    """
+    emails_list = [email.strip() for email in emails.split(",")]
+    return [
+        {
+            "coordinator_name": name.strip(),
+            "coordinator_email": emails_list[i] if i < len(emails_list) else "",
+        }
+        for i, name in enumerate(names.split(","))
+        if name.strip()
+    ]
+
+
+def _affiliations(row: dict[str, str]) -> Iterator[dict]:
+    """Yield the affiliations of a spreadsheet row."""
+    values = {name: (row[name] or "").strip() for name in COLUMNS}
+    shared = {
+        "affiliation_id": values["AffiliationID"] or None,
+        "status": _choice(values["Status"], AffiliationStatus),
+        "clinical_domain_working_group": _choice(values["CDWG"], AffiliationCDWG),
+        "is_deleted": values["is_deleted"] == "TRUE",
+        "coordinators": _coordinators(values["Coordinator(s)"], values["Email"]),
+        "clinvar_submitter_ids": (
+            [{"clinvar_submitter_id": values["Submitter ID"]}]
+            if values["Submitter ID"]
+            else []
+        ),
+    }
+    panels = []
+    if values["GCEP Affiliation ID"]:
+        panels.append(
+            ("GCEP", values["GCEP Affiliation ID"], values["GCEP Affiliation Name"])
+        )
+    if values["VCEP Affiliation ID"]:
+        vcep_name = values["VCEP Affiliation Name"]
+        panels.append(
+            (
+                "SC_VCEP" if "SC-VCEP" in vcep_name else "VCEP",
+                values["VCEP Affiliation ID"],
+                vcep_name,
+            )
+        )
+    if not panels:
+        panels.append(("INDEPENDENT_CURATION", None, values["Affiliation Full Name"]))
+    for affiliation_type, expert_panel_id, full_name in panels:
+        yield {
+            **shared,
+            "type": affiliation_type,
+            "expert_panel_id": expert_panel_id,
+            "full_name": full_name,
+        }
+
+
+def read_spreadsheet(lines: Iterable[str]) -> Iterator[SpreadsheetRow]:
+    """Yield the affiliations of a spreadsheet, one row at a time.
+
+    Raises `ValidationError` if the header lacks some of the columns.
+    """
+    reader = csv.DictReader(lines)
+    missing = [name for name in COLUMNS if name not in (reader.fieldnames or ())]
+    if missing:
+        raise serializers.ValidationError(
+            [f"The spreadsheet has no {', '.join(missing)} column."]
+        )
+    for row in reader:
+        for data in _affiliations(row):
+            yield SpreadsheetRow(reader.line_num, data)
+
+
+def _messages(errors, prefix="") -> Iterator[str]:
+    """Flatten a serializer's nested errors into messages naming the field."""
+    if isinstance(errors, dict):
+        for name, field_errors in errors.items():
+            yield from _messages(field_errors, f"{prefix}{name}: ")
+    elif isinstance(errors, list) and any(
+        isinstance(error, (dict, list)) for error in errors
+    ):
+        for index, item_errors in enumerate(errors):
+            if item_errors:
+                yield from _messages(item_errors, f"{prefix.rstrip(': ')}[{index}].")
+    else:
+        for error in errors:
+            yield f"{prefix}{error}"
+
+
+def validate_rows(rows: list[SpreadsheetRow]) -> list[dict]:
+    """Return the validated data of every affiliation read.
+
+    Raises `ValidationError` with a message per error, naming its line, if
+    any affiliation is invalid.
+    """
+    serializer = SpreadsheetAffiliationSerializer(
+        data=[row.data for row in rows], many=True, partial=True
+    )
+    if serializer.is_valid():
+        return serializer.validated_data
+    raise serializers.ValidationError(
+        [
+            f"Line {row.line}: {message}"
+            for row, item_errors in zip(rows, serializer.errors)
+            for message in _messages(item_errors)
+        ]
+    )
+
+
+def validated_chunks(rows: Iterable[SpreadsheetRow]) -> Iterator[list[dict]]:
+    """Yield the validated data of the affiliations read, `CHUNK_SIZE` at a
+    time.
+
+    No chunk is yielded after an invalid affiliation, but the rest are still
+    validated, and `ValidationError` is then raised with a message per error,
+    naming its line. An affiliation with the same affiliation and expert panel
+    IDs as one in an earlier chunk is an error too.
+    """
+    rows = iter(rows)
+    first_lines: dict[tuple[int, int | None], int] = {}
+    errors: list[str] = []
+    while chunk := list(islice(rows, CHUNK_SIZE)):
+        try:
+            items = validate_rows(chunk)
+        except serializers.ValidationError as exc:
+            errors.extend(exc.detail)
+            continue
+        for row, item in zip(chunk, items):
+            key = affiliation_key(item)
+            if key in first_lines:
+                errors.append(
+                    f"Line {row.line}: Has the same affiliation and expert panel "
+                    f"IDs as line {first_lines[key]}."
+                )
+            else:
+                first_lines[key] = row.line
+        if not errors:
+            yield items
+    if errors:
+        raise serializers.ValidationError(errors)
+
+
+def _child_values(fields: list[str], children: Iterable) -> Counter:
+    """Count the values of some fields of children, or of dicts of them."""
+    return Counter(
+        tuple(
+            child[name] if isinstance(child, dict) else getattr(child, name)
+            for name in fields
+        )
+        for child in children
+    )
+
+
+def _children_differ(stored: Iterable, items: list[dict]) -> bool:
+    """Return whether stored children differ from the dicts of new ones."""
+    fields = sorted({name for item in items for name in item})
+    return _child_values(fields, stored) != _child_values(fields, items)
+
+
+def describe_changes(items: list[dict]) -> list[str]:
+    """Describe what loading validated affiliations would create and update,
+    a line per affiliation that would change.
+    """
+    existing = {
+        affiliation_key(affiliation): affiliation
+        for affiliation in Affiliation.all_with_deleted.filter(
+            affiliation_id__in={item["affiliation_id"] for item in items}
+        ).prefetch_related(
+            Prefetch("coordinators", queryset=Coordinator.all_with_deleted.all()),
+            Prefetch(
+                "clinvar_submitter_ids", queryset=Submitter.all_with_deleted.all()
+            ),
+        )
+    }
+    lines = []
+    for item in items:
+        own, children = split_children(item)
+        key = affiliation_key(own)
+        affiliation = existing.get(key)
+        if affiliation is None:
+            lines.append(f"+ {key[0]}/{key[1]}: {own['full_name']}")
+            continue
+        changes = [
+            f"{name} {getattr(affiliation, name)!r} -> {value!r}"
+            for name, value in own.items()
+            if getattr(affiliation, name) != value
+        ]
+        changes.extend(
+            f"{relation} changed"
+            for relation, relation_children in children.items()
+            if _children_differ(getattr(affiliation, relation).all(), relation_children)
+        )
+        if changes:
+            lines.append(f"~ {key[0]}/{key[1]}: {'; '.join(changes)}")
+    return lines
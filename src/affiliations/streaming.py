@@ -0,0 +1,67 @@
+"""Stream JSON arrays one element at a time.
+
+The streamed responses use asynchronous iterators, so under Daphne each
+element is sent as soon as it is rendered and only one chunk of rows is held
+in memory at a time. Under WSGI, Django consumes the whole iterator first.
+"""
+
+# Built-in libraries:
+from collections.abc import AsyncIterable, AsyncIterator
+
+# Third-party dependencies:
+from django.db.models import QuerySet
+from django.http import StreamingHttpResponse
+
+# In-house code:
+from affiliations.renderers import FastJSONRenderer
+
+# Rows fetched from the database per round trip while streaming.
+STREAM_CHUNK_SIZE = 500
+
+
+def wants_stream(request) -> bool:
+    """Return whether the client asked for a streamed response."""
+    return request.GET.get("stream", "").lower() in ("1", "true", "yes")
+
+
+async def _json_array(
+    elements: AsyncIterable[str | bytes], separator: str
+) -> AsyncIterator[str | bytes]:
+    """Wrap already rendered JSON elements in a JSON array."""
+    yield "["
+    first = True
+    async for element in elements:
+        if not first:
+            yield separator
+        first = False
+        yield element
+    yield "]"
+
+
+def streaming_json_array(
+    elements: AsyncIterable[str | bytes], separator: str = ","
+) -> StreamingHttpResponse:
+    """Return a response streaming the rendered elements as a JSON array."""
+    return StreamingHttpResponse(
+        _json_array(elements, separator), content_type="application/json"
+    )
+
+
+async def iterate_documents(queryset: QuerySet) -> AsyncIterator[str]:
+    """Yield the values of a flat `values_list` queryset in chunks."""
+    async for document in queryset.aiterator(chunk_size=STREAM_CHUNK_SIZE):
+        yield document
+
+
+async def iterate_serialized(
+    queryset: QuerySet, serializer_class
+) -> AsyncIterator[bytes]:
+    """Yield each object of the queryset rendered as JSON by the serializer.
+
+    The queryset must prefetch every relation the serializer uses, e.g. with
+    `EagerLoadingMixin.setup_eager_loading`, because the objects are
+    serialized outside of a thread that may query.
+    """
+    renderer = FastJSONRenderer()
+    async for obj in queryset.aiterator(chunk_size=STREAM_CHUNK_SIZE):
+        yield renderer.render(serializer_class(obj).data)
@@ -1,17 +1,76 @@
 """Tests for the affiliations service."""
 
+# pylint: disable=too-many-lines
+
 # Third-party dependencies:
 from unittest import mock
-from django.test import TestCase
+from concurrent.futures import ThreadPoolExecutor
+from io import StringIO
+import asyncio
+import datetime
+import importlib
+import json
+import os
+import re
+import tempfile
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.core.management import CommandError, call_command
+from django.db import IntegrityError, connection, transaction
+from django.db.migrations.loader import MigrationLoader
+from django.test import TestCase, TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from django.utils.http import parse_http_date
+from django.utils.translation import gettext_lazy
 
 from django.core.exceptions import ValidationError
+import fakeredis
+import openpyxl
+from rest_framework import serializers
+from rest_framework.renderers import JSONRenderer
 from rest_framework.test import APIRequestFactory, APITestCase
 from rest_framework_api_key.models import APIKey
 
 # In-house code:
+from affiliations.approvers import load_approvers
+from affiliations.bulk import upsert_affiliations
+from affiliations.cache import ALL_GENERATION, invalidate
+from affiliations.changes import prune_change_log
+from affiliations.events import EVENTS_CHANNEL, LocalBroker, RedisBroker, get_broker
+from affiliations.exports import (
+    EXPORT_FIELDS,
+    WRITERS,
+    run_export_job,
+    run_pending_export_jobs,
+)
+from affiliations.identifiers import allocate_affiliation_id, expert_panel_id_for
+from affiliations.signals import notify_affiliations_changed
+from affiliations.versions import DATA_VERSION_PK
 from affiliations.views import AffiliationsList
 from affiliations.views import AffiliationsDetail
-from affiliations.models import Affiliation, Coordinator, Approver, Submitter
+from affiliations.legacy import build_legacy_affiliations, rebuild_legacy_snapshots
+from affiliations.renderers import FastJSONRenderer, json_dumps
+from affiliations.search import search_entries, trigrams_available
+from affiliations.serializers import AffiliationSerializer, flat_representations
+from affiliations.models import (
+    DUPLICATE_IDS_MESSAGE,
+    KEYSET_ORDERING,
+    Affiliation,
+    Coordinator,
+    Approver,
+    Submitter,
+    LegacySnapshot,
+    ChangeLogEntry,
+    SearchEntry,
+    ExportFormat,
+    ExportJob,
+    ExportStatus,
+    DataVersion,
+)
 
 from affiliations.admin import AffiliationForm
 
@@ -21,6 +80,10 @@ class AffiliationsViewsBaseTestCase(APITestCase):
 
     maxDiff = None
 
+    def setUp(self):
+        """Start every test with an empty response cache."""
+        cache.clear()
+
     @classmethod
     def setUpTestData(cls):
         """Seed the test database with some test data."""
@@ -207,6 +270,33 @@ class AffiliationsViewsBaseTestCase(APITestCase):
         )
         self.assertEqual(response.status_code, 200)
 
+    def test_detail_affiliation_json_batch_call(self):
+        """Make sure several affiliations can be asked for in one call, and
+        are returned in the order they were asked for."""
+        _, key = APIKey.objects.create_key(name="my-remote-service")
+        auth_headers = {"HTTP_X_API_KEY": key}
+        response = self.client.get(
+            "/api/affiliation_detail/?affil_id=3,10000&affil_id=404", **auth_headers
+        )
+        self.assertEqual(
+            [affil["affiliation_id"] for affil in response.json()], ["3", "10000"]
+        )
+        response = self.client.get(
+            "/api/affiliation_detail/?affil_id=3&ep_id=40000,2003", **auth_headers
+        )
+        self.assertEqual(
+            [affil["affiliation_id"] for affil in response.json()], ["3", "10000"]
+        )
+        response = self.client.get(
+            "/api/affiliation_detail/?affil_id=three", **auth_headers
+        )
+        self.assertEqual(response.status_code, 400)
+        with override_settings(AFFILIATION_DETAIL_MAX_BATCH_SIZE=1):
+            response = self.client.get(
+                "/api/affiliation_detail/?affil_id=3,10000", **auth_headers
+            )
+        self.assertEqual(response.status_code, 400)
+
     def test_list_affiliation_json_call(self):
         """Make sure the API response of all the affiliations in the db is
         returned in the original JSON format ."""
@@ -216,6 +306,2410 @@ class AffiliationsViewsBaseTestCase(APITestCase):
         self.assertEqual(response.status_code, 200)
         self.assertEqual(len(response.json()), 2)
 
+    def test_unchanged_data_is_not_modified(self):
+        """Make sure conditional GETs are answered with 304 until data changes."""
+        _, key = APIKey.objects.create_key(name="my-remote-service")
+        auth_headers = {"HTTP_X_API_KEY": key}
+        for url in (
+            "/api/affiliations_list/",
+            "/api/affiliation_detail/?affil_id=10000",
+            "/api/database_list/",
+            "/api/database_list/1/",
+        ):
+            response = self.client.get(url, **auth_headers)
+            self.assertEqual(response.status_code, 200)
+            etag = response["ETag"]
+            with CaptureQueriesContext(connection) as queries:
+                response = self.client.get(url, HTTP_IF_NONE_MATCH=etag, **auth_headers)
+            self.assertEqual(response.status_code, 304, url)
+            self.assertFalse(
+                [
+                    query
+                    for query in queries.captured_queries
+                    if "affiliations_affiliation" in query["sql"]
+                    or "affiliations_legacysnapshot" in query["sql"]
+                ]
+            )
+
+        response = self.client.get("/api/affiliations_list/", **auth_headers)
+        etag = response["ETag"]
+        Approver.objects.create(
+            affiliation=Affiliation.objects.get(affiliation_id=10000),
+            approver_name="Mewtwo",
+        )
+        response = self.client.get(
+            "/api/affiliations_list/", HTTP_IF_NONE_MATCH=etag, **auth_headers
+        )
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response["ETag"], etag)
+
+    def test_bad_params_are_rejected_before_conditions(self):
+        """Make sure invalid query params get a 400, even when the client's
+        copy is up to date.
+        """
+        _, key = APIKey.objects.create_key(name="my-remote-service")
+        auth_headers = {"HTTP_X_API_KEY": key}
+        pk = Affiliation.objects.get(affiliation_id=10000).pk
+        for url, bad_params, status_code in (
+            ("/api/affiliation_detail/?affil_id=10000", "?affil_id=x", 400),
+            ("/api/async/affiliation_detail/?affil_id=10000", "?ep_id=x", 400),
+            ("/api/database_list/", "?status=LOST", 400),
+            ("/api/database_list/", "?cursor=nowhere", 404),
+            (f"/api/database_list/{pk}/", "?fields=secret", 400),
+            ("/api/changes/", "?since=latest", 400),
+        ):
+            etag = self.client.get(url, **auth_headers)["ETag"]
+            response = self.client.get(
+                url.split("?", maxsplit=1)[0] + bad_params,
+                HTTP_IF_NONE_MATCH=etag,
+                **auth_headers,
+            )
+            self.assertEqual(response.status_code, status_code, bad_params)
+
+    def test_etag_decides_rather_than_last_modified(self):
+        """Make sure a write in the same second as a client's read isn't
+        hidden by the one second precision of `Last-Modified`.
+        """
+        _, key = APIKey.objects.create_key(name="my-remote-service")
+        auth_headers = {"HTTP_X_API_KEY": key}
+        response = self.client.get("/api/affiliations_list/", **auth_headers)
+        last_modified = response["Last-Modified"]
+        with self.captureOnCommitCallbacks(execute=True):
+            Approver.objects.create(
+                affiliation=Affiliation.objects.get(affiliation_id=10000),
+                approver_name="Mew",
+            )
+        DataVersion.objects.filter(pk=DATA_VERSION_PK).update(
+            modified=datetime.datetime.fromtimestamp(
+                parse_http_date(last_modified), datetime.timezone.utc
+            )
+        )
+        response = self.client.get(
+            "/api/affiliations_list/",
+            HTTP_IF_MODIFIED_SINCE=last_modified,
+            **auth_headers,
+        )
+        self.assertEqual(response.status_code, 200)
+        self.assertIn("Mew", response.content.decode())
+        self.assertEqual(response["Last-Modified"], last_modified)
+
+    def test_streamed_lists_match_unstreamed_lists(self):
+        """Make sure streaming a list doesn't change its content."""
+        _, key = APIKey.objects.create_key(name="my-remote-service")
+        auth_headers = {"HTTP_X_API_KEY": key}
+        for url in ("/api/affiliations_list/", "/api/database_list/"):
+            response = self.client.get(url, **auth_headers)
+            with self.assertWarnsRegex(Warning, "asynchronous iterators"):
+                streamed = self.client.get(f"{url}?stream=true", **auth_headers)
+                content = b"".join(streamed)
+            self.assertTrue(streamed.streaming)
+            self.assertEqual(content, response.content)
+
+    def test_async_views_match_sync_views(self):
+        """Make sure the async views return the same content as the sync views."""
+        _, key = APIKey.objects.create_key(name="my-remote-service")
+        auth_headers = {"HTTP_X_API_KEY": key}
+        for url in (
+            "/api/affiliations_list/",
+            "/api/affiliation_detail/?affil_id=10000,3",
+            "/api/database_list/",
+            "/api/database_list/2/",
+        ):
+            response = self.client.get(url, **auth_headers)
+            async_response = self.client.get(
+                url.replace("/api/", "/api/async/"), **auth_headers
+            )
+            self.assertEqual(async_response.status_code, 200)
+            self.assertEqual(async_response.content, response.content)
+            etag = async_response["ETag"]
+            async_response = self.client.get(
+                url.replace("/api/", "/api/async/"),
+                HTTP_IF_NONE_MATCH=etag,
+                **auth_headers,
+            )
+            self.assertEqual(async_response.status_code, 304)
+
+        response = self.client.get("/api/async/affiliations_list/")
+        self.assertEqual(response.status_code, 403)
+        response = self.client.get("/api/async/database_list/404/")
+        self.assertEqual(response.status_code, 404)
+        response = self.client.get(
+            "/api/async/affiliation_detail/?affil_id=three", **auth_headers
+        )
+        self.assertEqual(response.status_code, 400)
+
+
+class TestResponseCache(APITestCase):
+    """A test class for caching the responses of the read endpoints."""
+
+    @classmethod
+    def setUpTestData(cls):
+        """Seed the test database with two affiliations and an API key."""
+        cls.affiliations = [
+            Affiliation.objects.create(
+                affiliation_id=affil_id,
+                expert_panel_id=affil_id + 30000,
+                full_name=f"Sinnoh GCEP {affil_id}",
+                short_name="Sinnoh",
+                status="ACTIVE",
+                type="GCEP",
+                clinical_domain_working_group="NONE",
+                members="Turtwig",
+            )
+            for affil_id in (10000, 10001)
+        ]
+        _, key = APIKey.objects.create_key(name="my-remote-service")
+        cls.auth_headers = {"HTTP_X_API_KEY": key}
+
+    def setUp(self):
+        """Start every test with an empty response cache."""
+        cache.clear()
+
+    def _cache_status(self, url, **headers):
+        """Return whether the response to a GET was served from the cache."""
+        return self.client.get(url, **{**self.auth_headers, **headers})["X-Cache"]
+
+    def test_responses_are_cached_per_caller(self):
+        """Make sure repeated requests hit the cache, unless the caller differs."""
+        for url in (
+            "/api/affiliations_list/",
+            "/api/affiliation_detail/?affil_id=10000",
+            "/api/database_list/",
+            f"/api/database_list/{self.affiliations[0].pk}/",
+        ):
+            self.assertEqual(self._cache_status(url), "MISS")
+            self.assertEqual(self._cache_status(url), "HIT")
+            _, other_key = APIKey.objects.create_key(name="another-service")
+            self.assertEqual(self._cache_status(url, HTTP_X_API_KEY=other_key), "MISS")
+        self.assertEqual(cache.get("affils:stats:hits"), 4)
+        # The async views share entries with the sync views.
+        self.assertEqual(self._cache_status("/api/async/database_list/"), "HIT")
+
+    def test_writes_invalidate_only_affected_entries(self):
+        """Make sure a write invalidates the entries that could contain it."""
+        unchanged, changed = self.affiliations
+        urls = {
+            "list": "/api/affiliations_list/",
+            "changed": f"/api/database_list/{changed.pk}/",
+            "changed_id": "/api/affiliation_detail/?affil_id=10001",
+            "unchanged": f"/api/database_list/{unchanged.pk}/",
+            "unchanged_id": "/api/affiliation_detail/?affil_id=10000",
+        }
+        for url in urls.values():
+            self._cache_status(url)
+        with self.captureOnCommitCallbacks(execute=True):
+            Approver.objects.create(affiliation=changed, approver_name="Cynthia")
+        self.assertEqual(
+            {name: self._cache_status(url) for name, url in urls.items()},
+            {
+                "list": "MISS",
+                "changed": "MISS",
+                "changed_id": "MISS",
+                "unchanged": "HIT",
+                "unchanged_id": "HIT",
+            },
+        )
+        response = self.client.get(urls["changed_id"], **self.auth_headers)
+        self.assertEqual(response.json()[0]["approver"], ["Cynthia"])
+
+    def test_file_based_cache(self):
+        """Make sure the file based backend can store responses."""
+        with tempfile.TemporaryDirectory() as location:
+            with override_settings(
+                CACHES={
+                    "default": {
+                        "BACKEND": "django.core.cache.backends.filebased.FileBasedCache",
+                        "LOCATION": location,
+                    }
+                }
+            ):
+                self.assertEqual(self._cache_status("/api/database_list/"), "MISS")
+                self.assertEqual(self._cache_status("/api/database_list/"), "HIT")
+
+    def test_cache_stats_are_for_admins(self):
+        """Make sure only admins can see the cache's hit and miss counts."""
+        self._cache_status("/api/database_list/")
+        self._cache_status("/api/database_list/")
+        response = self.client.get("/api/cache_stats/", **self.auth_headers)
+        self.assertEqual(response.status_code, 403)
+        admin = User.objects.create_superuser("admin", "admin@example.com", "pw")
+        self.client.force_login(admin)
+        response = self.client.get("/api/cache_stats/")
+        self.assertEqual(response.json(), {"hits": 1, "misses": 1})
+
+
+@override_settings(
+    CACHES={
+        "default": {
+            "BACKEND": "django.core.cache.backends.redis.RedisCache",
+            "LOCATION": "redis://127.0.0.1:6379",
+            "OPTIONS": {
+                "connection_class": fakeredis.FakeConnection,
+                "server": fakeredis.FakeServer(),
+            },
+        }
+    }
+)
+class TestRedisResponseCache(TestResponseCache):
+    """Run the response cache tests against the Redis backend, with a fake
+    Redis server.
+    """
+
+    def test_writes_bump_generations(self):
+        """Make sure a write bumps the generations of the affiliation once
+        the transaction commits, and leaves the others alone.
+        """
+        unchanged, changed = self.affiliations
+        keys = [
+            ALL_GENERATION,
+            f"affils:generation:pk:{changed.pk}",
+            "affils:generation:affiliation_id:10001",
+            f"affils:generation:pk:{unchanged.pk}",
+            "affils:generation:affiliation_id:10000",
+        ]
+        for url in (
+            "/api/affiliations_list/",
+            f"/api/database_list/{changed.pk}/",
+            "/api/affiliation_detail/?affil_id=10001",
+            f"/api/database_list/{unchanged.pk}/",
+            "/api/affiliation_detail/?affil_id=10000",
+        ):
+            self._cache_status(url)
+        before = cache.get_many(keys)
+        with self.captureOnCommitCallbacks() as callbacks:
+            Approver.objects.create(affiliation=changed, approver_name="Cynthia")
+        self.assertEqual(cache.get_many(keys), before)
+        for callback in callbacks:
+            callback()
+        after = cache.get_many(keys)
+        self.assertEqual([after[key] - before[key] for key in keys], [1, 1, 1, 0, 0])
+
+    def test_bump_missing_generation(self):
+        """Make sure a generation that was evicted, so can't be incremented,
+        is set to a new value rather than raising.
+        """
+        _, changed = self.affiliations
+        url = f"/api/database_list/{changed.pk}/"
+        self.assertEqual(self._cache_status(url), "MISS")
+        cache.delete(f"affils:generation:pk:{changed.pk}")
+        invalidate([changed.pk], [])
+        self.assertIsInstance(cache.get(f"affils:generation:pk:{changed.pk}"), int)
+        self.assertEqual(self._cache_status(url), "MISS")
+        self.assertEqual(self._cache_status(url), "HIT")
+
+
+class TestFastJSONRenderer(TestCase):
+    """A test class for the renderers that use the C JSON encoder."""
+
+    data = {
+        "full_name": "Pokémon\u2028Kanto\u2029 </script>",
+        "numbers": [1, -0.5, 1e-10, 2.5e16, 2**64],
+        "nested": [{"approver": ["Brock", "Misty"], "is_deleted": False}],
+        "empty": None,
+    }
+
+    def test_output_matches_json_renderer(self):
+        """Make sure the output is byte for byte what DRF gives."""
+        self.assertEqual(
+            FastJSONRenderer().render(self.data), JSONRenderer().render(self.data)
+        )
+
+    def test_short_exponents_match_json_renderer(self):
+        """Make sure exponents are written with two digits, like DRF does."""
+        data = [1.5e-7, 1e-05, 1e16]
+        self.assertEqual(FastJSONRenderer().render(data), JSONRenderer().render(data))
+
+    def test_falls_back_for_unsupported_data(self):
+        """Make sure data the C encoder can't handle is still rendered."""
+        data = {"date": datetime.date(2024, 1, 31), "detail": gettext_lazy("Kanto")}
+        self.assertEqual(FastJSONRenderer().render(data), JSONRenderer().render(data))
+
+    def test_indent_is_honoured(self):
+        """Make sure indented output is asked for the way DRF supports."""
+        media_type = "application/json; indent=4"
+        self.assertEqual(
+            FastJSONRenderer().render(self.data, media_type),
+            JSONRenderer().render(self.data, media_type),
+        )
+
+    def test_json_dumps_matches_standard_library(self):
+        """Make sure the legacy documents are encoded as `json.dumps` would."""
+        self.assertEqual(
+            json_dumps(self.data), json.dumps(self.data, ensure_ascii=False)
+        )
+
+    @mock.patch("affiliations.renderers.ujson", None)
+    def test_output_is_the_same_without_ujson(self):
+        """Make sure the fallback gives the same output."""
+        self.assertEqual(
+            FastJSONRenderer().render(self.data), JSONRenderer().render(self.data)
+        )
+        self.assertEqual(
+            json_dumps(self.data), json.dumps(self.data, ensure_ascii=False)
+        )
+
+
+class TestKeysetPagination(APITestCase):
+    """A test class for paginating database_list/ with a cursor."""
+
+    @classmethod
+    def setUpTestData(cls):
+        """Seed the test database with affiliations sharing affiliation IDs."""
+        for affil_id, ep_id in (
+            (10001, None),
+            (10000, 50000),
+            (10001, 40001),
+            (10000, 40000),
+            (10002, None),
+            (10002, 50002),
+        ):
+            Affiliation.objects.create(
+                affiliation_id=affil_id,
+                expert_panel_id=ep_id,
+                full_name=f"Johto {affil_id}",
+                short_name="Johto",
+                status="ACTIVE",
+                type="VCEP",
+                clinical_domain_working_group="NONE",
+                members="Chikorita",
+            )
+
+    def setUp(self):
+        """Start every test with an empty response cache."""
+        cache.clear()
+
+    def _walk(self, url):
+        """Follow the next links from a URL, returning every page."""
+        pages = []
+        while url:
+            page = self.client.get(url).json()
+            pages.append(page)
+            url = page["next"]
+        return pages
+
+    def test_pages_cover_the_list_in_order(self):
+        """Make sure every affiliation is on exactly one page, in order."""
+        pages = self._walk("/api/database_list/?page_size=2")
+        self.assertEqual([len(page["results"]) for page in pages], [2, 2, 2])
+        ids = [
+            (affil["affiliation_id"], affil["expert_panel_id"])
+            for page in pages
+            for affil in page["results"]
+        ]
+        self.assertEqual(
+            ids,
+            [
+                (10000, 40000),
+                (10000, 50000),
+                (10001, 40001),
+                (10001, None),
+                (10002, 50002),
+                (10002, None),
+            ],
+        )
+
+    def test_list_is_unpaginated_unless_asked_for(self):
+        """Make sure clients that don't opt in still get a plain list."""
+        response = self.client.get("/api/database_list/")
+        self.assertIsInstance(response.json(), list)
+        self.assertEqual(len(response.json()), 6)
+
+    def test_deep_pages_seek_instead_of_offset(self):
+        """Make sure later pages are found by the index, not by an OFFSET."""
+        last_page_url = self._walk("/api/database_list/?page_size=1")[-2]["next"]
+        cache.clear()
+        with CaptureQueriesContext(connection) as queries:
+            self.client.get(last_page_url)
+        page_query = next(
+            query["sql"]
+            for query in queries.captured_queries
+            if 'FROM "affiliations_affiliation"' in query["sql"]
+        )
+        self.assertNotIn("OFFSET", page_query)
+        self.assertIn("> (ROW(10002, 50002, ", page_query)
+
+    def test_invalid_cursor_is_not_found(self):
+        """Make sure a cursor that can't be decoded gives a 404."""
+        for cursor in ("not-a-cursor", "WzEsMl0=", "WzEsbnVsbCwyXQ=="):
+            response = self.client.get(f"/api/database_list/?cursor={cursor}")
+            self.assertEqual(response.status_code, 404)
+
+
+class TestEagerLoading(APITestCase):
+    """A test class for fetching nested relations in a constant number of queries."""
+
+    def setUp(self):
+        """Start every test with an empty response cache."""
+        cache.clear()
+
+    def _create_affiliations(self, count):
+        """Create affiliations with two of each child, returning the last."""
+        affil = None
+        for i in range(Affiliation.objects.count(), count):
+            affil = Affiliation.objects.create(
+                affiliation_id=10000 + i,
+                expert_panel_id=40000 + i,
+                full_name=f"Unova GCEP {i}",
+                short_name="Unova",
+                status="ACTIVE",
+                type="GCEP",
+                clinical_domain_working_group="NONE",
+                members="Snivy",
+            )
+            for j in range(2):
+                Coordinator.objects.create(
+                    affiliation=affil,
+                    coordinator_name=f"Professor Juniper {j}",
+                    coordinator_email=f"juniper{j}@email.com",
+                )
+                Approver.objects.create(
+                    affiliation=affil, approver_name=f"Reshiram {j}"
+                )
+                Submitter.objects.create(affiliation=affil, clinvar_submitter_id=str(j))
+        return affil
+
+    def test_nested_relations_are_derived_from_the_serializer(self):
+        """Make sure every nested field of the serializer is prefetched."""
+        queryset = AffiliationSerializer.setup_eager_loading(Affiliation.objects.all())
+        self.assertEqual(
+            set(queryset._prefetch_related_lookups),  # pylint: disable=protected-access
+            {"coordinators", "approvers", "clinvar_submitter_ids"},
+        )
+
+    def test_list_queries_do_not_grow_with_affiliations(self):
+        """Make sure the list costs the same number of queries at any size."""
+        for count in (1, 10, 50):
+            self._create_affiliations(count)
+            cache.clear()
+            with self.subTest(count=count):
+                # The request's savepoint and its release, the data version,
+                # the affiliations and one query per kind of child.
+                with self.assertNumQueries(7):
+                    response = self.client.get("/api/database_list/")
+                self.assertEqual(len(response.json()), count)
+                cache.clear()
+                with self.assertNumQueries(7):
+                    response = self.client.get("/api/database_list/?page_size=5")
+                self.assertEqual(len(response.json()["results"]), min(count, 5))
+
+    def test_detail_queries_are_constant(self):
+        """Make sure the detail fetches its children with one query each."""
+        for count in (1, 10):
+            affil = self._create_affiliations(count)
+            cache.clear()
+            with self.subTest(count=count), self.assertNumQueries(7):
+                response = self.client.get(f"/api/database_list/{affil.pk}/")
+            self.assertEqual(len(response.json()["coordinators"]), 2)
+
+
+class TestFlatRepresentations(TestCase):
+    """A test class for the values() based representations of affiliations."""
+
+    @classmethod
+    def setUpTestData(cls):
+        """Seed the test database with affiliations of every shape."""
+        for i, (ep_id, short_name) in enumerate(
+            ((40000, "Kalos"), (None, None), (50002, "Kalos Pokémon\u2028"))
+        ):
+            affil = Affiliation.objects.create(
+                affiliation_id=10000 + i,
+                expert_panel_id=ep_id,
+                full_name=f"Kalos GCEP {i}",
+                short_name=short_name,
+                status="ACTIVE",
+                type="GCEP",
+                clinical_domain_working_group="NONE",
+                members="Chespin, Fennekin",
+                is_deleted=bool(i % 2),
+            )
+            # The first affiliation has no children, the others a few each.
+            for j in range(i * 2):
+                Coordinator.objects.create(
+                    affiliation=affil,
+                    coordinator_name=f"Professor Sycamore {j}",
+                    coordinator_email=f"sycamore{j}@email.com",
+                )
+                Approver.objects.create(affiliation=affil, approver_name=f"Xerneas {j}")
+            Submitter.objects.create(affiliation=affil, clinvar_submitter_id=str(i))
+
+    def test_matches_serializer(self):
+        """Make sure the representations are the serializer's, byte for byte."""
+        queryset = AffiliationSerializer.setup_eager_loading(
+            Affiliation.objects.order_by("pk")
+        )
+        flat = flat_representations(AffiliationSerializer, queryset)
+        serialized = AffiliationSerializer(queryset, many=True).data
+        self.assertEqual(flat, serialized)
+        self.assertEqual(
+            FastJSONRenderer().render(flat), FastJSONRenderer().render(serialized)
+        )
+
+    def test_matches_serializer_for_filtered_querysets(self):
+        """Make sure only the children of the listed affiliations are read."""
+        queryset = Affiliation.objects.filter(is_deleted=False).order_by("-pk")
+        self.assertEqual(
+            flat_representations(AffiliationSerializer, queryset),
+            AffiliationSerializer(queryset, many=True).data,
+        )
+
+    def test_list_view_matches_serializer(self):
+        """Make sure database_list/ still returns what the serializer would."""
+        response = self.client.get("/api/database_list/")
+        self.assertEqual(
+            response.content,
+            FastJSONRenderer().render(
+                AffiliationSerializer(Affiliation.objects.all(), many=True).data
+            ),
+        )
+
+    def test_unsupported_fields_are_refused(self):
+        """Make sure fields that aren't plain model fields raise an error."""
+
+        class CustomSerializer(AffiliationSerializer):
+            """Add a field computed from the affiliation."""
+
+            label = serializers.SerializerMethodField()
+
+            def get_label(self, obj):
+                """Return the string representation of the affiliation."""
+                return str(obj)
+
+            class Meta(AffiliationSerializer.Meta):
+                """Add the computed field."""
+
+                fields = AffiliationSerializer.Meta.fields + ["label"]
+
+        with self.assertRaises(ValueError):
+            flat_representations(CustomSerializer, Affiliation.objects.all())
+
+
+class TestSparseFieldsets(APITestCase):
+    """A test class for the fields and include query params."""
+
+    @classmethod
+    def setUpTestData(cls):
+        """Seed the test database with an affiliation and its children."""
+        cls.affiliation = Affiliation.objects.create(
+            affiliation_id=10000,
+            expert_panel_id=40000,
+            full_name="Alola GCEP",
+            short_name="Alola",
+            status="ACTIVE",
+            type="GCEP",
+            clinical_domain_working_group="NONE",
+            members="Rowlet, Litten, Popplio",
+        )
+        Coordinator.objects.create(
+            affiliation=cls.affiliation,
+            coordinator_name="Professor Kukui",
+            coordinator_email="kukui@email.com",
+        )
+        Approver.objects.create(affiliation=cls.affiliation, approver_name="Solgaleo")
+        Submitter.objects.create(affiliation=cls.affiliation, clinvar_submitter_id="42")
+
+    def setUp(self):
+        """Start every test with an empty response cache."""
+        cache.clear()
+
+    def test_fields_narrow_every_representation(self):
+        """Make sure only the fields asked for are returned, by every path."""
+        expected = {
+            "affiliation_id": 10000,
+            "expert_panel_id": 40000,
+            "full_name": "Alola GCEP",
+        }
+        params = "fields=affiliation_id,expert_panel_id&fields=full_name"
+        self.assertEqual(
+            self.client.get(f"/api/database_list/?{params}").json(), [expected]
+        )
+        self.assertEqual(
+            self.client.get(f"/api/database_list/?{params}&page_size=5").json()[
+                "results"
+            ],
+            [expected],
+        )
+        self.assertEqual(
+            self.client.get(
+                f"/api/database_list/{self.affiliation.pk}/?{params}"
+            ).json(),
+            expected,
+        )
+        with self.assertWarnsRegex(Warning, "asynchronous iterators"):
+            streamed = self.client.get(f"/api/database_list/?{params}&stream=true")
+            content = b"".join(streamed)
+        self.assertEqual(json.loads(content), [expected])
+
+    def test_include_picks_relations(self):
+        """Make sure relations are only returned and fetched if included."""
+        with self.assertNumQueries(5):
+            response = self.client.get(
+                "/api/database_list/?fields=full_name&include=approvers"
+            )
+        self.assertEqual(
+            response.json(),
+            [{"full_name": "Alola GCEP", "approvers": [{"approver_name": "Solgaleo"}]}],
+        )
+        response = self.client.get("/api/database_list/?include=")
+        self.assertNotIn("coordinators", response.json()[0])
+        self.assertIn("members", response.json()[0])
+
+    def test_columns_are_narrowed(self):
+        """Make sure only the columns asked for are selected."""
+        with CaptureQueriesContext(connection) as queries:
+            self.client.get(
+                f"/api/database_list/{self.affiliation.pk}/?fields=full_name"
+            )
+        affiliation_query = next(
+            query["sql"]
+            for query in queries.captured_queries
+            if 'FROM "affiliations_affiliation"' in query["sql"]
+        )
+        self.assertIn('"affiliations_affiliation"."full_name"', affiliation_query)
+        self.assertNotIn('"affiliations_affiliation"."members"', affiliation_query)
+
+    def test_unknown_names_are_rejected(self):
+        """Make sure unknown field or relation names give a 400."""
+        for params in ("fields=nickname", "include=full_name", "fields=approvers"):
+            response = self.client.get(f"/api/database_list/?{params}")
+            self.assertEqual(response.status_code, 400)
+        self.assertIn(
+            "nickname",
+            self.client.get("/api/database_list/?fields=nickname").json()["fields"][0],
+        )
+
+
+class TestAffiliationFilters(APITestCase):
+    """A test class for filtering database_list/ with query params."""
+
+    @classmethod
+    def setUpTestData(cls):
+        """Seed the test database with affiliations of different kinds."""
+        for affil_id, ep_id, status, affil_type, cdwg, is_deleted in (
+            (10000, 50000, "ACTIVE", "VCEP", "CARDIOVASCULAR", False),
+            (10000, 40000, "ACTIVE", "GCEP", "CARDIOVASCULAR", False),
+            (10001, 50001, "RETIRED", "VCEP", "OCULAR", False),
+            (10002, None, "ACTIVE", "INDEPENDENT_CURATION", "NONE", False),
+            (10003, 50003, "ACTIVE", "VCEP", "OCULAR", True),
+        ):
+            Affiliation.objects.create(
+                affiliation_id=affil_id,
+                expert_panel_id=ep_id,
+                full_name=f"Galar {affil_type}",
+                short_name="Galar",
+                status=status,
+                type=affil_type,
+                clinical_domain_working_group=cdwg,
+                members="Grookey",
+                is_deleted=is_deleted,
+            )
+
+    def setUp(self):
+        """Start every test with an empty response cache."""
+        cache.clear()
+
+    def _ids(self, params):
+        """Return the affiliation and expert panel IDs a filter returns."""
+        response = self.client.get(f"/api/database_list/?{params}")
+        self.assertEqual(response.status_code, 200)
+        return sorted(
+            (affil["affiliation_id"], affil["expert_panel_id"] or 0)
+            for affil in response.json()
+        )
+
+    def test_choice_filters(self):
+        """Make sure status, type and CDWG match any of the values passed."""
+        self.assertEqual(
+            self._ids("status=ACTIVE&type=VCEP&is_deleted=false"), [(10000, 50000)]
+        )
+        self.assertEqual(
+            self._ids("type=GCEP,INDEPENDENT_CURATION"),
+            [(10000, 40000), (10002, 0)],
+        )
+        self.assertEqual(
+            self._ids("clinical_domain_working_group=OCULAR&is_deleted=true"),
+            [(10003, 50003)],
+        )
+
+    def test_range_filters(self):
+        """Make sure ID ranges are inclusive and can be combined."""
+        self.assertEqual(
+            self._ids("affiliation_id_min=10001&affiliation_id_max=10002"),
+            [(10001, 50001), (10002, 0)],
+        )
+        self.assertEqual(self._ids("expert_panel_id_min=50001"), [(10001, 50001)])
+        self.assertEqual(
+            self._ids("expert_panel_id_min=50001&is_deleted=true"), [(10003, 50003)]
+        )
+
+    def test_filters_apply_to_pages(self):
+        """Make sure paginated lists are filtered too."""
+        response = self.client.get("/api/database_list/?type=VCEP&page_size=10")
+        self.assertEqual(len(response.json()["results"]), 2)
+
+    def test_invalid_values_are_rejected(self):
+        """Make sure values outside the choices or of the wrong type give a 400."""
+        for params in (
+            "status=Active",
+            "type=VCEP,Cool",
+            "is_deleted=maybe",
+            "affiliation_id_min=ten",
+        ):
+            response = self.client.get(f"/api/database_list/?{params}")
+            self.assertEqual(response.status_code, 400, params)
+            self.assertIn(params.split("=", maxsplit=1)[0], response.json())
+
+
+class TestChangeLog(APITestCase):
+    """A test class for the change log and the changes/ endpoint."""
+
+    def setUp(self):
+        """Create an affiliation and a key to read the changes with."""
+        cache.clear()
+        self.affiliation = Affiliation.objects.create(
+            affiliation_id=10000,
+            expert_panel_id=50000,
+            full_name="Kalos VCEP",
+            short_name="Kalos",
+            status="ACTIVE",
+            type="VCEP",
+            clinical_domain_working_group="NONE",
+            members="Froakie",
+        )
+        _, key = APIKey.objects.create_key(name="my-remote-service")
+        self.auth_headers = {"HTTP_X_API_KEY": key}
+
+    def _changes(self, params=""):
+        """Return the JSON the changes/ endpoint returns for some params."""
+        response = self.client.get(f"/api/changes/?{params}", **self.auth_headers)
+        self.assertEqual(response.status_code, 200)
+        return response.json()
+
+    def test_writes_are_logged_in_order(self):
+        """Make sure each write is logged, with increasing sequences."""
+        start = self._changes()["next_since"]
+        self.affiliation.short_name = "Kalos!"
+        self.affiliation.save()
+        Coordinator.objects.create(
+            affiliation=self.affiliation,
+            coordinator_name="Sycamore",
+            coordinator_email="sycamore@example.com",
+        )
+        self.affiliation.is_deleted = True
+        self.affiliation.save()
+        changes = self._changes(f"since={start}")
+        self.assertEqual(
+            [(change["model"], change["action"]) for change in changes["changes"]],
+            [
+                ("affiliation", "UPDATED"),
+                ("coordinator", "CREATED"),
+                ("affiliation", "DELETED"),
+            ],
+        )
+        sequences = [change["sequence"] for change in changes["changes"]]
+        self.assertEqual(sequences, sorted(set(sequences)))
+        self.assertEqual(changes["next_since"], sequences[-1])
+        self.assertFalse(changes["has_more"])
+        self.assertEqual(self._changes(f"since={sequences[-1]}")["changes"], [])
+        self.assertEqual(
+            ChangeLogEntry.objects.filter(sequence__lte=start).get().action,
+            "CREATED",
+        )
+
+    def test_one_write_is_never_split(self):
+        """Make sure the entries of one sequence are listed together."""
+        other = Affiliation.objects.create(
+            affiliation_id=10001,
+            full_name="Alola",
+            short_name="Alola",
+            status="ACTIVE",
+            type="INDEPENDENT_CURATION",
+            clinical_domain_working_group="NONE",
+            members="Rowlet",
+        )
+        start = self._changes()["next_since"]
+        notify_affiliations_changed([self.affiliation.pk, other.pk])
+        self.affiliation.save()
+        changes = self._changes(f"since={start}&limit=1")
+        self.assertEqual(
+            sorted(change["affiliation_id"] for change in changes["changes"]),
+            [10000, 10001],
+        )
+        self.assertTrue(changes["has_more"])
+        changes = self._changes(f"since={changes['next_since']}&limit=1")
+        self.assertEqual(len(changes["changes"]), 1)
+        self.assertFalse(changes["has_more"])
+
+    def test_prune_change_log(self):
+        """Make sure old entries are compacted, then expired."""
+        for name in ("Kalos 1", "Kalos 2"):
+            self.affiliation.full_name = name
+            self.affiliation.save()
+        newest = ChangeLogEntry.objects.latest("sequence")
+        now = datetime.datetime.now(datetime.timezone.utc)
+        ChangeLogEntry.objects.update(changed_at=now - datetime.timedelta(days=10))
+        with override_settings(
+            CHANGE_LOG_COMPACT_AFTER_DAYS=7, CHANGE_LOG_RETENTION_DAYS=None
+        ):
+            self.assertEqual(prune_change_log(now), (2, 0))
+        self.assertEqual(list(ChangeLogEntry.objects.all()), [newest])
+        self.assertEqual(self._changes("since=0")["changes"][0]["action"], "UPDATED")
+
+        with override_settings(
+            CHANGE_LOG_COMPACT_AFTER_DAYS=None, CHANGE_LOG_RETENTION_DAYS=7
+        ):
+            call_command("prune_change_log", stdout=StringIO())
+        self.assertFalse(ChangeLogEntry.objects.exists())
+        response = self.client.get(
+            f"/api/changes/?since={newest.sequence - 1}", **self.auth_headers
+        )
+        self.assertEqual(response.status_code, 410)
+        self.assertEqual(self._changes(f"since={newest.sequence}")["changes"], [])
+
+    def test_limit_must_be_positive(self):
+        """Make sure a `limit` below one is rejected, rather than replaced by
+        the default page size.
+        """
+        for limit in ("0", "-1", "x"):
+            response = self.client.get(
+                f"/api/changes/?since=0&limit={limit}", **self.auth_headers
+            )
+            self.assertEqual(response.status_code, 400, limit)
+            self.assertIn("limit", response.json())
+
+    def test_changes_need_credentials(self):
+        """Make sure anonymous clients can't read the changes."""
+        self.assertEqual(self.client.get("/api/changes/?since=0").status_code, 403)
+
+
+class TestAffiliationEvents(APITestCase):
+    """A test class for the events/ server-sent events stream."""
+
+    def setUp(self):
+        """Create an affiliation and a key to open streams with."""
+        cache.clear()
+        self.affiliation = Affiliation.objects.create(
+            affiliation_id=10000,
+            expert_panel_id=50000,
+            full_name="Paldea VCEP",
+            short_name="Paldea",
+            status="ACTIVE",
+            type="VCEP",
+            clinical_domain_working_group="NONE",
+            members="Sprigatito",
+        )
+        _, key = APIKey.objects.create_key(name="my-remote-service")
+        self.headers = {"X-Api-Key": key}
+
+    def _save(self, affiliation, **values):
+        """Save an affiliation and run what waits for the commit."""
+        with self.captureOnCommitCallbacks(execute=True):
+            for name, value in values.items():
+                setattr(affiliation, name, value)
+            affiliation.save()
+
+    async def _open(self, params="", **headers):
+        """Open a stream and return its chunks, after the retry line."""
+        response = await self.async_client.get(
+            f"/api/events/?{params}", headers={**self.headers, **headers}
+        )
+        self.assertEqual(response["Content-Type"], "text/event-stream")
+        stream = response.streaming_content
+        self.assertEqual(await anext(stream), b"retry: 3000\n\n")
+        return stream
+
+    async def _disconnect(self, stream):
+        """Cancel a stream's pending read, as Daphne does when a client leaves."""
+        pending = asyncio.ensure_future(anext(stream))
+        await asyncio.sleep(0)
+        pending.cancel()
+        await asyncio.gather(pending, return_exceptions=True)
+
+    async def _next_event(self, stream) -> tuple[dict, dict]:
+        """Return the fields and data of the next event of a stream."""
+        chunk = await asyncio.wait_for(anext(stream), 5)
+        fields = dict(
+            line.split(": ", maxsplit=1) for line in chunk.decode().strip().split("\n")
+        )
+        return fields, json.loads(fields["data"])
+
+    async def test_changes_are_pushed(self):
+        """Make sure subscribers only get the changes to the IDs they asked for."""
+        other = await Affiliation.objects.acreate(
+            affiliation_id=10001,
+            full_name="Kitakami",
+            short_name="Kitakami",
+            status="ACTIVE",
+            type="INDEPENDENT_CURATION",
+            clinical_domain_working_group="NONE",
+            members="Ogerpon",
+        )
+        stream = await self._open("ep_id=50000")
+        next_event = asyncio.ensure_future(self._next_event(stream))
+        while not get_broker().subscriber_count:
+            await asyncio.sleep(0)
+        await sync_to_async(self._save)(other, members="Okidogi")
+        await sync_to_async(self._save)(self.affiliation, members="Fuecoco")
+        fields, data = await next_event
+        self.assertEqual(fields["event"], "changes")
+        self.assertEqual(int(fields["id"]), data["sequence"])
+        self.assertEqual(
+            [
+                (change["affiliation_id"], change["action"])
+                for change in data["changes"]
+            ],
+            [(10000, "UPDATED")],
+        )
+        await self._disconnect(stream)
+        self.assertEqual(get_broker().subscriber_count, 0)
+
+    async def test_resume_from_last_event_id(self):
+        """Make sure a resumed stream replays the changes it missed, or tells the
+        client to start again if they were pruned.
+        """
+        await sync_to_async(self._save)(self.affiliation, members="Quaxly")
+        seen = await ChangeLogEntry.objects.alatest("sequence")
+        await sync_to_async(self._save)(self.affiliation, is_deleted=True)
+        stream = await self._open(**{"Last-Event-ID": str(seen.sequence)})
+        _, data = await self._next_event(stream)
+        self.assertEqual(data["sequence"], seen.sequence + 1)
+        self.assertEqual(data["changes"][0]["action"], "DELETED")
+        await self._disconnect(stream)
+
+        await DataVersion.objects.filter(pk=DATA_VERSION_PK).aupdate(
+            changes_pruned_through=seen.sequence + 1
+        )
+        stream = await self._open(f"last_event_id={seen.sequence}")
+        fields, _ = await self._next_event(stream)
+        self.assertEqual(fields["event"], "reset")
+        await self._disconnect(stream)
+
+    @override_settings(EVENTS_HEARTBEAT_SECONDS=0.01)
+    async def test_idle_streams_get_heartbeats(self):
+        """Make sure a comment is sent when there are no events."""
+        stream = await self._open()
+        self.assertEqual(await anext(stream), b": heartbeat\n\n")
+        await self._disconnect(stream)
+
+    @override_settings(EVENTS_QUEUE_SIZE=2)
+    async def test_slow_subscribers_are_dropped(self):
+        """Make sure a subscriber that falls behind is ended, not buffered."""
+        broker = LocalBroker()
+        async with broker.subscribe() as subscription:
+            for sequence in range(3):
+                broker.publish({"sequence": sequence, "changes": []})
+            await asyncio.sleep(0)
+            self.assertIsNone(await subscription.get(1))
+
+    async def test_redis_broker_relays_between_processes(self):
+        """Make sure a message one process's Redis broker publishes reaches the
+        subscribers of another process, with a fake Redis server.
+        """
+        server = fakeredis.FakeServer()
+        message = {"sequence": 1, "changes": []}
+        with (
+            mock.patch(
+                "redis.Redis.from_url", return_value=fakeredis.FakeRedis(server=server)
+            ),
+            mock.patch(
+                "redis.asyncio.Redis.from_url",
+                return_value=fakeredis.FakeAsyncRedis(server=server),
+            ),
+        ):
+            publisher = RedisBroker("redis://127.0.0.1:6379")
+            subscriber = RedisBroker("redis://127.0.0.1:6379")
+            async with subscriber.subscribe() as subscription:
+                redis_client = fakeredis.FakeRedis(server=server)
+                while not redis_client.pubsub_numsub(EVENTS_CHANNEL)[0][1]:
+                    await asyncio.sleep(0.01)
+                publisher.publish(message)
+                self.assertEqual(await subscription.get(5), message)
+                self.assertEqual(publisher.subscriber_count, 0)
+            # pylint: disable-next=protected-access
+            subscriber._listener.cancel()
+
+    def test_events_need_valid_params(self):
+        """Make sure streams need credentials and integer IDs."""
+        self.assertEqual(self.client.get("/api/events/").status_code, 403)
+        response = self.client.get(
+            "/api/events/", headers={**self.headers, "Last-Event-ID": "latest"}
+        )
+        self.assertEqual(response.status_code, 400)
+
+
+class TestBulkUpsert(APITestCase):
+    """A test class for creating and updating affiliations in bulk."""
+
+    def setUp(self):
+        """Create an affiliation with children, and log in."""
+        cache.clear()
+        self.client.force_login(User.objects.create_user("galar", password="pw"))
+        self.stored = {
+            "affiliation_id": 10000,
+            "expert_panel_id": 50000,
+            "full_name": "Galar VCEP",
+            "short_name": "Galar",
+            "status": "ACTIVE",
+            "type": "VCEP",
+            "clinical_domain_working_group": "NONE",
+            "members": "Scorbunny",
+            "is_deleted": False,
+            "coordinators": [
+                {"coordinator_name": "Magnolia", "coordinator_email": "m@example.com"}
+            ],
+            "approvers": [{"approver_name": "Leon"}],
+            "clinvar_submitter_ids": [],
+        }
+        response = self.client.post("/api/database_list/", self.stored, format="json")
+        self.assertEqual(response.status_code, 201)
+
+    def _upsert(self, items):
+        """Post affiliations to the bulk endpoint and return the response."""
+        return self.client.post("/api/database_list/bulk/", items, format="json")
+
+    def test_creates_and_updates(self):
+        """Make sure stored affiliations are updated, new ones created, and the
+        whole call is one change.
+        """
+        version = DataVersion.objects.get().version
+        items = [
+            {
+                **self.stored,
+                "members": "Cinderace",
+                "approvers": [{"approver_name": "Leon"}, {"approver_name": "Hop"}],
+            },
+            {
+                **self.stored,
+                "expert_panel_id": 40000,
+                "type": "GCEP",
+                "coordinators": [],
+                "clinvar_submitter_ids": [{"clinvar_submitter_id": "8"}],
+            },
+        ]
+        response = self._upsert(items)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json(), {"created": 1, "updated": 1})
+        self.assertEqual(DataVersion.objects.get().version, version + 1)
+        listed = sorted(
+            self.client.get("/api/database_list/").json(),
+            key=lambda affil: affil["expert_panel_id"],
+        )
+        self.assertEqual(
+            listed, sorted(items, key=lambda affil: affil["expert_panel_id"])
+        )
+        self.assertIn("Hop", LegacySnapshot.objects.get(affiliation_id=10000).document)
+
+    def test_unchanged_affiliations_are_not_written(self):
+        """Make sure posting stored data again writes nothing."""
+        version = DataVersion.objects.get().version
+        with CaptureQueriesContext(connection) as queries:
+            response = self._upsert([self.stored])
+        self.assertEqual(response.json(), {"created": 0, "updated": 0})
+        self.assertEqual(DataVersion.objects.get().version, version)
+        writes = [
+            query["sql"]
+            for query in queries.captured_queries
+            if query["sql"].startswith(("INSERT", "UPDATE", "DELETE"))
+        ]
+        self.assertEqual(writes, [])
+
+    def test_errors_are_reported_per_item(self):
+        """Make sure every invalid item is reported, and nothing is written."""
+        valid = {**self.stored, "affiliation_id": 10001}
+        response = self._upsert(
+            [
+                valid,
+                {**self.stored, "affiliation_id": None},
+                {**self.stored, "affiliation_id": 10002, "status": "Cool"},
+                valid,
+            ]
+        )
+        self.assertEqual(response.status_code, 400)
+        errors = response.json()["errors"]
+        self.assertEqual([error["index"] for error in errors], [1, 2, 3])
+        self.assertIn("status", errors[1]["errors"])
+        self.assertIn("non_field_errors", errors[2]["errors"])
+        self.assertFalse(Affiliation.objects.filter(affiliation_id=10001).exists())
+
+    def test_bulk_upsert_needs_login(self):
+        """Make sure anonymous clients can't write."""
+        self.client.logout()
+        self.assertEqual(self._upsert([self.stored]).status_code, 403)
+
+
+class TestNestedUpdate(APITestCase):
+    """A test class for updating an affiliation and its children in place."""
+
+    DATA_TABLES = ("affiliation", "coordinator", "approver", "submitter")
+
+    def setUp(self):
+        """Create an affiliation with many children, and log in."""
+        cache.clear()
+        self.client.force_login(User.objects.create_user("hisui", password="pw"))
+        self.stored = {
+            "affiliation_id": 10000,
+            "expert_panel_id": 50000,
+            "full_name": "Hisui VCEP",
+            "short_name": "Hisui",
+            "status": "ACTIVE",
+            "type": "VCEP",
+            "clinical_domain_working_group": "NONE",
+            "members": "Rowlet",
+            "is_deleted": False,
+            "coordinators": [
+                {"coordinator_name": "Laventon", "coordinator_email": "l@example.com"}
+            ],
+            "approvers": [{"approver_name": "Kamado"}, {"approver_name": "Cyllene"}],
+            "clinvar_submitter_ids": [
+                {"clinvar_submitter_id": str(number)} for number in range(60)
+            ],
+        }
+        response = self.client.post("/api/database_list/", self.stored, format="json")
+        self.assertEqual(response.status_code, 201)
+        self.url = f"/api/database_list/{Affiliation.objects.get().pk}/"
+
+    def _writes(self, method, data) -> list[str]:
+        """Send an update and return the writes it made to the data tables.
+
+        Children have no order, so only their contents are compared.
+        """
+        with CaptureQueriesContext(connection) as queries:
+            response = method(self.url, data, format="json")
+        self.assertEqual(response.status_code, 200)
+        # Read the queries before the next request clears them.
+        writes = []
+        for query in queries.captured_queries:
+            match = re.match(r'(INSERT INTO|UPDATE|DELETE FROM) "(\w+)"', query["sql"])
+            if match and match[2].removeprefix("affiliations_") in self.DATA_TABLES:
+                writes.append(f"{match[1]} {match[2]}")
+        stored = self.client.get(self.url).json()
+        for name, value in {**self.stored, **data}.items():
+            if isinstance(value, list):
+                self.assertCountEqual(stored[name], value)
+            else:
+                self.assertEqual(stored[name], value)
+        return writes
+
+    def test_unchanged_update_writes_nothing(self):
+        """Make sure a PUT of the stored data writes nothing, not even the log."""
+        version = DataVersion.objects.get().version
+        self.assertEqual(self._writes(self.client.put, self.stored), [])
+        self.assertEqual(DataVersion.objects.get().version, version)
+
+    def test_small_edit(self):
+        """Make sure a small edit only writes the rows it touches."""
+        data = {
+            "coordinators": [
+                {"coordinator_name": "Laventon", "coordinator_email": "p@example.com"}
+            ],
+            "approvers": [{"approver_name": "Kamado"}],
+        }
+        self.assertCountEqual(
+            self._writes(self.client.patch, data),
+            ["UPDATE affiliations_coordinator", "DELETE FROM affiliations_approver"],
+        )
+
+    def test_patch_leaves_children_alone(self):
+        """Make sure a PATCH without children only writes the affiliation."""
+        self.assertEqual(
+            self._writes(self.client.patch, {"status": "INACTIVE"}),
+            ["UPDATE affiliations_affiliation"],
+        )
+
+    def test_large_edit(self):
+        """Make sure a large edit writes each table once, in bulk."""
+        data = {
+            **self.stored,
+            "full_name": "Hisui Expert Panel",
+            "clinvar_submitter_ids": [
+                {"clinvar_submitter_id": str(number)} for number in range(30, 130)
+            ],
+        }
+        self.assertCountEqual(
+            self._writes(self.client.put, data),
+            [
+                "UPDATE affiliations_affiliation",
+                "UPDATE affiliations_submitter",
+                "INSERT INTO affiliations_submitter",
+            ],
+        )
+
+
+class TestAffiliationIds(APITestCase):
+    """A test class for the indexes and unique constraints on the IDs."""
+
+    def setUp(self):
+        """Create affiliations with and without expert panel IDs."""
+        for number in range(30):
+            Affiliation.objects.create(
+                affiliation_id=10000 + number,
+                expert_panel_id=50000 + number if number % 3 else None,
+                full_name=f"Paldea {number}",
+                status="ACTIVE",
+                type="VCEP",
+                clinical_domain_working_group="NONE",
+                members="Sprigatito",
+                is_deleted=number == 2,
+            )
+
+    def _assert_uses_index(self, queryset, index_name):
+        """Make sure a query can be answered from an index.
+
+        The tables are too small for PostgreSQL to choose an index by itself,
+        so sequential scans are ruled out first.
+        """
+        if connection.vendor == "postgresql":
+            with connection.cursor() as cursor:
+                cursor.execute("SET LOCAL enable_seqscan = off")
+        self.assertIn(index_name, queryset.explain())
+
+    def test_hot_queries_use_indexes(self):
+        """Make sure the lookups by ID use the indexes meant for them."""
+        live = Affiliation.objects.filter(is_deleted=False)
+        self._assert_uses_index(
+            live.filter(affiliation_id__in=[10001, 10002]),
+            "affiliation_live_keyset_idx",
+        )
+        self._assert_uses_index(
+            live.filter(expert_panel_id__in=[50001]).values_list(
+                "expert_panel_id", "affiliation_id"
+            ),
+            "affiliation_live_ep_id_idx",
+        )
+        self._assert_uses_index(
+            Affiliation.all_with_deleted.filter(
+                affiliation_id=10001, expert_panel_id=50001
+            ),
+            "affiliation_ids_unique",
+        )
+        self._assert_uses_index(
+            Affiliation.all_with_deleted.filter(
+                affiliation_id=10000, expert_panel_id=None
+            ),
+            "affiliation_id_without_ep_unique",
+        )
+
+    def test_database_rejects_duplicates(self):
+        """Make sure two affiliations can't share their IDs, even without an
+        expert panel ID.
+        """
+        for affiliation_id, expert_panel_id in ((10001, 50001), (10000, None)):
+            with self.assertRaises(IntegrityError), transaction.atomic():
+                Affiliation.objects.create(
+                    affiliation_id=affiliation_id,
+                    expert_panel_id=expert_panel_id,
+                    full_name="Copy",
+                    status="ACTIVE",
+                    type="VCEP",
+                    clinical_domain_working_group="NONE",
+                    members="Fuecoco",
+                )
+        # Other pairings of the same IDs are allowed.
+        Affiliation.objects.create(
+            affiliation_id=10000,
+            expert_panel_id=40000,
+            full_name="Paldea GCEP",
+            status="ACTIVE",
+            type="GCEP",
+            clinical_domain_working_group="NONE",
+            members="Quaxly",
+        )
+
+    def test_api_rejects_duplicates(self):
+        """Make sure database_list/ answers duplicate IDs with a 400."""
+        self.client.force_login(User.objects.create_user("nemona", password="pw"))
+        data = {
+            "affiliation_id": 10000,
+            "expert_panel_id": None,
+            "full_name": "Copy",
+            "status": "ACTIVE",
+            "type": "INDEPENDENT_CURATION",
+            "clinical_domain_working_group": "NONE",
+            "members": "Koraidon",
+            "coordinators": [],
+            "approvers": [],
+            "clinvar_submitter_ids": [],
+        }
+        response = self.client.post("/api/database_list/", data, format="json")
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(response.json(), {"non_field_errors": [DUPLICATE_IDS_MESSAGE]})
+        pk = Affiliation.objects.get(affiliation_id=10001).pk
+        response = self.client.patch(
+            f"/api/database_list/{pk}/",
+            {"affiliation_id": 10002, "expert_panel_id": 50002},
+            format="json",
+        )
+        self.assertEqual(response.status_code, 400)
+        response = self.client.patch(
+            f"/api/database_list/{pk}/", {"full_name": "Paldea One"}, format="json"
+        )
+        self.assertEqual(response.status_code, 200)
+
+
+class TestSoftDelete(APITestCase):
+    """A test class for hiding soft-deleted affiliations and their children."""
+
+    def setUp(self):
+        """Create a live and a soft-deleted affiliation, each with a coordinator."""
+        cache.clear()
+        self.live, self.deleted = (
+            Affiliation.objects.create(
+                affiliation_id=affil_id,
+                expert_panel_id=None,
+                full_name=f"Kitakami {affil_id}",
+                status="ACTIVE",
+                type="INDEPENDENT_CURATION",
+                clinical_domain_working_group="NONE",
+                members="Ogerpon",
+            )
+            for affil_id in (10000, 10001)
+        )
+        for affiliation in (self.live, self.deleted):
+            Coordinator.objects.create(
+                affiliation=affiliation,
+                coordinator_name="Carmine",
+                coordinator_email="carmine@example.com",
+            )
+        self.deleted.delete()
+
+    def test_managers(self):
+        """Make sure `objects` hides deleted affiliations and their children,
+        and `all_with_deleted` doesn't.
+        """
+        self.assertEqual(list(Affiliation.objects.all()), [self.live])
+        self.assertEqual(Affiliation.all_with_deleted.count(), 2)
+        self.assertEqual(
+            list(Coordinator.objects.values_list("affiliation", flat=True)),
+            [self.live.pk],
+        )
+        self.assertEqual(Coordinator.all_with_deleted.count(), 2)
+        self.assertEqual(self.deleted.coordinators.count(), 1)
+
+    def test_api_hides_deleted(self):
+        """Make sure deleted affiliations are only listed when asked for."""
+        response = self.client.get("/api/database_list/")
+        self.assertEqual(
+            [affil["affiliation_id"] for affil in response.json()], [10000]
+        )
+        response = self.client.get("/api/database_list/?is_deleted=true")
+        self.assertEqual(
+            [affil["affiliation_id"] for affil in response.json()], [10001]
+        )
+        response = self.client.get(f"/api/database_list/{self.deleted.pk}/")
+        self.assertEqual(response.status_code, 404)
+
+    def test_live_list_uses_partial_index(self):
+        """Make sure listing live affiliations reads the partial keyset index."""
+        with connection.cursor() as cursor:
+            cursor.execute("SET LOCAL enable_seqscan = off")
+        plan = Affiliation.objects.order_by(*KEYSET_ORDERING).explain()
+        self.assertIn("affiliation_live_keyset_idx", plan)
+
+    def test_bulk_upsert_restores_deleted(self):
+        """Make sure a bulk upsert finds deleted affiliations, to restore them."""
+        self.client.force_login(User.objects.create_user("kieran", password="pw"))
+        data = AffiliationSerializer(self.deleted).data
+        data["is_deleted"] = False
+        response = self.client.post("/api/database_list/bulk/", [data], format="json")
+        self.assertEqual(response.json(), {"created": 0, "updated": 1})
+        self.assertEqual(Affiliation.objects.count(), 2)
+
+
+class TestAffiliationIdAllocator(TransactionTestCase):
+    """A test class for allocating the IDs of new affiliations."""
+
+    def _create(self, affil_type="VCEP") -> Affiliation:
+        """Create an affiliation through the admin form, in a transaction."""
+        form = AffiliationForm(
+            data={
+                "type": affil_type,
+                "full_name": "Unova",
+                "status": "APPLYING",
+                "clinical_domain_working_group": "OTHER",
+                "members": "Snivy",
+            }
+        )
+        with transaction.atomic():
+            self.assertTrue(form.is_valid(), form.errors)
+            return form.save()
+
+    def test_ids_follow_the_highest_in_use(self):
+        """Make sure allocated IDs skip those saved by other means, and expert
+        panel IDs are derived by type.
+        """
+        self.assertEqual(self._create().affiliation_id, 10000)
+        Affiliation.objects.create(
+            affiliation_id=10500,
+            full_name="Imported",
+            status="ACTIVE",
+            type="INDEPENDENT_CURATION",
+            clinical_domain_working_group="NONE",
+            members="Tepig",
+        )
+        created = [self._create(affil_type) for affil_type in ("GCEP", "SC_VCEP")]
+        created.append(self._create("INDEPENDENT_CURATION"))
+        self.assertEqual(
+            [(affil.affiliation_id, affil.expert_panel_id) for affil in created],
+            [(10501, 40501), (10502, 50502), (10503, None)],
+        )
+        self.assertEqual(expert_panel_id_for(19999, "VCEP"), 59999)
+
+    def test_parallel_creations_get_distinct_ids(self):
+        """Make sure affiliations created at once never share an ID."""
+
+        def create_some(count):
+            try:
+                return [self._create().affiliation_id for _ in range(count)]
+            finally:
+                connection.close()
+
+        with ThreadPoolExecutor(max_workers=8) as executor:
+            batches = list(executor.map(create_some, [5] * 8))
+        ids = sorted(affil_id for batch in batches for affil_id in batch)
+        self.assertEqual(ids, list(range(10000, 10040)))
+        self.assertEqual(Affiliation.objects.count(), 40)
+
+    @override_settings(
+        STORAGES={
+            **settings.STORAGES,
+            "staticfiles": {
+                "BACKEND": "django.contrib.staticfiles.storage.StaticFilesStorage"
+            },
+        }
+    )
+    def test_invalid_admin_submissions_keep_ids_free(self):
+        """Make sure the admin only takes an ID once the affiliation and its
+        inlines are valid, so the IDs of saved affiliations stay consecutive.
+        """
+        self.client.force_login(User.objects.create_superuser("cheren", password="pw"))
+        data = {
+            "type": "VCEP",
+            "full_name": "Unova",
+            "status": "APPLYING",
+            "clinical_domain_working_group": "OTHER",
+        }
+        for prefix in ("coordinators", "approvers", "clinvar_submitter_ids"):
+            data[f"{prefix}-TOTAL_FORMS"] = "0"
+            data[f"{prefix}-INITIAL_FORMS"] = "0"
+        invalid_inline = {
+            **data,
+            "coordinators-TOTAL_FORMS": "1",
+            "coordinators-0-coordinator_name": "Bianca",
+            "coordinators-0-coordinator_email": "not an email",
+        }
+        url = "/admin/affiliations/affiliation/add/"
+        for submission in (data, {**data, "full_name": ""}, invalid_inline, data):
+            self.client.post(url, submission)
+        self.assertEqual(
+            list(
+                Affiliation.objects.order_by("pk").values_list(
+                    "affiliation_id", "expert_panel_id"
+                )
+            ),
+            [(10000, 50000), (10001, 50001)],
+        )
+
+    def test_allocation_does_not_lock_affiliations(self):
+        """Make sure allocating only reads the affiliations, so creations don't
+        wait on each other's locks there.
+        """
+        with transaction.atomic():
+            allocate_affiliation_id()
+            with connection.cursor() as cursor:
+                cursor.execute(
+                    "SELECT mode FROM pg_locks WHERE pid = pg_backend_pid()"
+                    " AND relation = 'affiliations_affiliation'::regclass"
+                )
+                modes = {mode for (mode,) in cursor.fetchall()}
+        self.assertEqual(modes, {"AccessShareLock"})
+
+
+# The admin pages link static files, which the manifest storage can only find
+# once they have been collected.
+@override_settings(
+    STORAGES={
+        **settings.STORAGES,
+        "staticfiles": {
+            "BACKEND": "django.contrib.staticfiles.storage.StaticFilesStorage"
+        },
+    }
+)
+class TestAdminChangelist(TestCase):
+    """A test class for the affiliations changelist in the admin."""
+
+    URL = "/admin/affiliations/affiliation/"
+
+    def setUp(self):
+        """Log in as a superuser."""
+        self.client.force_login(User.objects.create_superuser("cynthia", password="pw"))
+
+    def _create(self, count):
+        """Create affiliations with two coordinators each."""
+        start = Affiliation.all_with_deleted.count()
+        affiliations = Affiliation.objects.bulk_create(
+            Affiliation(
+                affiliation_id=10000 + start + number,
+                full_name=f"Sinnoh {start + number}",
+                status="ACTIVE",
+                type="INDEPENDENT_CURATION",
+                clinical_domain_working_group="NONE",
+                members="Piplup",
+            )
+            for number in range(count)
+        )
+        Coordinator.objects.bulk_create(
+            Coordinator(
+                affiliation=affiliation,
+                coordinator_name=f"{letter} {affiliation.affiliation_id}",
+                coordinator_email=f"{letter}{affiliation.affiliation_id}@example.com",
+            )
+            for affiliation in affiliations
+            for letter in ("Z", "A")
+        )
+        notify_affiliations_changed(affiliation.pk for affiliation in affiliations)
+
+    def _queries(self, params="") -> int:
+        """Load the changelist, returning how many queries it took."""
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(f"{self.URL}?{params}")
+        self.assertEqual(response.status_code, 200)
+        return len(queries)
+
+    def test_query_count_does_not_grow_with_rows(self):
+        """Make sure pages of 100 and more rows take as many queries as a
+        page of a few.
+        """
+        self._create(5)
+        few = self._queries()
+        self._create(145)
+        self.assertEqual(self._queries(), few)
+        self.assertEqual(self._queries("all="), few)
+
+    def test_coordinator_columns(self):
+        """Make sure the coordinator columns list every coordinator, and sort
+        by the first of them.
+        """
+        self._create(3)
+        Coordinator.objects.filter(coordinator_name="A 10001").update(
+            coordinator_name="0 10001"
+        )
+        # The coordinator names are the eighth column.
+        response = self.client.get(f"{self.URL}?o=8")
+        affiliations = list(response.context["cl"].result_list)
+        self.assertEqual(
+            [affiliation.affiliation_id for affiliation in affiliations],
+            [10001, 10000, 10002],
+        )
+        admin_site = response.context["cl"].model_admin
+        self.assertEqual(
+            admin_site.get_coordinator_emails(affiliations[0]),
+            ["Z10001@example.com", "A10001@example.com"],
+        )
+
+    def test_coordinators_only_joined_to_sort(self):
+        """Make sure only the queries sorting by a coordinator column look up
+        the first coordinators, and none of them group the affiliations.
+        """
+        self._create(3)
+        for url, sorts in (
+            (self.URL, False),
+            (f"{self.URL}?o=9", True),
+            (f"{self.URL}{Affiliation.objects.first().pk}/change/", False),
+        ):
+            with CaptureQueriesContext(connection) as queries:
+                response = self.client.get(url)
+            self.assertEqual(response.status_code, 200)
+            affiliation_queries = [
+                query["sql"]
+                for query in queries.captured_queries
+                if query["sql"].startswith("SELECT")
+                and 'FROM "affiliations_affiliation"' in query["sql"]
+            ]
+            self.assertTrue(affiliation_queries)
+            for sql in affiliation_queries:
+                self.assertNotIn("GROUP BY", sql)
+            self.assertEqual(
+                any("affiliations_coordinator" in sql for sql in affiliation_queries),
+                sorts,
+            )
+
+    def test_search(self):
+        """Make sure searching lists each match once, whichever of its
+        coordinators matched.
+        """
+        self._create(3)
+        response = self.client.get(f"{self.URL}?q=a10001")
+        self.assertEqual(
+            [
+                affiliation.affiliation_id
+                for affiliation in response.context["cl"].result_list
+            ],
+            [10001],
+        )
+        response = self.client.get(f"{self.URL}?q=sinnoh")
+        self.assertEqual(response.context["cl"].result_count, 3)
+
+
+class TestSearch(APITestCase):
+    """A test class for searching affiliations."""
+
+    def setUp(self):
+        """Create affiliations with coordinators, and log in."""
+        cache.clear()
+        self.client.force_login(User.objects.create_user("arven", password="pw"))
+        self.affiliations = {}
+        for affil_id, ep_id, full_name, short_name, coordinator in (
+            (10000, 40000, "Paldea Academy Panel", "Paldea", "Nemona"),
+            (10001, 50001, "Area Zero Research Panel", "Zero", "Penny"),
+            (10002, 50002, "Academy Zero Outreach", "Outreach", "Geeta"),
+        ):
+            affiliation = Affiliation.objects.create(
+                affiliation_id=affil_id,
+                expert_panel_id=ep_id,
+                full_name=full_name,
+                short_name=short_name,
+                status="ACTIVE",
+                type="GCEP" if ep_id < 50000 else "VCEP",
+                clinical_domain_working_group="NONE",
+                members="Koraidon",
+            )
+            Coordinator.objects.create(
+                affiliation=affiliation,
+                coordinator_name=coordinator,
+                coordinator_email=f"{coordinator.lower()}@example.com",
+            )
+            self.affiliations[affil_id] = affiliation
+
+    def _search(self, text) -> list[int]:
+        """Return the affiliation IDs a search finds, best first."""
+        return list(
+            search_entries(text).values_list("affiliation__affiliation_id", flat=True)
+        )
+
+    def test_prefix_matches(self):
+        """Make sure every term must start a word of the IDs, names or
+        coordinators.
+        """
+        self.assertEqual(self._search("palde"), [10000])
+        self.assertEqual(self._search("PENNY@EXAMPLE"), [10001])
+        self.assertEqual(self._search("5000"), [10001, 10002])
+        self.assertEqual(self._search("zero panel"), [10001])
+        self.assertEqual(self._search("panel nobody"), [])
+        self.assertEqual(self._search("  "), [])
+        self.assertEqual(self._search("o'brien \\ ':* |"), [])
+
+    def test_ranking(self):
+        """Make sure affiliations matching more often rank higher."""
+        self.assertEqual(self._search("zero"), [10001, 10002])
+        ranks = list(search_entries("zero").values_list("rank", flat=True))
+        self.assertGreater(ranks[0], ranks[1])
+        self.assertTrue(all(0 < rank <= 1 for rank in ranks))
+
+    def test_entries_follow_changes(self):
+        """Make sure the entries are refreshed when an affiliation or its
+        children change, and dropped when it is soft-deleted.
+        """
+        affiliation = self.affiliations[10000]
+        affiliation.full_name = "Blueberry Academy"
+        affiliation.save()
+        self.assertEqual(self._search("blueberry"), [10000])
+        self.assertEqual(self._search("panel"), [10001])
+        Coordinator.objects.create(
+            affiliation=affiliation,
+            coordinator_name="Kieran",
+            coordinator_email="kieran@example.com",
+        )
+        self.assertEqual(self._search("kieran"), [10000])
+        affiliation.coordinators.filter(coordinator_name="Kieran").delete()
+        self.assertEqual(self._search("kieran"), [])
+        affiliation.delete()
+        self.assertEqual(self._search("blueberry"), [])
+        self.assertFalse(SearchEntry.objects.filter(pk=affiliation.pk).exists())
+
+    def test_rebuild_command(self):
+        """Make sure the command rebuilds every entry of a live affiliation."""
+        self.affiliations[10002].delete()
+        SearchEntry.objects.all().delete()
+        out = StringIO()
+        call_command("rebuild_search_index", stdout=out)
+        self.assertIn("Rebuilt 2 search entries.", out.getvalue())
+        self.assertEqual(self._search("panel"), [10000, 10001])
+
+    def test_api(self):
+        """Make sure search/ lists the affiliations found, best first."""
+        response = self.client.get("/api/search/?q=zero&limit=1")
+        self.assertEqual(response.status_code, 200)
+        results = response.json()
+        self.assertEqual([affil["affiliation_id"] for affil in results], [10001])
+        self.assertEqual(results[0]["coordinators"][0]["coordinator_name"], "Penny")
+        self.assertIn("rank", results[0])
+        for params in ("", "?q=+", "?q=zero&limit=0", "?q=zero&limit=x"):
+            response = self.client.get(f"/api/search/{params}")
+            self.assertEqual(response.status_code, 400, params)
+        for text in ("-", "%00", "':*"):
+            response = self.client.get("/api/search/", {"q": text})
+            self.assertEqual((response.status_code, response.json()), (200, []), text)
+
+    def test_search_uses_index(self):
+        """Make sure searching reads the full-text index.
+
+        The table is too small for PostgreSQL to choose an index by itself,
+        so sequential scans are ruled out first, and the entries aren't
+        sorted, which would join them to the affiliations by primary key.
+        """
+        with connection.cursor() as cursor:
+            cursor.execute("SET LOCAL enable_seqscan = off")
+            cursor.execute("SET LOCAL enable_indexscan = off")
+        plan = search_entries("zero").order_by().explain()
+        self.assertIn("search_entry_vector_idx", plan)
+
+    def test_trigram_search_uses_indexes(self):
+        """Make sure a search that also matches by trigrams reads the
+        full-text and trigram indexes, rather than scanning the entries.
+        """
+        if not trigrams_available():
+            self.skipTest("The pg_trgm extension isn't installed.")
+        self.assertEqual(self._search("outreah"), [10002])
+        with connection.cursor() as cursor:
+            cursor.execute("SET LOCAL enable_seqscan = off")
+            cursor.execute("SET LOCAL enable_indexscan = off")
+        plan = search_entries("outreah").order_by().explain()
+        self.assertIn("search_entry_vector_idx", plan)
+        self.assertIn("search_entry_trigram_idx", plan)
+        self.assertNotIn("Seq Scan", plan)
+
+
+@override_settings(
+    STORAGES={
+        **settings.STORAGES,
+        "staticfiles": {
+            "BACKEND": "django.contrib.staticfiles.storage.StaticFilesStorage"
+        },
+    }
+)
+class TestExportJobs(TestCase):
+    """A test class for exporting affiliations in the background."""
+
+    def setUp(self):
+        """Keep files in a temporary directory, and create affiliations, one
+        of them soft-deleted.
+        """
+        media = tempfile.TemporaryDirectory()  # pylint: disable=consider-using-with
+        self.addCleanup(media.cleanup)
+        media_settings = override_settings(MEDIA_ROOT=media.name)
+        media_settings.enable()
+        self.addCleanup(media_settings.disable)
+        for affil_id in range(10000, 10005):
+            Affiliation.objects.create(
+                affiliation_id=affil_id,
+                expert_panel_id=None,
+                full_name=f"Galar, {affil_id}",
+                status="ACTIVE",
+                type="INDEPENDENT_CURATION",
+                clinical_domain_working_group="NONE",
+                members="Zacian",
+            )
+        Affiliation.objects.get(affiliation_id=10004).delete()
+        self.user = User.objects.create_superuser("leon", password="pw")
+
+    def _run(self, export_format, fields=()) -> ExportJob:
+        """Create and run an export job, returning it once it has finished."""
+        job = ExportJob.objects.create(export_format=export_format, fields=fields)
+        self.assertTrue(run_export_job(job.pk))
+        job.refresh_from_db()
+        return job
+
+    def test_csv(self):
+        """Make sure every affiliation, deleted or not, is exported as CSV."""
+        job = self._run(ExportFormat.CSV, ["affiliation_id", "full_name"])
+        self.assertEqual(job.status, ExportStatus.DONE)
+        self.assertEqual((job.rows_written, job.total_rows, job.progress), (5, 5, 100))
+        with job.file.open("r") as handle:
+            lines = handle.read().splitlines()
+        self.assertEqual(lines[0], "affiliation_id,full_name")
+        self.assertEqual(lines[1], '10000,"Galar, 10000"')
+        self.assertEqual(len(lines), 6)
+
+    def test_json(self):
+        """Make sure the JSON export has every field unless some are picked."""
+        job = self._run(ExportFormat.JSON)
+        with job.file.open("rb") as handle:
+            data = json.load(handle)
+        self.assertEqual(job.fields, EXPORT_FIELDS)
+        self.assertEqual(list(data[0]), EXPORT_FIELDS)
+        self.assertEqual([row["is_deleted"] for row in data], [False] * 4 + [True])
+
+    def test_progress(self):
+        """Make sure the rows written are saved after every chunk."""
+        job = ExportJob.objects.create(fields=["affiliation_id"])
+        with mock.patch("affiliations.exports.CHUNK_SIZE", 2):
+            with CaptureQueriesContext(connection) as queries:
+                run_export_job(job.pk)
+        updates = [
+            query["sql"]
+            for query in queries
+            if query["sql"].startswith('UPDATE "affiliations_exportjob" SET "rows')
+        ]
+        self.assertEqual(len(updates), 2)
+
+    def test_failures(self):
+        """Make sure a job that fails is marked as failed, and isn't run
+        twice.
+        """
+        job = self._run(ExportFormat.CSV, ["members"])
+        self.assertEqual(job.status, ExportStatus.FAILED)
+        self.assertIn("members", job.error)
+        self.assertFalse(run_export_job(job.pk))
+
+    def test_xlsx(self):
+        """Make sure every affiliation is exported to an Excel sheet."""
+        job = self._run(ExportFormat.XLSX, ["affiliation_id", "is_deleted"])
+        self.assertEqual(job.status, ExportStatus.DONE)
+        self.assertTrue(job.file.name.endswith(".xlsx"))
+        with job.file.open("rb") as handle:
+            sheet = openpyxl.load_workbook(handle, read_only=True)["Affiliations"]
+            rows = list(sheet.values)
+        self.assertEqual(rows[0], ("affiliation_id", "is_deleted"))
+        self.assertEqual(
+            rows[1:],
+            [(affil_id, affil_id == 10004) for affil_id in range(10000, 10005)],
+        )
+
+    def test_pending_jobs_command(self):
+        """Make sure the command runs the pending jobs only."""
+        done = self._run(ExportFormat.CSV)
+        pending = ExportJob.objects.create()
+        out = StringIO()
+        call_command("run_export_jobs", stdout=out)
+        self.assertIn("Ran 1 export jobs.", out.getvalue())
+        pending.refresh_from_db()
+        self.assertEqual(pending.status, ExportStatus.DONE)
+        done.refresh_from_db()
+        self.assertLess(done.finished_at, pending.finished_at)
+
+    def test_interrupted_jobs_are_run_again(self):
+        """Make sure a job left running by a crash is run again once it has
+        made no progress for the timeout, and one that has isn't, however
+        long ago it started.
+        """
+        started_at = timezone.now() - datetime.timedelta(minutes=61)
+        interrupted = ExportJob.objects.create(
+            status=ExportStatus.RUNNING,
+            started_at=started_at,
+            heartbeat_at=started_at,
+            rows_written=3,
+        )
+        running = ExportJob.objects.create(
+            status=ExportStatus.RUNNING,
+            started_at=started_at,
+            heartbeat_at=timezone.now(),
+        )
+        out = StringIO()
+        call_command("run_export_jobs", stdout=out)
+        self.assertIn("Ran 1 export jobs.", out.getvalue())
+        interrupted.refresh_from_db()
+        self.assertEqual(interrupted.status, ExportStatus.DONE)
+        self.assertGreater(interrupted.started_at, started_at)
+        self.assertEqual(interrupted.rows_written, 5)
+        self.assertFalse(run_export_job(running.pk))
+        with override_settings(EXPORT_JOB_TIMEOUT_MINUTES=0):
+            self.assertTrue(run_export_job(running.pk))
+
+    def test_progress_keeps_long_jobs_running(self):
+        """Make sure writing each chunk records the job's progress, so that a
+        job taking longer than the timeout isn't started a second time.
+        """
+        job = ExportJob.objects.create(fields=["affiliation_id"])
+        long_ago = timezone.now() - datetime.timedelta(minutes=120)
+        write_csv = WRITERS[ExportFormat.CSV][0]
+        reruns = []
+
+        def write_slowly(handle, fields, rows):
+            """Write the rows as CSV, taking two hours over the first chunk."""
+            rows = iter(rows)
+            ExportJob.objects.filter(pk=job.pk).update(
+                started_at=long_ago, heartbeat_at=long_ago
+            )
+            # The progress of the first chunk is saved on asking for the row
+            # after it.
+            written = [next(rows) for _ in range(3)]
+            reruns.append(run_pending_export_jobs())
+            write_csv(handle, fields, [*written, *rows])
+
+        with (
+            mock.patch("affiliations.exports.CHUNK_SIZE", 2),
+            mock.patch.dict(WRITERS, {ExportFormat.CSV: (write_slowly, "csv")}),
+        ):
+            self.assertTrue(run_export_job(job.pk))
+        self.assertEqual(reruns, [0])
+        job.refresh_from_db()
+        self.assertEqual(job.status, ExportStatus.DONE)
+        self.assertGreater(job.heartbeat_at, long_ago)
+
+    def test_admin(self):
+        """Make sure the admin starts a job once it commits, and the file can
+        be downloaded when it is done.
+        """
+        self.client.force_login(self.user)
+        with self.captureOnCommitCallbacks() as callbacks:
+            response = self.client.post(
+                "/admin/affiliations/exportjob/add/",
+                {"export_format": "CSV", "fields": ["affiliation_id", "type"]},
+            )
+        self.assertEqual(response.status_code, 302)
+        self.assertEqual(len(callbacks), 1)
+        job = ExportJob.objects.get()
+        self.assertEqual(job.created_by, self.user)
+        url = f"/admin/affiliations/exportjob/{job.pk}/download/"
+        self.assertEqual(self.client.get(url).status_code, 404)
+        run_export_job(job.pk)
+        response = self.client.get("/admin/affiliations/exportjob/")
+        self.assertContains(response, url)
+        response = self.client.get(url)
+        self.assertEqual(
+            b"".join(response.streaming_content).decode().splitlines()[0],
+            "affiliation_id,type",
+        )
+
+
+class TestSpreadsheetLoad(TestCase):
+    """A test class for loading affiliations from the spreadsheet's CSV."""
+
+    HEADER = (
+        "AffiliationID,Affiliation Full Name,Coordinator(s),Email,Submitter ID,"
+        "VCEP Affiliation ID,VCEP Affiliation Name,GCEP Affiliation ID,"
+        "GCEP Affiliation Name,Status,CDWG,is_deleted"
+    )
+    ROWS = [
+        "10000,Hisui Survey,,,,,,,,ACTIVE,NONE,FALSE",
+        '10001,Galaxy,"Laventon, Cyllene","laventon@example.com",77,50001,'
+        "Galaxy SC-VCEP,40001,Galaxy GCEP,ACTIVE,Cardiovascular,FALSE",
+        "10002,Pearl Clan,Irida,irida@example.com,,50002,Pearl VCEP,,,"
+        "RETIRED,Neurodevelopmental Disorders,TRUE",
+    ]
+
+    def _load(self, rows, *args, header=HEADER) -> str:
+        """Load a spreadsheet with the rows, returning the command's output."""
+        with tempfile.NamedTemporaryFile("w", suffix=".csv", delete=False) as file:
+            file.write("\n".join([header, *rows]) + "\n")
+        self.addCleanup(os.remove, file.name)
+        out = StringIO()
+        call_command("load_affiliations_csv", file.name, *args, stdout=out)
+        return out.getvalue()
+
+    def test_load(self):
+        """Make sure each row becomes an affiliation per expert panel, with
+        its coordinators and submitter ID.
+        """
+        out = self._load(self.ROWS)
+        self.assertIn("Created 4 and updated 0 affiliations.", out)
+        self.assertIn("rows/s", out)
+        self.assertEqual(
+            list(
+                Affiliation.all_with_deleted.order_by(
+                    "affiliation_id", "type"
+                ).values_list("affiliation_id", "expert_panel_id", "type", "is_deleted")
+            ),
+            [
+                (10000, None, "INDEPENDENT_CURATION", False),
+                (10001, 40001, "GCEP", False),
+                (10001, 50001, "SC_VCEP", False),
+                (10002, 50002, "VCEP", True),
+            ],
+        )
+        galaxy = Affiliation.objects.get(expert_panel_id=50001)
+        self.assertEqual(
+            list(
+                galaxy.coordinators.order_by("pk").values_list(
+                    "coordinator_name", "coordinator_email"
+                )
+            ),
+            [("Laventon", "laventon@example.com"), ("Cyllene", "")],
+        )
+        self.assertEqual(
+            list(galaxy.clinvar_submitter_ids.values_list("clinvar_submitter_id")),
+            [("77",)],
+        )
+
+    def test_reload_is_idempotent(self):
+        """Make sure loading a spreadsheet again only updates what changed,
+        with as many queries however many rows there are.
+        """
+        self._load(self.ROWS)
+        with CaptureQueriesContext(connection) as unchanged:
+            out = self._load(self.ROWS)
+        self.assertIn("Created 0 and updated 0 affiliations.", out)
+        self.assertEqual(Affiliation.all_with_deleted.count(), 4)
+        self.assertEqual(Coordinator.all_with_deleted.count(), 5)
+        self.assertLess(len(unchanged), 10)
+        counts = []
+        for extra, name in ((20, "Jubilife"), (60, "Jubilife Village")):
+            rows = [
+                self.ROWS[0].replace("Hisui Survey", name),
+                *self.ROWS[1:],
+                *(
+                    f"{10003 + n},Extra {n},,,,,,,,ACTIVE,NONE,FALSE"
+                    for n in range(extra)
+                ),
+            ]
+            with CaptureQueriesContext(connection) as queries:
+                out = self._load(rows)
+            counts.append(len(queries))
+        self.assertIn("Created 40 and updated 1 affiliations.", out)
+        self.assertEqual(counts[0], counts[1])
+
+    def test_dry_run(self):
+        """Make sure a dry run lists the changes without writing them."""
+        self._load(self.ROWS[:2])
+        rows = [self.ROWS[0].replace("ACTIVE", "INACTIVE"), *self.ROWS[1:]]
+        out = self._load(rows, "--dry-run")
+        self.assertIn("~ 10000/None: status 'ACTIVE' -> 'INACTIVE'", out)
+        self.assertIn("+ 10002/50002: Pearl VCEP", out)
+        self.assertIn("Would create 1 and update 1 affiliations.", out)
+        self.assertEqual(Affiliation.all_with_deleted.count(), 3)
+        self.assertEqual(Affiliation.objects.get(affiliation_id=10000).status, "ACTIVE")
+
+    def test_invalid_rows(self):
+        """Make sure nothing is loaded if any row is invalid, and the errors
+        name their lines.
+        """
+        rows = [*self.ROWS, "10003,Bad,Ingo,not-an-email,,,,,,ACTIVE,NONE,FALSE"]
+        rows[1] = rows[1].replace("ACTIVE", "ASLEEP")
+        with self.assertRaisesMessage(CommandError, "Line 3: status:") as raised:
+            self._load(rows)
+        self.assertIn(
+            "Line 5: coordinators[0].coordinator_email:", str(raised.exception)
+        )
+        self.assertFalse(Affiliation.all_with_deleted.exists())
+        with self.assertRaisesMessage(CommandError, "no CDWG column"):
+            self._load([], header=self.HEADER.replace(",CDWG", ""))
+
+    def test_load_in_chunks(self):
+        """Make sure the rows are validated and written a chunk at a time, in
+        one transaction, with duplicates across chunks still caught.
+        """
+        with (
+            mock.patch("affiliations.spreadsheet.CHUNK_SIZE", 2),
+            mock.patch(
+                "affiliations.management.commands.load_affiliations_csv."
+                "upsert_affiliations",
+                wraps=upsert_affiliations,
+            ) as upsert,
+        ):
+            with self.assertRaisesMessage(
+                CommandError,
+                "Line 5: Has the same affiliation and expert panel IDs as line 2.",
+            ):
+                self._load([*self.ROWS, self.ROWS[0]])
+            bad_row = "10003,Bad,Ingo,not-an-email,,,,,,ACTIVE,NONE,FALSE"
+            with self.assertRaisesMessage(CommandError, "Line 5: coordinators"):
+                self._load([*self.ROWS, bad_row])
+            self.assertEqual(upsert.call_count, 4)
+            self.assertFalse(Affiliation.all_with_deleted.exists())
+            upsert.reset_mock()
+            out = self._load(self.ROWS, "--verbosity=2")
+        self.assertEqual([len(call.args[0]) for call in upsert.call_args_list], [2, 2])
+        self.assertIn("Read 2 affiliations (", out)
+        self.assertIn("Created 4 and updated 0 affiliations. Read 4 affiliations", out)
+        self.assertEqual(Affiliation.all_with_deleted.count(), 4)
+
+
+class TestApproverLoad(TestCase):
+    """A test class for loading approvers from the old JSON format."""
+
+    def setUp(self):
+        """Create an affiliation with a VCEP and a GCEP, and one with neither."""
+        for affil_id, ep_id, affil_type in (
+            (10000, 50000, "VCEP"),
+            (10000, 40000, "GCEP"),
+            (10001, None, "INDEPENDENT_CURATION"),
+        ):
+            Affiliation.objects.create(
+                affiliation_id=affil_id,
+                expert_panel_id=ep_id,
+                full_name=f"Kanto {affil_type}",
+                status="ACTIVE",
+                type=affil_type,
+                clinical_domain_working_group="NONE",
+                members="Mew",
+            )
+        Approver.objects.create(
+            affiliation=Affiliation.objects.get(expert_panel_id=50000),
+            approver_name="Oak",
+        )
+        self.data = [
+            {
+                "affiliation_id": "10000",
+                "approver": ["Oak", "Elm"],
+                "subgroups": {"vcep": {"id": "50000"}, "gcep": {"id": "40000"}},
+            },
+            {"affiliation_id": "10001", "approver": ["Birch", "Birch"]},
+            {"affiliation_id": "10002"},
+        ]
+
+    def _approvers(self) -> list[tuple]:
+        """Return the expert panel ID and name of every approver."""
+        return list(
+            Approver.objects.order_by(
+                "affiliation__expert_panel_id", "approver_name"
+            ).values_list("affiliation__expert_panel_id", "approver_name")
+        )
+
+    def test_load(self):
+        """Make sure only missing approvers are created, with a few queries,
+        and the counts say so.
+        """
+        with CaptureQueriesContext(connection) as queries:
+            result = load_approvers(self.data)
+        self.assertEqual(result, (4, 1, 1))
+        self.assertLess(len(queries), 20)
+        self.assertEqual(
+            self._approvers(),
+            [
+                (40000, "Elm"),
+                (40000, "Oak"),
+                (50000, "Elm"),
+                (50000, "Oak"),
+                (None, "Birch"),
+            ],
+        )
+        self.assertEqual(load_approvers(self.data), (0, 5, 1))
+
+    def test_repeated_rows(self):
+        """Make sure approvers repeated in the file are created once and
+        counted as duplicates, not as approvers that already existed.
+        """
+        self.data.append(self.data[0])
+        self.assertEqual(load_approvers(self.data), (4, 1, 5))
+        self.assertEqual(len(self._approvers()), 5)
+        self.assertEqual(load_approvers(self.data), (0, 5, 5))
+
+    def test_unknown_affiliation(self):
+        """Make sure nothing is loaded if an affiliation can't be found."""
+        self.data[0]["subgroups"]["vcep"]["id"] = "50009"
+        self.data.append({"affiliation_id": "10005", "approver": ["Rowan"]})
+        with self.assertRaisesMessage(ValueError, "10000/50009, 10005/None"):
+            load_approvers(self.data)
+        self.assertEqual(self._approvers(), [(50000, "Oak")])
+
+    def test_malformed_items(self):
+        """Make sure an item with missing or malformed IDs or approvers is
+        named in a `ValueError`, and nothing is loaded.
+        """
+        for index, item, message in (
+            (1, {"approver": ["Oak"]}, "Item 1: affiliation_id None is not an ID."),
+            (2, {"affiliation_id": "x", "approver": []}, "Item 2: affiliation_id 'x'"),
+            (
+                1,
+                {"affiliation_id": "10000", "approver": [], "subgroups": {"vcep": {}}},
+                "Item 1: subgroups.vcep.id None",
+            ),
+            (
+                2,
+                {
+                    "affiliation_id": "10000",
+                    "approver": ["Oak"],
+                    "subgroups": {"gcep": {"id": "forty"}},
+                },
+                "Item 2: subgroups.gcep.id 'forty'",
+            ),
+            (1, {"affiliation_id": "10001", "approver": "Birch"}, "Item 1: approver"),
+            (2, ["10001"], "Item 2: expected an object."),
+        ):
+            data = [item] if index == 1 else [self.data[1], item]
+            with self.assertRaisesMessage(ValueError, message):
+                load_approvers(data)
+        self.assertEqual(self._approvers(), [(50000, "Oak")])
+
+        with tempfile.NamedTemporaryFile("w", suffix=".json", delete=False) as file:
+            json.dump([{"approver": ["Oak"]}], file)
+        self.addCleanup(os.remove, file.name)
+        with self.assertRaisesMessage(CommandError, "Item 1: affiliation_id"):
+            call_command("load_approvers_json", file.name, stdout=StringIO())
+
+    def test_command(self):
+        """Make sure the command reports the counts, and the change log lists
+        the affiliations given approvers.
+        """
+        with tempfile.NamedTemporaryFile("w", suffix=".json", delete=False) as file:
+            json.dump(self.data, file)
+        self.addCleanup(os.remove, file.name)
+        out = StringIO()
+        call_command("load_approvers_json", file.name, stdout=out)
+        self.assertIn(
+            "Created 4 approvers and skipped 1 that already existed and 1 listed "
+            "more than once",
+            out.getvalue(),
+        )
+        self.assertEqual(
+            set(
+                ChangeLogEntry.objects.filter(model="approver").values_list(
+                    "expert_panel_id", "action"
+                )
+            ),
+            {(40000, "CREATED"), (50000, "CREATED"), (None, "CREATED")},
+        )
+
+
+class TestLegacyAffiliationsBuilder(TestCase):
+    """A test class for building affiliations in the old JSON format."""
+
+    def _create_affiliation_group(self, affil_id):
+        """Create a VCEP and a GCEP sharing an affiliation ID and approvers."""
+        for affil_type, ep_id in (
+            ("VCEP", affil_id + 40000),
+            ("GCEP", affil_id + 30000),
+        ):
+            affil = Affiliation.objects.create(
+                affiliation_id=affil_id,
+                expert_panel_id=ep_id,
+                full_name=f"Kanto {affil_type}",
+                short_name="Kanto",
+                status="ACTIVE",
+                type=affil_type,
+                clinical_domain_working_group="NONE",
+                members="Pikachu",
+            )
+            Approver.objects.create(affiliation=affil, approver_name="Brock")
+            Approver.objects.create(affiliation=affil, approver_name=affil_type)
+
+    def test_subgroups_are_merged_and_approvers_deduplicated(self):
+        """Make sure subgroups share one document and approvers are unique."""
+        self._create_affiliation_group(10000)
+        self.assertEqual(
+            build_legacy_affiliations(Affiliation.objects.all()),
+            [
+                {
+                    "affiliation_id": "10000",
+                    "affiliation_fullname": "Kanto VCEP/GCEP",
+                    "subgroups": {
+                        "vcep": {"id": "50000", "fullname": "Kanto VCEP"},
+                        "gcep": {"id": "40000", "fullname": "Kanto GCEP"},
+                    },
+                    "approver": ["Brock", "VCEP", "GCEP"],
+                }
+            ],
+        )
+
+    def test_query_count_does_not_grow_with_affiliations(self):
+        """Make sure the whole list is built from a constant number of queries."""
+        for size in (1, 10, 50):
+            for affil_id in range(10000, 10000 + size):
+                self._create_affiliation_group(affil_id)
+            with self.assertNumQueries(2):
+                documents = build_legacy_affiliations(Affiliation.objects.all())
+            self.assertEqual(len(documents), size)
+            Affiliation.objects.all().delete()
+
+
+class TestLegacySnapshots(TestCase):
+    """A test class for keeping the old JSON format snapshots up to date."""
+
+    @classmethod
+    def setUpTestData(cls):
+        """Seed the test database with an affiliation."""
+        cls.affiliation = Affiliation.objects.create(
+            affiliation_id=10000,
+            expert_panel_id=50000,
+            full_name="Johto VCEP",
+            short_name="Johto",
+            status="ACTIVE",
+            type="SC_VCEP",
+            clinical_domain_working_group="SOMATIC_CANCER",
+            members="Chikorita",
+        )
+
+    def _snapshot_document(self):
+        """Return the stored snapshot of the test affiliation, if any."""
+        return (
+            LegacySnapshot.objects.filter(affiliation_id=10000)
+            .values_list("document", flat=True)
+            .first()
+        )
+
+    def test_snapshot_follows_approver_changes(self):
+        """Make sure adding and removing approvers refreshes the snapshot."""
+        self.assertNotIn("approver", self._snapshot_document())
+        approver = Approver.objects.create(
+            affiliation=self.affiliation, approver_name="Ho-Oh"
+        )
+        self.assertIn('"approver": ["Ho-Oh"]', self._snapshot_document())
+        approver.delete()
+        self.assertNotIn("approver", self._snapshot_document())
+
+    def test_snapshot_follows_affiliation_id_and_deletion(self):
+        """Make sure edits move the snapshot and soft-deletes remove it."""
+        self.affiliation.affiliation_id = 10001
+        self.affiliation.save()
+        self.assertIsNone(self._snapshot_document())
+        self.assertTrue(LegacySnapshot.objects.filter(affiliation_id=10001).exists())
+        self.affiliation.delete()
+        self.assertFalse(LegacySnapshot.objects.exists())
+
+    def test_refresh_upserts_live_snapshots(self):
+        """Make sure refreshing an affiliation ID that still has affiliations
+        updates its snapshot in place, without deleting it first, so that
+        concurrent refreshes can't collide on its primary key.
+        """
+        with CaptureQueriesContext(connection) as queries:
+            Approver.objects.create(affiliation=self.affiliation, approver_name="Lugia")
+        sql = [query["sql"] for query in queries.captured_queries]
+        self.assertFalse(
+            any("DELETE" in query and "snapshot" in query for query in sql)
+        )
+        self.assertTrue(any("ON CONFLICT" in query for query in sql))
+        self.assertIn('"approver": ["Lugia"]', self._snapshot_document())
+
+    def test_rebuild_command(self):
+        """Make sure the management command rebuilds missing snapshots and
+        removes those of affiliation IDs that are gone.
+        """
+        LegacySnapshot.objects.all().delete()
+        LegacySnapshot.objects.create(affiliation_id=10099, document="{}")
+        call_command("rebuild_legacy_snapshots", stdout=mock.Mock())
+        self.assertEqual(
+            self._snapshot_document(),
+            '{"affiliation_id": "10000", "affiliation_fullname": "Johto VCEP", '
+            '"subgroups": {"vcep": {"id": "50000", "fullname": "Johto VCEP"}}}',
+        )
+        self.assertFalse(LegacySnapshot.objects.filter(affiliation_id=10099).exists())
+
+    def test_migration_builds_the_same_snapshots(self):
+        """Make sure the migration that added snapshots, which can't use the
+        app's code, builds them as the app does.
+        """
+        for affil_id, ep_id, affil_type, full_name in (
+            (10002, 40002, "GCEP", "Hoenn GCEP"),
+            (10002, 50002, "VCEP", "Hoenn VCEP"),
+            (10003, None, "INDEPENDENT_CURATION", "Sinnoh Pokédex"),
+            (10004, 50004, "VCEP", "Unova VCEP"),
+        ):
+            affiliation = Affiliation.objects.create(
+                affiliation_id=affil_id,
+                expert_panel_id=ep_id,
+                full_name=full_name,
+                short_name=full_name,
+                status="ACTIVE",
+                type=affil_type,
+                clinical_domain_working_group="NONE",
+                members="Treecko",
+            )
+            for name in ("Steven", affil_type):
+                Approver.objects.create(affiliation=affiliation, approver_name=name)
+        Affiliation.objects.get(affiliation_id=10004).delete()
+        rebuild_legacy_snapshots()
+        expected = list(LegacySnapshot.objects.order_by("pk").values_list())
+        LegacySnapshot.objects.all().delete()
+        migration = importlib.import_module(
+            "affiliations.migrations.0036_legacysnapshot"
+        )
+        state = MigrationLoader(connection).project_state(
+            ("affiliations", "0036_legacysnapshot")
+        )
+        migration.build_snapshots(state.apps, connection.schema_editor())
+        self.assertEqual(
+            list(LegacySnapshot.objects.order_by("pk").values_list()), expected
+        )
+
 
 class TestUserInputsIds(TestCase):
     """A test class for testing validation if a user passed in an affiliation ID
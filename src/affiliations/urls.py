@@ -6,11 +6,12 @@ from django.urls import URLResolver, URLPattern
 from rest_framework.urlpatterns import format_suffix_patterns
 
 # In-house code:
-from affiliations import views
+from affiliations import async_views, views
 
 urlpatterns: list[URLResolver | URLPattern] = [
     path("database_list/", views.AffiliationsList.as_view()),
     path("database_list/<int:pk>/", views.AffiliationsDetail.as_view()),
+    path("database_list/bulk/", views.AffiliationsBulkUpsert.as_view()),
     path(
         "affiliations_list/",
         views.affiliations_list_json_format,
@@ -19,6 +20,22 @@ urlpatterns: list[URLResolver | URLPattern] = [
         "affiliation_detail/",
         views.affiliation_detail_json_format,
     ),
+    path("changes/", views.changes),
+    path("search/", views.search),
+    path("cache_stats/", views.cache_stats),
 ]
 
-urlpatterns = format_suffix_patterns(urlpatterns)
+urlpatterns = format_suffix_patterns(urlpatterns) + [
+    # Async views only render JSON, so they get no format suffixes.
+    path("async/database_list/", async_views.affiliations_list),
+    path("async/database_list/<int:pk>/", async_views.affiliations_detail),
+    path(
+        "async/affiliations_list/",
+        async_views.affiliations_list_json_format,
+    ),
+    path(
+        "async/affiliation_detail/",
+        async_views.affiliation_detail_json_format,
+    ),
+    path("events/", async_views.affiliation_events),
+]
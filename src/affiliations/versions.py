@@ -0,0 +1,120 @@
+"""Version the affiliation data so clients can make conditional requests.
+
+Every write to the affiliation data bumps a single counter row. The read
+endpoints derive their `ETag` and `Last-Modified` headers from it, so a client
+whose copy is up to date gets a 304 response after one primary key lookup,
+without any affiliations being queried or serialized. Only the `ETag` decides
+whether the copy is up to date: `Last-Modified` is only precise to the second,
+so a client that read the data in the same second as a write would miss it.
+"""
+
+# Built-in libraries:
+from functools import wraps
+
+# Third-party dependencies:
+from asgiref.sync import iscoroutinefunction
+from django.db.models import F
+from django.db.models.functions import Now
+from django.http import JsonResponse
+from django.utils.http import http_date
+from django.views.decorators.http import condition
+from rest_framework.exceptions import ValidationError
+
+# In-house code:
+from affiliations.models import DataVersion
+
+DATA_VERSION_PK = 1
+
+
+def bump_data_version() -> int:
+    """Increment the data version in the current transaction, returning it.
+
+    The update locks the row until the transaction ends, so concurrent writes
+    are given versions in the order they commit.
+    """
+    bumped = DataVersion.objects.filter(pk=DATA_VERSION_PK).update(
+        version=F("version") + 1, modified=Now()
+    )
+    if not bumped:
+        return DataVersion.objects.create(pk=DATA_VERSION_PK, version=1).version
+    return DataVersion.objects.values_list("version", flat=True).get(pk=DATA_VERSION_PK)
+
+
+def current_data_version(request) -> DataVersion:
+    """Return the data version, reading it at most once per request."""
+    if not hasattr(request, "data_version"):
+        request.data_version, _ = DataVersion.objects.get_or_create(pk=DATA_VERSION_PK)
+    return request.data_version
+
+
+async def aload_data_version(request) -> DataVersion:
+    """Read the data version for an async view before checking conditions.
+
+    The ETag and Last-Modified functions are synchronous, so async views load
+    the data version with the async ORM first and the functions reuse it.
+    """
+    if not hasattr(request, "data_version"):
+        request.data_version, _ = await DataVersion.objects.aget_or_create(
+            pk=DATA_VERSION_PK
+        )
+    return request.data_version
+
+
+def data_etag(request, *args, **kwargs):  # pylint: disable=unused-argument
+    """Return an ETag for the data version and the negotiated format."""
+    version = current_data_version(request).version
+    renderer = getattr(request, "accepted_renderer", None)
+    if renderer is None:
+        return f"{version}"
+    return f"{version}-{renderer.format}"
+
+
+def data_last_modified(request, *args, **kwargs):  # pylint: disable=unused-argument
+    """Return when the data version was last bumped."""
+    return current_data_version(request).modified
+
+
+def _with_last_modified(request, response):
+    """Add a `Last-Modified` header to a successful or 304 response."""
+    if response.status_code in (200, 304) and not response.has_header("Last-Modified"):
+        response.headers["Last-Modified"] = http_date(
+            data_last_modified(request).timestamp()
+        )
+    return response
+
+
+def conditional_on_data_version(check_params=None):
+    """Answer conditional GETs to a read view from the data version's ETag.
+
+    `check_params` is passed the view's arguments before the ETag is
+    compared, and raises `ValidationError` if the query params are invalid,
+    so a bad request gets a 400 even when the client's copy is up to date.
+    Async views, which DRF doesn't wrap, get the error as a JSON response.
+    """
+
+    def decorator(view_func):
+        conditional = condition(etag_func=data_etag)(view_func)
+        if iscoroutinefunction(view_func):
+
+            @wraps(view_func)
+            async def async_inner(request, *args, **kwargs):
+                if check_params is not None:
+                    try:
+                        check_params(request, *args, **kwargs)
+                    except ValidationError as exc:
+                        return JsonResponse(exc.detail, status=400)
+                response = await conditional(request, *args, **kwargs)
+                return _with_last_modified(request, response)
+
+            return async_inner
+
+        @wraps(view_func)
+        def inner(request, *args, **kwargs):
+            if check_params is not None:
+                check_params(request, *args, **kwargs)
+            response = conditional(request, *args, **kwargs)
+            return _with_last_modified(request, response)
+
+        return inner
+
+    return decorator
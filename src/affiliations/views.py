@@ -1,26 +1,188 @@
 """Views for the affiliations service."""
 
+# Built-in libraries:
+from functools import partial
+
 # Third-party dependencies:
-from rest_framework import generics
+from rest_framework import generics, status
 from rest_framework.decorators import api_view, permission_classes
-from rest_framework.permissions import IsAuthenticated, IsAuthenticatedOrReadOnly
+from rest_framework.exceptions import ValidationError
+from rest_framework.permissions import (
+    SAFE_METHODS,
+    IsAdminUser,
+    IsAuthenticated,
+    IsAuthenticatedOrReadOnly,
+)
+from rest_framework.response import Response
 from rest_framework_api_key.permissions import HasAPIKey
-from django.http import JsonResponse
+from django.conf import settings
+from django.http import HttpResponse
+from django.utils.decorators import method_decorator
 
 # In-house code:
-from affiliations.models import Affiliation, Approver
-from affiliations.serializers import AffiliationSerializer
+from affiliations import cache
+from affiliations.bulk import upsert_affiliations
+from affiliations.cache import (
+    affiliation_by_pk,
+    affiliations_by_query_ids,
+    all_affiliations,
+    cached_response,
+)
+from affiliations.changes import change_data, changes_since
+from affiliations.filters import AffiliationFilterBackend
+from affiliations.legacy import (
+    all_legacy_documents,
+    find_legacy_documents,
+    join_legacy_documents,
+)
+from affiliations.models import Affiliation
+from affiliations.pagination import KeysetPagination
+from affiliations.params import query_param_batch_ids, query_param_int
+from affiliations.search import search_entries, search_terms
+from affiliations.serializers import (
+    AffiliationSerializer,
+    flat_representations,
+    sparse_fieldset,
+)
+from affiliations.streaming import (
+    iterate_documents,
+    iterate_serialized,
+    streaming_json_array,
+    wants_stream,
+)
+from affiliations.versions import conditional_on_data_version, current_data_version
+
+
+class EagerLoadingViewMixin:
+    """Fetch the relations the view's serializer nests with its queryset.
+
+    GET requests may narrow the fields returned with the `fields` and
+    `include` query params, and then only the columns and relations those
+    fields need are fetched. The serializer class must use `EagerLoadingMixin`
+    and `SparseFieldsetMixin`.
+    """
+
+    def get_sparse_fieldset(self) -> list[str] | None:
+        """Return the names of the fields asked for, or None for all."""
+        if self.request.method not in SAFE_METHODS:
+            return None
+        if not hasattr(self, "_sparse_fieldset"):
+            # pylint: disable-next=attribute-defined-outside-init
+            self._sparse_fieldset = sparse_fieldset(
+                self.request, self.get_serializer_class()
+            )
+        return self._sparse_fieldset
+
+    def get_queryset(self):
+        """Return the queryset with the serializer's relations loaded."""
+        return self.get_serializer_class().setup_eager_loading(
+            super().get_queryset(), fields=self.get_sparse_fieldset()
+        )
+
+    def get_serializer(self, *args, **kwargs):
+        """Return a serializer that only has the fields asked for."""
+        kwargs.setdefault("fields", self.get_sparse_fieldset())
+        return super().get_serializer(*args, **kwargs)
 
 
-class AffiliationsList(generics.ListCreateAPIView):
-    """List all affiliations, or create a new affiliation."""
+# pylint: disable-next=unused-argument
+def _check_view_params(request, *args, **kwargs) -> None:
+    """Check the query params of a generic view's GET, by building its
+    filtered queryset and decoding its cursor, neither of which queries the
+    database.
+    """
+    view = request.parser_context["view"]
+    view.filter_queryset(view.get_queryset())
+    if isinstance(view.paginator, KeysetPagination):
+        view.paginator.decode_cursor(request)
+
+
+@method_decorator(conditional_on_data_version(_check_view_params), name="get")
+@method_decorator(cached_response("database_list", all_affiliations), name="get")
+class AffiliationsList(EagerLoadingViewMixin, generics.ListCreateAPIView):
+    """List all affiliations, or create a new affiliation.
+
+    Pass `stream=true` to have the list streamed one affiliation at a time, or
+    `page_size` to have it paginated by `KeysetPagination`. It can be filtered
+    with the query params of `AffiliationFilterBackend`.
+    """
 
     permission_classes = [IsAuthenticatedOrReadOnly]
-    queryset = Affiliation.objects.all()
+    # The filters leave out soft-deleted affiliations unless asked for them.
+    queryset = Affiliation.all_with_deleted.all()
     serializer_class = AffiliationSerializer
+    pagination_class = KeysetPagination
+    filter_backends = [AffiliationFilterBackend]
+
+    def list(self, request, *args, **kwargs):
+        """List all affiliations, streaming or paginating them if asked to.
 
+        The whole list is built by `flat_representations`, which gives the
+        same data as the serializer in a fraction of the time.
+        """
+        queryset = self.filter_queryset(self.get_queryset())
+        fields = self.get_sparse_fieldset()
+        if wants_stream(request):
+            return streaming_json_array(
+                iterate_serialized(
+                    queryset.order_by("pk"),
+                    partial(self.get_serializer_class(), fields=fields),
+                )
+            )
+        page = self.paginate_queryset(queryset)
+        if page is not None:
+            serializer = self.get_serializer(page, many=True)
+            return self.get_paginated_response(serializer.data)
+        return Response(
+            flat_representations(self.get_serializer_class(), queryset, fields)
+        )
 
-class AffiliationsDetail(generics.RetrieveUpdateDestroyAPIView):
+
+class AffiliationsBulkUpsert(generics.GenericAPIView):
+    """Create or update many affiliations, with their children, at once.
+
+    Takes a list of affiliations in the `database_list/` format. Each one that
+    has the affiliation and expert panel IDs of a stored affiliation updates
+    it, replacing its children, and the others are created. Nothing is written
+    unless every affiliation is valid.
+    """
+
+    permission_classes = [IsAuthenticated]
+    serializer_class = AffiliationSerializer
+
+    def post(self, request, *args, **kwargs):  # pylint: disable=unused-argument
+        """Validate the affiliations, then write them in one transaction.
+
+        Responds with how many were created and updated, or with the errors of
+        each invalid affiliation and its position in the list.
+        """
+        serializer = self.get_serializer(
+            data=request.data,
+            many=True,
+            max_length=settings.AFFILIATION_BULK_MAX_ITEMS,
+        )
+        if not serializer.is_valid():
+            errors = serializer.errors
+            if isinstance(errors, list):
+                errors = {
+                    "errors": [
+                        {"index": index, "errors": item_errors}
+                        for index, item_errors in enumerate(errors)
+                        if item_errors
+                    ]
+                }
+            return Response(errors, status=status.HTTP_400_BAD_REQUEST)
+        result = upsert_affiliations(serializer.validated_data)
+        return Response(
+            {"created": len(result.created), "updated": len(result.updated)}
+        )
+
+
+@method_decorator(conditional_on_data_version(_check_view_params), name="get")
+@method_decorator(cached_response("database_detail", affiliation_by_pk), name="get")
+class AffiliationsDetail(  # pylint: disable=too-many-ancestors
+    EagerLoadingViewMixin, generics.RetrieveUpdateDestroyAPIView
+):
     """Retrieve, update or delete an affiliation."""
 
     permission_classes = [IsAuthenticatedOrReadOnly]
@@ -30,145 +192,131 @@ class AffiliationsDetail(generics.RetrieveUpdateDestroyAPIView):
 
 @api_view(["GET"])
 @permission_classes([HasAPIKey | IsAuthenticated])
-def affiliations_list_json_format(request):  # pylint: disable=unused-argument
-    """List all affiliations in old JSON format."""
-    affils_queryset = Affiliation.objects.filter(is_deleted=False).values()
-    response_obj = {}
-    for affil in affils_queryset:
-        affil_type = affil["type"].lower()
-        # In old JSON, SC-VCEPS are only considered VCEPS.
-        if affil_type == "sc_vcep":
-            affil_type = "vcep"
-        # In old JSON, Affiliation IDs and EP Ids are in string format.
-        affil_id = str(affil["affiliation_id"])
-        ep_id = str(affil["expert_panel_id"])
-
-        if affil_id not in response_obj:
-            if affil_type in ["vcep", "gcep"]:
-                old_json_format = {
-                    "affiliation_id": affil_id,
-                    "affiliation_fullname": affil["full_name"],
-                    "subgroups": {
-                        affil_type: {
-                            "id": ep_id,
-                            "fullname": affil["full_name"],
-                        },
-                    },
-                }
-            # Independent curation group format
-            else:
-                old_json_format = {
-                    "affiliation_id": affil_id,
-                    "affiliation_fullname": affil["full_name"],
-                }
-            response_obj[affil_id] = old_json_format
-        elif affil_type not in response_obj[affil_id]["subgroups"]:
-            # If VCEP or GCEP in full name, add other subgroup to end of name.
-            if ("VCEP" in response_obj[affil_id]["affiliation_fullname"]) or (
-                "GCEP" in response_obj[affil_id]["affiliation_fullname"]
-            ):
-                response_obj[affil_id]["affiliation_fullname"] = (
-                    response_obj[affil_id]["affiliation_fullname"] + "/" + affil["type"]
-                )
-            # Else append affiliation subgroup name to full name
-            else:
-                response_obj[affil_id]["affiliation_fullname"] = (
-                    response_obj[affil_id]["affiliation_fullname"]
-                    + "/"
-                    + affil["full_name"]
-                )
+@conditional_on_data_version()
+@cached_response("affiliations_list", all_affiliations)
+def affiliations_list_json_format(request):
+    """List all affiliations in old JSON format.
 
-            response_obj[affil_id]["subgroups"][affil_type] = {
-                "id": ep_id,
-                "fullname": affil["full_name"],
-            }
-        # If there are approvers, add them to the object.
-        approvers_queryset = Approver.objects.filter(
-            affiliation_id=affil["id"]
-        ).values_list("approver_name", flat=True)
-        if approvers_queryset and "approver" not in response_obj[affil_id]:
-            response_obj[affil_id]["approver"] = []
-        for name in approvers_queryset:
-            if name not in response_obj[affil_id]["approver"]:
-                response_obj[affil_id]["approver"].append(name)
-
-    return JsonResponse(
-        list(response_obj.values()),
+    Pass `stream=true` to have the list streamed one affiliation at a time.
+    """
+    documents = all_legacy_documents()
+    if wants_stream(request):
+        return streaming_json_array(iterate_documents(documents), separator=", ")
+    return HttpResponse(
+        join_legacy_documents(documents),
         status=200,
-        safe=False,
-        json_dumps_params={"ensure_ascii": False},
+        content_type="application/json",
     )
 
 
 @api_view(["GET"])
 @permission_classes([HasAPIKey | IsAuthenticated])
+@conditional_on_data_version(query_param_batch_ids)
+@cached_response("affiliation_detail", affiliations_by_query_ids)
 def affiliation_detail_json_format(request):
-    """List specific affiliation in old JSON format."""
-    affil_id = request.GET.get("affil_id")
-    affils_queryset = Affiliation.objects.filter(
-        affiliation_id=affil_id, is_deleted=False
-    ).values()
-    response_obj = {}
-    for affil in affils_queryset:
-        affil_type = affil["type"].lower()
-        # In old JSON, SC-VCEPS are only considered VCEPS.
-        if affil_type == "sc_vcep":
-            affil_type = "vcep"
-        # In old JSON, Affiliation IDs and EP Ids are in string format.
-        affil_id = str(affil["affiliation_id"])
-        ep_id = str(affil["expert_panel_id"])
-
-        if affil_id not in response_obj:
-            if affil_type in ["vcep", "gcep"]:
-                old_json_format = {
-                    "affiliation_id": affil_id,
-                    "affiliation_fullname": affil["full_name"],
-                    "subgroups": {
-                        affil_type: {
-                            "id": ep_id,
-                            "fullname": affil["full_name"],
-                        },
-                    },
-                }
-            # Independent curation group format
-            else:
-                old_json_format = {
-                    "affiliation_id": affil_id,
-                    "affiliation_fullname": affil["full_name"],
-                }
-            response_obj[affil_id] = old_json_format
-        elif affil_type not in response_obj[affil_id]["subgroups"]:
-            # If VCEP or GCEP in full name, add other subgroup to end of name.
-            if ("VCEP" in response_obj[affil_id]["affiliation_fullname"]) or (
-                "GCEP" in response_obj[affil_id]["affiliation_fullname"]
-            ):
-                response_obj[affil_id]["affiliation_fullname"] = (
-                    response_obj[affil_id]["affiliation_fullname"] + "/" + affil["type"]
-                )
-            # Else append affiliation subgroup name to full name
-            else:
-                response_obj[affil_id]["affiliation_fullname"] = (
-                    response_obj[affil_id]["affiliation_fullname"]
-                    + "/"
-                    + affil["full_name"]
-                )
+    """List specific affiliations in old JSON format.
 
-            response_obj[affil_id]["subgroups"][affil_type] = {
-                "id": ep_id,
-                "fullname": affil["full_name"],
-            }
-        # If there are approvers, add them to the object.
-        approvers_queryset = Approver.objects.filter(
-            affiliation_id=affil["id"]
-        ).values_list("approver_name", flat=True)
-        if approvers_queryset and "approver" not in response_obj[affil_id]:
-            response_obj[affil_id]["approver"] = []
-        for name in approvers_queryset:
-            if name not in response_obj[affil_id]["approver"]:
-                response_obj[affil_id]["approver"].append(name)
-    return JsonResponse(
-        list(response_obj.values()),
+    Any number of affiliation IDs (`affil_id`) and expert panel IDs (`ep_id`)
+    can be asked for, either by repeating the query param or by separating the
+    IDs with commas, up to `AFFILIATION_DETAIL_MAX_BATCH_SIZE` in total.
+    """
+    documents = find_legacy_documents(*query_param_batch_ids(request))
+    return HttpResponse(
+        join_legacy_documents(documents),
         status=200,
-        safe=False,
-        json_dumps_params={"ensure_ascii": False},
+        content_type="application/json",
+    )
+
+
+def _changes_params(request) -> tuple[int | None, int]:
+    """Return the `since` and `limit` query params of changes/."""
+    since = query_param_int(request, "since")
+    limit = query_param_int(request, "limit")
+    if limit is None:
+        limit = settings.CHANGE_LOG_PAGE_SIZE
+    if limit < 1:
+        raise ValidationError({"limit": ["Must be a positive integer."]})
+    return since, limit
+
+
+@api_view(["GET"])
+@permission_classes([HasAPIKey | IsAuthenticated])
+@conditional_on_data_version(_changes_params)
+def changes(request):
+    """List the changes made to affiliations after a sequence number.
+
+    Pass the `next_since` of the previous call as `since`, and re-read the
+    affiliation IDs listed. Without `since`, no changes are listed, and the
+    `next_since` returned is where a client that is about to read every
+    affiliation should start. At most about `limit` changes are listed per
+    call, up to `CHANGE_LOG_MAX_PAGE_SIZE`. If the changes after `since` have
+    been pruned, the response is 410 Gone, and the client must read every
+    affiliation again.
+    """
+    data_version = current_data_version(request)
+    since, limit = _changes_params(request)
+    if since is None:
+        return Response(
+            {"changes": [], "next_since": data_version.version, "has_more": False}
+        )
+    if since < data_version.changes_pruned_through:
+        return Response(
+            {
+                "detail": f"Changes up to {data_version.changes_pruned_through} have "
+                "been pruned. Read every affiliation again."
+            },
+            status=status.HTTP_410_GONE,
+        )
+    entries, has_more = changes_since(
+        since, min(limit, settings.CHANGE_LOG_MAX_PAGE_SIZE)
+    )
+    return Response(
+        {
+            "changes": [change_data(entry) for entry in entries],
+            "next_since": entries[-1].sequence if entries else since,
+            "has_more": has_more,
+        }
+    )
+
+
+@api_view(["GET"])
+@permission_classes([HasAPIKey | IsAuthenticated])
+def search(request):
+    """List the affiliations matching the text passed as `q`, best first.
+
+    Every word of `q` must start a word of the affiliation's IDs, names or
+    coordinators. Each affiliation has a `rank` between 0 and 1. At most
+    `limit` are listed, up to `SEARCH_MAX_PAGE_SIZE`. A `q` without letters or
+    digits finds nothing.
+    """
+    text = request.GET.get("q", "").strip()
+    if not text:
+        raise ValidationError({"q": ["This query param is required."]})
+    limit = query_param_int(request, "limit")
+    if limit is None:
+        limit = settings.SEARCH_PAGE_SIZE
+    if limit < 1:
+        raise ValidationError({"limit": ["Must be a positive integer."]})
+    if not search_terms(text):
+        return Response([])
+    ranks = dict(
+        search_entries(text).values_list("pk", "rank")[
+            : min(limit, settings.SEARCH_MAX_PAGE_SIZE)
+        ]
+    )
+    affiliations = AffiliationSerializer.setup_eager_loading(
+        Affiliation.objects.filter(pk__in=ranks)
+    ).in_bulk()
+    return Response(
+        [
+            {**AffiliationSerializer(affiliations[pk]).data, "rank": rank}
+            for pk, rank in ranks.items()
+        ]
     )
+
+
+@api_view(["GET"])
+@permission_classes([IsAdminUser])
+def cache_stats(request):  # pylint: disable=unused-argument
+    """Show how many read requests were answered from the response cache."""
+    return Response(cache.stats())
@@ -34,6 +34,35 @@ SECRET_KEY = os.environ.get("DJANGO_SECRET_KEY")
 # API Key Header setting
 API_KEY_CUSTOM_HEADER = "HTTP_X_API_KEY"
 
+# Most affiliation and expert panel IDs one affiliation_detail/ call may ask for
+AFFILIATION_DETAIL_MAX_BATCH_SIZE = 100
+
+# Default and largest page sizes of database_list/ when it's paginated
+AFFILIATION_LIST_PAGE_SIZE = 100
+AFFILIATION_LIST_MAX_PAGE_SIZE = 1000
+
+# Most affiliations one database_list/bulk/ call may create or update
+AFFILIATION_BULK_MAX_ITEMS = 10000
+
+# Default and largest number of results one search/ call returns
+SEARCH_PAGE_SIZE = 20
+SEARCH_MAX_PAGE_SIZE = 100
+
+# Default and largest number of entries one changes/ call lists
+CHANGE_LOG_PAGE_SIZE = 500
+CHANGE_LOG_MAX_PAGE_SIZE = 5000
+
+# Days after which change log entries superseded by a later entry for the same
+# affiliation are deleted, and days after which every entry is deleted. None
+# keeps entries forever.
+CHANGE_LOG_COMPACT_AFTER_DAYS = 7
+CHANGE_LOG_RETENTION_DAYS = 90
+
+# Minutes without progress after which an export job still marked as running
+# is taken to have been interrupted, e.g. by a crash or a restart, and is run
+# again
+EXPORT_JOB_TIMEOUT_MINUTES = 60
+
 # SECURITY WARNING: Don't run with debug turned on in production.
 DEBUG = False
 
@@ -65,6 +94,7 @@ INSTALLED_APPS = [
     "django.contrib.contenttypes",
     "django.contrib.sessions",
     "django.contrib.messages",
+    "django.contrib.postgres",
     "whitenoise.runserver_nostatic",
     "django.contrib.staticfiles",
     "rest_framework",
@@ -125,7 +155,40 @@ DATABASES = {
     }
 }
 
+# Cache:
+# https://docs.djangoproject.com/en/5.0/topics/cache/
+# AFFILS_CACHE_BACKEND is one of "locmem", "file" or "redis". AFFILS_CACHE_LOCATION
+# is a directory for "file" and a URL (e.g. redis://127.0.0.1:6379) for "redis".
+CACHE_BACKENDS = {
+    "locmem": "django.core.cache.backends.locmem.LocMemCache",
+    "file": "django.core.cache.backends.filebased.FileBasedCache",
+    "redis": "django.core.cache.backends.redis.RedisCache",
+}
+CACHES = {
+    "default": {
+        "BACKEND": CACHE_BACKENDS[os.environ.get("AFFILS_CACHE_BACKEND") or "locmem"],
+        "LOCATION": os.environ.get("AFFILS_CACHE_LOCATION", ""),
+        "TIMEOUT": 60 * 60,
+    }
+}
+
+# Events:
+# AFFILS_EVENTS_BACKEND is "local", which only reaches the events/ streams of
+# the same process, or "redis", with AFFILS_EVENTS_LOCATION set to the server's
+# URL (e.g. redis://127.0.0.1:6379).
+AFFILS_EVENTS_BACKEND = os.environ.get("AFFILS_EVENTS_BACKEND") or "local"
+AFFILS_EVENTS_LOCATION = os.environ.get("AFFILS_EVENTS_LOCATION", "")
+# Seconds between heartbeats of an idle stream, milliseconds clients wait
+# before reconnecting, and how many messages a stream may fall behind by.
+EVENTS_HEARTBEAT_SECONDS = 15
+EVENTS_RETRY_MILLISECONDS = 3000
+EVENTS_QUEUE_SIZE = 1000
+
 STORAGES = {
+    # Export jobs keep their files under MEDIA_ROOT.
+    "default": {
+        "BACKEND": "django.core.files.storage.FileSystemStorage",
+    },
     "dbbackup": {
         "BACKEND": "storages.backends.s3boto3.S3Boto3Storage",
         "OPTIONS": {
@@ -183,7 +246,7 @@ DEFAULT_AUTO_FIELD = "django.db.models.BigAutoField"
 
 REST_FRAMEWORK = {
     "DEFAULT_RENDERER_CLASSES": (
-        "rest_framework.renderers.JSONRenderer",
+        "affiliations.renderers.FastJSONRenderer",
         "affiliations.renderers.BrowsableAPIRendererWithoutForms",
     ),
 }
@@ -224,6 +287,10 @@ DJANGO_ADMIN_LOGS_IGNORE_UNCHANGED = True
 CRONJOBS = [
     # Run dbbackup weekly on Sundays at midnight
     ("0 0 * * 0", "django.core.management.call_command", ["dbbackup"]),
+    # Compact and expire the change log daily at 1am
+    ("0 1 * * *", "django.core.management.call_command", ["prune_change_log"]),
+    # Run export jobs left pending every minute
+    ("* * * * *", "django.core.management.call_command", ["run_export_jobs"]),
 ]
 
 # Logging and Cloudwatch
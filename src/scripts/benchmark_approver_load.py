@@ -0,0 +1,53 @@
+"""
+Script to time loading approvers from a file of affiliations in the old JSON
+format.
+
+Synthetic affiliations are created in a transaction that is rolled back when
+the script finishes, and each affiliation ID's VCEP and GCEP are given five
+approvers, one of which they already have. You can run this script by
+running: `python manage.py runscript benchmark_approver_load` in the command
+line from the directory. Pass `--script-args 2000` to change the number of
+affiliations.
+"""
+
+import time
+
+from affiliations.approvers import load_approvers
+from scripts.synthetic_data import counted_queries, create_affiliations, rolled_back
+
+
+def legacy_data(affiliations):
+    """Return old JSON format affiliations listing approvers for every VCEP
+    and GCEP.
+    """
+    subgroups = {}
+    for affiliation in affiliations:
+        subgroups.setdefault(affiliation.affiliation_id, {})[
+            affiliation.type.lower()
+        ] = {"id": str(affiliation.expert_panel_id)}
+    return [
+        {
+            "affiliation_id": str(affiliation_id),
+            "approver": ["Shared Approver"]
+            + [f"New Approver {affiliation_id}-{n}" for n in range(4)],
+            "subgroups": panels,
+        }
+        for affiliation_id, panels in subgroups.items()
+    ]
+
+
+def run(*args):
+    """Print how long loading the approvers takes, and with how many queries."""
+    count = int(args[0]) if args else 2000
+    with rolled_back():
+        data = legacy_data(create_affiliations(count))
+        start = time.perf_counter()
+        with counted_queries() as queries:
+            result = load_approvers(data)
+        seconds = time.perf_counter() - start
+        print(
+            f"{count:7} affiliations: created {result.created} and skipped "
+            f"{result.skipped} approvers ({result.duplicates} duplicates) in "
+            f"{seconds * 1000:.1f} ms, "
+            f"{len(queries)} queries"
+        )
@@ -0,0 +1,120 @@
+"""
+Script to compare the throughput of the sync and async views under Daphne.
+
+Unlike the other benchmark scripts, this one has to commit its synthetic
+affiliations so that a separate Daphne process can read them; they are
+deleted again when the script finishes. Don't run it against production.
+
+You can run this script by running:
+`python manage.py runscript benchmark_async_views` in the command line from
+the directory. Pass `--script-args 200` to change the number of concurrent
+connections.
+"""
+
+import asyncio
+import os
+import socket
+import statistics
+import subprocess
+import sys
+import time
+
+from django.conf import settings
+from rest_framework_api_key.models import APIKey
+
+from affiliations.legacy import rebuild_legacy_snapshots
+from affiliations.models import Affiliation
+from scripts.synthetic_data import create_affiliations
+
+AFFILIATION_COUNT = 200
+REQUESTS_PER_CONNECTION = 10
+
+
+def _free_port():
+    """Return a TCP port nobody is listening on."""
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def _start_daphne(port):
+    """Start Daphne serving the project and wait until it accepts connections."""
+    # pylint: disable-next=consider-using-with
+    server = subprocess.Popen(
+        [sys.executable, "-m", "daphne", "-p", str(port), "main.asgi:application"],
+        cwd=settings.BASE_DIR,
+        env=os.environ.copy(),
+        stdout=subprocess.DEVNULL,
+        stderr=subprocess.DEVNULL,
+    )
+    for _ in range(100):
+        try:
+            with socket.create_connection(("127.0.0.1", port)):
+                return server
+        except OSError:
+            time.sleep(0.1)
+    server.terminate()
+    raise RuntimeError("Daphne did not start.")
+
+
+async def _get(port, path, key):
+    """Make one GET request, returning its status code and latency."""
+    start = time.perf_counter()
+    reader, writer = await asyncio.open_connection("127.0.0.1", port)
+    writer.write(
+        f"GET {path} HTTP/1.1\r\nHost: {settings.ALLOWED_HOSTS[0]}\r\n"
+        f"X-Api-Key: {key}\r\nConnection: close\r\n\r\n".encode()
+    )
+    await writer.drain()
+    response = await reader.read()
+    writer.close()
+    await writer.wait_closed()
+    return int(response.split(b" ", 2)[1]), time.perf_counter() - start
+
+
+async def _load(port, paths, key, concurrency):
+    """Send requests from `concurrency` clients at once, returning the stats."""
+
+    async def client(i):
+        return [
+            await _get(port, paths[(i + n) % len(paths)], key)
+            for n in range(REQUESTS_PER_CONNECTION)
+        ]
+
+    start = time.perf_counter()
+    results = await asyncio.gather(*(client(i) for i in range(concurrency)))
+    elapsed = time.perf_counter() - start
+    latencies = sorted(latency for result in results for _, latency in result)
+    errors = sum(status != 200 for result in results for status, _ in result)
+    return len(latencies) / elapsed, latencies, errors
+
+
+def run(*args):
+    """Print requests/second and latencies for the sync and async views."""
+    concurrency = int(args[0]) if args else 100
+    affils = create_affiliations(AFFILIATION_COUNT)
+    api_key, key = APIKey.objects.create_key(name="benchmark")
+    port = _free_port()
+    server = _start_daphne(port)
+    try:
+        for prefix in ("/api/", "/api/async/"):
+            paths = [f"{prefix}database_list/{affil.pk}/" for affil in affils] + [
+                f"{prefix}affiliation_detail/?affil_id={affil.affiliation_id}"
+                for affil in affils
+            ]
+            throughput, latencies, errors = asyncio.run(
+                _load(port, paths, key, concurrency)
+            )
+            print(
+                f"{prefix:12} {concurrency} connections "
+                f"{throughput:8.1f} requests/s "
+                f"p50={statistics.median(latencies) * 1000:7.1f} ms "
+                f"p95={latencies[int(len(latencies) * 0.95)] * 1000:7.1f} ms "
+                f"errors={errors}"
+            )
+    finally:
+        server.terminate()
+        server.wait()
+        Affiliation.objects.filter(pk__in=[affil.pk for affil in affils]).delete()
+        api_key.delete()
+        rebuild_legacy_snapshots()
@@ -0,0 +1,89 @@
+"""
+Script to measure the throughput of the database_list/bulk/ upsert.
+
+Synthetic affiliations, each with a coordinator, two approvers and a
+submitter, are validated and written by `upsert_affiliations`, first as new
+affiliations and then as edits to them. For comparison, a smaller number are
+created one at a time through `AffiliationSerializer`, the way POST
+database_list/ does. Everything is written in a transaction that is rolled
+back when the script finishes. You can run this script by running:
+`python manage.py runscript benchmark_bulk_upsert` in the command line from
+the directory. Pass `--script-args 1000` to change the number of
+affiliations.
+"""
+
+from affiliations.bulk import upsert_affiliations
+from affiliations.serializers import AffiliationSerializer
+from scripts.synthetic_data import rolled_back, time_per_call
+
+ONE_AT_A_TIME = 500
+
+
+def payload(count, first_affiliation_id=10000, members="Grookey"):
+    """Return `count` affiliations in the format database_list/bulk/ takes."""
+    return [
+        {
+            "affiliation_id": first_affiliation_id + i,
+            "expert_panel_id": 50000 + i,
+            "full_name": f"Synthetic VCEP {i}",
+            "short_name": f"Synthetic {i}",
+            "status": "ACTIVE",
+            "type": "VCEP",
+            "clinical_domain_working_group": "OTHER",
+            "members": members,
+            "coordinators": [
+                {
+                    "coordinator_name": f"Coordinator {i}",
+                    "coordinator_email": f"coordinator{i}@example.com",
+                }
+            ],
+            "approvers": [{"approver_name": "Leon"}, {"approver_name": f"Hop {i}"}],
+            "clinvar_submitter_ids": [{"clinvar_submitter_id": str(i)}],
+        }
+        for i in range(count)
+    ]
+
+
+def validated(items):
+    """Validate affiliations the way the bulk endpoint does."""
+    serializer = AffiliationSerializer(data=items, many=True)
+    serializer.is_valid(raise_exception=True)
+    return serializer.validated_data
+
+
+def one_at_a_time(items):
+    """Validate and create affiliations one request's worth at a time."""
+    for item in items:
+        serializer = AffiliationSerializer(data=item)
+        serializer.is_valid(raise_exception=True)
+        serializer.save()
+
+
+def report(label, count, seconds):
+    """Print how long a step took and its throughput."""
+    print(
+        f"{count:7} {label:24} {seconds * 1000:9.1f} ms "
+        f"{count / seconds:9.0f} affiliations/s"
+    )
+
+
+def run(*args):
+    """Print the throughput of each step of a bulk upsert."""
+    count = int(args[0]) if args else 10000
+    items = payload(count)
+    edited = payload(count, members="Rillaboom")
+    for item in edited[::2]:
+        item["approvers"].append({"approver_name": "Sonia"})
+    with rolled_back():
+        report("validate", count, time_per_call(1, validated, items))
+        data = validated(items)
+        report("upsert (create)", count, time_per_call(1, upsert_affiliations, data))
+        data = validated(edited)
+        report("upsert (update)", count, time_per_call(1, upsert_affiliations, data))
+        report(
+            "upsert (no changes)", count, time_per_call(1, upsert_affiliations, data)
+        )
+        baseline = payload(ONE_AT_A_TIME, first_affiliation_id=10000 + count)
+        report(
+            "one at a time", ONE_AT_A_TIME, time_per_call(1, one_at_a_time, baseline)
+        )
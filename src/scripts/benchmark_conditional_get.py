@@ -0,0 +1,47 @@
+"""
+Script to compare the cost of conditional GETs that hit and miss the ETag.
+
+Synthetic affiliations are created in a transaction that is rolled back when
+the script finishes. You can run this script by running:
+`python manage.py runscript benchmark_conditional_get` in the command line
+from the directory. Pass `--script-args 5000` to change the number of
+affiliations.
+"""
+
+from scripts.synthetic_data import (
+    api_client,
+    counted_queries,
+    create_affiliations,
+    rolled_back,
+    time_per_call,
+)
+
+URLS = [
+    "/api/affiliations_list/",
+    "/api/affiliation_detail/?affil_id=10000",
+    "/api/database_list/",
+]
+REPEAT = 20
+
+
+def run(*args):
+    """Print the time and queries per request with and without a valid ETag."""
+    count = int(args[0]) if args else 2000
+    with rolled_back():
+        create_affiliations(count)
+        client = api_client()
+        print(f"{count} affiliations, mean of {REPEAT} requests")
+        for url in URLS:
+            etag = client.get(url)["ETag"]
+            for label, headers in (
+                ("miss", {}),
+                ("hit", {"HTTP_IF_NONE_MATCH": etag}),
+            ):
+                with counted_queries() as queries:
+                    response = client.get(url, **headers)
+                seconds = time_per_call(REPEAT, client.get, url, **headers)
+                print(
+                    f"{url:45} {label:4} status={response.status_code} "
+                    f"queries={len(queries)} bytes={len(response.content)} "
+                    f"{seconds * 1000:.2f} ms"
+                )
@@ -0,0 +1,81 @@
+"""
+Script to measure how fast the events/ stream fans a change out to many idle
+connections.
+
+Each connection is an `event_stream` read by its own task on one event loop,
+as Daphne would run them. Messages are published from another thread, as a
+write's commit would, and the time until every connection has read each one is
+recorded. No rows are written. You can run this script by running:
+`python manage.py runscript benchmark_event_fanout` in the command line from
+the directory. Pass `--script-args 5000` to change the number of connections.
+"""
+
+import asyncio
+import statistics
+import threading
+import time
+import tracemalloc
+
+from affiliations.events import event_stream, get_broker
+
+MESSAGES = 50
+
+
+async def listen(stream, received, done):
+    """Read events from a stream, counting down each message's readers."""
+    await anext(stream)
+    async for chunk in stream:
+        if chunk.startswith("id: "):
+            sequence = int(chunk.split("\n", maxsplit=1)[0][4:])
+            received[sequence][0] -= 1
+            if not received[sequence][0]:
+                received[sequence][1] = time.perf_counter()
+                done.set()
+
+
+async def fan_out(connections):
+    """Return the latency of each message and the memory held per connection."""
+    broker = get_broker()
+    tracemalloc.start()
+    before = tracemalloc.get_traced_memory()[0]
+    received = {sequence: [connections, None] for sequence in range(MESSAGES)}
+    done = asyncio.Event()
+    tasks = [
+        asyncio.create_task(listen(event_stream(), received, done))
+        for _ in range(connections)
+    ]
+    while broker.subscriber_count < connections:
+        await asyncio.sleep(0.01)
+    per_connection = (tracemalloc.get_traced_memory()[0] - before) / connections
+    tracemalloc.stop()
+
+    latencies = []
+    for sequence in range(MESSAGES):
+        done.clear()
+        message = {"sequence": sequence, "changes": []}
+        publisher = threading.Thread(target=broker.publish, args=(message,))
+        start = time.perf_counter()
+        publisher.start()
+        await done.wait()
+        latencies.append(received[sequence][1] - start)
+        publisher.join()
+
+    for task in tasks:
+        task.cancel()
+    await asyncio.gather(*tasks, return_exceptions=True)
+    return latencies, per_connection
+
+
+def run(*args):
+    """Print the fan-out latency and the memory held per idle connection."""
+    connections = int(args[0]) if args else 1000
+    latencies, per_connection = asyncio.run(fan_out(connections))
+    latencies.sort()
+    print(
+        f"{connections:6} connections "
+        f"p50={statistics.median(latencies) * 1000:7.2f} ms "
+        f"p99={latencies[int(len(latencies) * 0.99)] * 1000:7.2f} ms "
+        f"max={latencies[-1] * 1000:7.2f} ms "
+        f"{connections * MESSAGES / sum(latencies):9.0f} events/s "
+        f"{per_connection / 1024:5.1f} KiB/connection"
+    )
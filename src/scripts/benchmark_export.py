@@ -0,0 +1,51 @@
+"""
+Script to check that export jobs take as much memory however many
+affiliations they export.
+
+Each format is exported from a small and a large number of synthetic
+affiliations, and the time taken and the peak memory Python allocated are
+printed. Synthetic affiliations are created in a transaction that is rolled
+back when the script finishes, along with the jobs; their files are deleted.
+You can run this script by running: `python manage.py runscript
+benchmark_export` in the command line from the directory. Pass
+`--script-args 100000` to change the larger number of affiliations.
+"""
+
+import time
+import tracemalloc
+
+from affiliations.exports import run_export_job
+from affiliations.models import ExportFormat, ExportJob
+from scripts.synthetic_data import create_affiliations, rolled_back
+
+SMALL_COUNT = 1000
+
+
+def export(export_format):
+    """Run an export job, returning its seconds and peak memory in MiB."""
+    job = ExportJob.objects.create(export_format=export_format)
+    tracemalloc.start()
+    start = time.perf_counter()
+    run_export_job(job.pk)
+    seconds = time.perf_counter() - start
+    peak = tracemalloc.get_traced_memory()[1] / 2**20
+    tracemalloc.stop()
+    job.refresh_from_db()
+    if job.error:
+        print(f"{export_format} failed: {job.error}")
+    job.file.delete(save=False)
+    return seconds, peak
+
+
+def run(*args):
+    """Print the time and peak memory of each format at both sizes."""
+    large_count = int(args[0]) if args else 100000
+    for count in (SMALL_COUNT, large_count):
+        with rolled_back():
+            create_affiliations(count)
+            for export_format in ExportFormat:
+                seconds, peak = export(export_format)
+                print(
+                    f"{count:7} {export_format.value:5} {seconds * 1000:9.1f} ms "
+                    f"{peak:7.1f} MiB peak"
+                )
@@ -0,0 +1,47 @@
+"""
+Script to compare how fast `AffiliationSerializer` and `flat_representations`
+build the database_list/ data.
+
+Both are timed from the queries to the finished list of dicts, without
+rendering it as JSON. Synthetic affiliations are created in a transaction that
+is rolled back when the script finishes. You can run this script by running:
+`python manage.py runscript benchmark_fast_serializer` in the command line
+from the directory. Pass `--script-args 10000` to change the number of
+affiliations.
+"""
+
+from affiliations.models import Affiliation
+from affiliations.serializers import AffiliationSerializer, flat_representations
+from scripts.synthetic_data import create_affiliations, rolled_back, time_per_call
+
+REPEAT = 3
+
+
+def serialized():
+    """Return the list the way the serializer builds it."""
+    queryset = AffiliationSerializer.setup_eager_loading(
+        Affiliation.objects.order_by("pk")
+    )
+    return AffiliationSerializer(queryset, many=True).data
+
+
+def flat():
+    """Return the list the way `flat_representations` builds it."""
+    return flat_representations(
+        AffiliationSerializer, Affiliation.objects.order_by("pk")
+    )
+
+
+def run(*args):
+    """Print the rows per second of each path and check they agree."""
+    count = int(args[0]) if args else 20000
+    with rolled_back():
+        create_affiliations(count)
+        if serialized() != flat():
+            print("The two paths' output differs")
+        for label, func in (("serializer", serialized), ("flat", flat)):
+            seconds = time_per_call(REPEAT, func)
+            print(
+                f"{count:7} {label:10} {seconds * 1000:9.1f} ms "
+                f"{count / seconds:10.0f} rows/s"
+            )
@@ -0,0 +1,61 @@
+"""
+Script to compare the speed of the JSON encoders used by the endpoints.
+
+The serialized data of synthetic affiliations is encoded by the stock
+`JSONRenderer` and the standard library, and by the renderers that use the C
+encoder. Only encoding is timed, not queries or serializers. The affiliations
+are created in a transaction that is rolled back when the script finishes.
+You can run this script by running:
+`python manage.py runscript benchmark_json_renderer` in the command line from
+the directory. Pass `--script-args 10000` to change the number of
+affiliations.
+"""
+
+import json
+
+from rest_framework.renderers import JSONRenderer
+
+from affiliations.legacy import build_legacy_affiliations
+from affiliations.models import Affiliation
+from affiliations.renderers import FastJSONRenderer, json_dumps
+from affiliations.serializers import AffiliationSerializer
+from scripts.synthetic_data import create_affiliations, rolled_back, time_per_call
+
+REPEAT = 5
+
+
+def run(*args):
+    """Print how long each encoder takes and check they agree byte for byte."""
+    count = int(args[0]) if args else 50000
+    with rolled_back():
+        create_affiliations(count)
+        queryset = AffiliationSerializer.setup_eager_loading(Affiliation.objects.all())
+        database_list = AffiliationSerializer(queryset, many=True).data
+        legacy_documents = build_legacy_affiliations(Affiliation.objects.all())
+
+    encoders = [
+        (
+            "database_list",
+            JSONRenderer().render,
+            FastJSONRenderer().render,
+            database_list,
+        ),
+        (
+            "legacy documents",
+            lambda documents: [
+                json.dumps(document, ensure_ascii=False) for document in documents
+            ],
+            lambda documents: [json_dumps(document) for document in documents],
+            legacy_documents,
+        ),
+    ]
+    for label, stock, fast, data in encoders:
+        if stock(data) != fast(data):
+            print(f"{label}: the encoders' output differs")
+        stock_time = time_per_call(REPEAT, stock, data)
+        fast_time = time_per_call(REPEAT, fast, data)
+        print(
+            f"{count:7} {label:17} stock={stock_time * 1000:9.1f} ms "
+            f"fast={fast_time * 1000:9.1f} ms "
+            f"speedup={stock_time / fast_time:5.1f}x"
+        )
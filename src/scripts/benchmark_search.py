@@ -0,0 +1,60 @@
+"""
+Script to compare searching the search entries with the `LIKE` search the
+admin used to run over each search field.
+
+Synthetic affiliations are created in a transaction that is rolled back when
+the script finishes. You can run this script by running:
+`python manage.py runscript benchmark_search` in the command line from the
+directory. Pass `--script-args 100000` to change the number of affiliations.
+"""
+
+from functools import reduce
+from operator import or_
+
+from django.db.models import Q
+
+from affiliations.admin import AffiliationsAdmin
+from affiliations.models import Affiliation
+from affiliations.search import search_entries, trigrams_available
+from scripts.synthetic_data import create_affiliations, rolled_back, time_per_call
+
+REPEAT = 20
+TERMS = ("synthetic vcep 4999", "coordinator1", "45678", "nobody")
+
+
+def like_search(text):
+    """Return the primary keys the admin's old search found, the way it did:
+    every word must be in one of the search fields.
+    """
+    queryset = Affiliation.objects.all()
+    for word in text.split():
+        queryset = queryset.filter(
+            reduce(
+                or_,
+                (
+                    Q(**{f"{name}__icontains": word})
+                    for name in AffiliationsAdmin.search_fields
+                ),
+            )
+        )
+    return list(queryset.distinct().values_list("pk", flat=True)[:20])
+
+
+def indexed_search(text):
+    """Return the primary keys of the best search entries."""
+    return list(search_entries(text).values_list("pk", flat=True)[:20])
+
+
+def run(*args):
+    """Print how long each search takes per term."""
+    count = int(args[0]) if args else 100000
+    with rolled_back():
+        create_affiliations(count)
+        print(f"Trigrams available: {trigrams_available()}")
+        for text in TERMS:
+            for label, func in (("like", like_search), ("indexed", indexed_search)):
+                seconds = time_per_call(REPEAT, func, text)
+                print(
+                    f"{count:7} {text!r:28} {label:8} {seconds * 1000:9.2f} ms "
+                    f"{len(func(text)):3} hits"
+                )
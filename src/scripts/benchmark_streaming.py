@@ -0,0 +1,78 @@
+"""
+Script to compare the memory use of streamed and buffered list responses.
+
+Synthetic affiliations are created in a transaction that is rolled back when
+the script finishes. You can run this script by running:
+`python manage.py runscript benchmark_streaming` in the command line from the
+directory. Pass `--script-args 100000` to change the largest number of
+affiliations; the script also measures a quarter and a half of it.
+"""
+
+import gc
+import time
+import tracemalloc
+
+from asgiref.sync import async_to_sync
+from django.test import RequestFactory
+from rest_framework_api_key.models import APIKey
+
+from affiliations.views import AffiliationsList, affiliations_list_json_format
+from scripts.synthetic_data import create_affiliations, rolled_back
+
+VIEWS = [
+    ("/api/affiliations_list/", affiliations_list_json_format),
+    ("/api/database_list/", AffiliationsList.as_view()),
+]
+
+
+async def _consume(response, start):
+    """Read a streamed response, returning its size and time to first row."""
+    first_row = None
+    size = 0
+    async for chunk in response.streaming_content:
+        # The first chunk is the opening bracket of the array.
+        if size and first_row is None:
+            first_row = time.perf_counter() - start
+        size += len(chunk)
+    return size, first_row
+
+
+def measure(view, request, stream):
+    """Return the bytes, time to first row and peak memory of one request."""
+    # Free the previous request's garbage so it doesn't count towards the peak.
+    gc.collect()
+    tracemalloc.reset_peak()
+    start = time.perf_counter()
+    response = view(request)
+    if stream:
+        size, first_row = async_to_sync(_consume)(response, start)
+    else:
+        if hasattr(response, "render"):
+            response.render()
+        size, first_row = len(response.content), time.perf_counter() - start
+    _, peak = tracemalloc.get_traced_memory()
+    return size, first_row, peak
+
+
+def run(*args):
+    """Print the peak memory and time to first row for each list response."""
+    largest = int(args[0]) if args else 8000
+    factory = RequestFactory()
+    tracemalloc.start()
+    for count in (largest // 4, largest // 2, largest):
+        with rolled_back():
+            create_affiliations(count)
+            _, key = APIKey.objects.create_key(name="benchmark")
+            for url, view in VIEWS:
+                for stream in (False, True):
+                    request = factory.get(
+                        url, {"stream": "true"} if stream else {}, HTTP_X_API_KEY=key
+                    )
+                    size, first_row, peak = measure(view, request, stream)
+                    label = "streamed" if stream else "buffered"
+                    print(
+                        f"{count:7} {url:25} {label:8} bytes={size:10} "
+                        f"first row={first_row * 1000:9.1f} ms "
+                        f"peak memory={peak / 2**20:8.1f} MiB"
+                    )
+    tracemalloc.stop()
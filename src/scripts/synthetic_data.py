@@ -0,0 +1,119 @@
+"""
+Helpers shared by the benchmark scripts.
+
+This module is not a script itself; the benchmark scripts import it to create
+synthetic affiliations inside a transaction that is rolled back afterwards, so
+they can be run against any database without leaving data behind.
+"""
+
+from contextlib import contextmanager
+import time
+
+from django.conf import settings
+from django.db import connection, transaction
+from django.test import Client
+from rest_framework_api_key.models import APIKey
+
+from affiliations.legacy import rebuild_legacy_snapshots
+from affiliations.models import Affiliation, Approver, Coordinator, Submitter
+from affiliations.search import rebuild_search_entries
+from affiliations.versions import bump_data_version
+
+BATCH_SIZE = 2000
+
+
+@contextmanager
+def rolled_back():
+    """Run the block in a transaction that is always rolled back."""
+    with transaction.atomic():
+        yield
+        transaction.set_rollback(True)
+
+
+def create_affiliations(count):
+    """Create `count` affiliations with a coordinator, approvers and submitter.
+
+    Pairs of affiliations share an affiliation ID as a VCEP and a GCEP, the
+    same way real expert panels do. Affiliation IDs start at 10000, and the
+    bulk writes are followed by a snapshot and search entry rebuild and a data
+    version bump.
+    """
+    affiliations = []
+    for i in range(count):
+        affil_type = "VCEP" if i % 2 else "GCEP"
+        affil_id = 10000 + i // 2
+        base_ep_id = 50000 if affil_type == "VCEP" else 40000
+        affiliations.append(
+            Affiliation(
+                affiliation_id=affil_id,
+                expert_panel_id=base_ep_id + i // 2,
+                full_name=f"Synthetic {affil_type} {i // 2}",
+                short_name=f"Synthetic {i // 2}",
+                status="ACTIVE",
+                type=affil_type,
+                clinical_domain_working_group="OTHER",
+                members="Bulbasaur, Charmander, Squirtle",
+            )
+        )
+    affiliations = Affiliation.objects.bulk_create(affiliations, batch_size=BATCH_SIZE)
+    Coordinator.objects.bulk_create(
+        (
+            Coordinator(
+                affiliation=affil,
+                coordinator_name=f"Coordinator {affil.pk}",
+                coordinator_email=f"coordinator{affil.pk}@example.com",
+            )
+            for affil in affiliations
+        ),
+        batch_size=BATCH_SIZE,
+    )
+    Approver.objects.bulk_create(
+        (
+            Approver(affiliation=affil, approver_name=name)
+            for affil in affiliations
+            for name in ("Shared Approver", f"Approver {affil.pk}")
+        ),
+        batch_size=BATCH_SIZE,
+    )
+    Submitter.objects.bulk_create(
+        (
+            Submitter(affiliation=affil, clinvar_submitter_id=str(affil.pk))
+            for affil in affiliations
+        ),
+        batch_size=BATCH_SIZE,
+    )
+    rebuild_legacy_snapshots()
+    rebuild_search_entries()
+    bump_data_version()
+    return affiliations
+
+
+@contextmanager
+def counted_queries():
+    """Count the queries run in the block into the yielded list's length.
+
+    `CaptureQueriesContext` can't be used around test client requests outside
+    of the test runner, because every request resets the query log.
+    """
+    queries = []
+
+    def record(execute, sql, params, many, context):
+        queries.append(sql)
+        return execute(sql, params, many, context)
+
+    with connection.execute_wrapper(record):
+        yield queries
+
+
+def api_client():
+    """Return a test client authenticated with a new API key."""
+    _, key = APIKey.objects.create_key(name="benchmark")
+    return Client(HTTP_HOST=settings.ALLOWED_HOSTS[0], HTTP_X_API_KEY=key)
+
+
+def time_per_call(repeat, func, *args, **kwargs):
+    """Return the mean wall-clock seconds of `repeat` calls to `func`."""
+    start = time.perf_counter()
+    for _ in range(repeat):
+        func(*args, **kwargs)
+    return (time.perf_counter() - start) / repeat